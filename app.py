@@ -4,33 +4,57 @@ from flask import Flask, request, render_template, redirect, url_for, flash, jso
 from flask_wtf import FlaskForm
 from wtforms import SelectField, StringField, SubmitField, DecimalField, DateField, FileField
 from wtforms.validators import DataRequired, NumberRange
-from werkzeug.utils import secure_filename
 import pandas as pd
+import numpy as np
 import mysql.connector
 import logging 
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_wtf.csrf import CSRFProtect
 import json  # JSON 처리를 위해 추가
 from decimal import Decimal  # Decimal 처리를 위해 추가
 import re
+import csv
 import jaydebeapi
 import traceback
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as SATimeoutError
 from openpyxl import load_workbook
-from openpyxl.utils import column_index_from_string
-from zipfile import ZipFile
+from openpyxl.utils import get_column_letter, range_boundaries
+from openpyxl.utils.cell import coordinate_to_tuple
+from zipfile import ZipFile, ZipInfo, ZIP_STORED, ZIP_DEFLATED
 import tempfile
+import shutil
+import unicodedata
+from urllib.parse import quote
 import subprocess
 import uuid
+import hashlib
 import threading
+import time
+import queue
+import socket
+import atexit
+import multiprocessing
+import pickle
+import io
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 # PDF 병합용
-from PyPDF2 import PdfMerger
-from flask import send_file
+from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, StreamObject
+from flask import send_file, Response
 # PDF 출력용 0107 추가
-from reportlab.lib.pagesizes import letter
+from reportlab.lib.pagesizes import letter, A4
+from reportlab.lib.units import inch
 from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+from reportlab.pdfbase.ttfonts import TTFont
 
 # .env 파일 로드 (보안을 위해 환경 변수 사용 권장)
 load_dotenv()
@@ -45,7 +69,8 @@ csrf = CSRFProtect(app)
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 최대 업로드 크기 설정 (16MB)
+UPLOAD_MAX_MB = int(os.getenv('UPLOAD_MAX_MB', '16'))
+app.config['MAX_CONTENT_LENGTH'] = UPLOAD_MAX_MB * 1024 * 1024  # 최대 업로드 크기 설정 (기본 16MB)
 
 # 로그 설정
 today = datetime.now().strftime("%Y%m%d")
@@ -65,26 +90,121 @@ logging.basicConfig(
 # 전역 딕셔너리: 백그라운드 작업 결과 저장 (task_id -> 결과 파일 경로 리스트)
 background_tasks = {}
 
+# ------------------------
+# MySQL 커넥션 풀 설정
+# ------------------------
+# get_db_connection()과 get_sqlalchemy_engine()은 프로세스 단위로 하나의 풀을 공유합니다.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))                  # 상시 유지할 커넥션 수
+DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', '10'))  # 풀 초과 시 추가로 허용할 커넥션 수
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))            # 커넥션 대기 최대 시간(초)
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))          # 커넥션 재생성 주기(초)
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'         # 체크아웃 시 헬스 체크 여부
+
+_db_engine = None
+_db_engine_pid = None
+_db_engine_lock = threading.Lock()
+_db_pool_stats = {'checkouts': 0, 'waits': 0, 'wait_seconds': 0.0, 'timeouts': 0, 'errors': 0}
+_db_pool_stats_lock = threading.Lock()
+
+def get_sqlalchemy_engine():
+    """
+    프로세스 공용 SQLAlchemy 엔진(커넥션 풀)을 반환합니다.
+    fork된 자식 프로세스에서는 부모의 커넥션을 공유하지 않도록 새 엔진을 생성합니다.
+    """
+    global _db_engine, _db_engine_pid
+    if _db_engine is not None and _db_engine_pid == os.getpid():
+        return _db_engine
+    with _db_engine_lock:
+        if _db_engine is not None and _db_engine_pid == os.getpid():
+            return _db_engine
+        try:
+            if _db_engine is not None:
+                # 부모 프로세스에서 물려받은 커넥션은 닫지 않고 버립니다.
+                _db_engine.dispose(close=False)
+            url = URL.create(
+                'mysql+mysqlconnector',
+                username=os.getenv('DB_USER', 'nolboo'),
+                password=os.getenv('DB_PASSWORD', '2024!puser'),
+                host=os.getenv('DB_HOST', '175.196.7.45'),
+                port=int(os.getenv('DB_PORT', '3306')),
+                database=os.getenv('DB_NAME', 'nolboo'),
+                query={'charset': 'utf8mb4'}
+            )
+            _db_engine = create_engine(
+                url,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_POOL_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=DB_POOL_PRE_PING
+            )
+            _db_engine_pid = os.getpid()
+            logging.info(f"SQLAlchemy 커넥션 풀이 생성되었습니다. (size={DB_POOL_SIZE}, max_overflow={DB_POOL_MAX_OVERFLOW})")
+            return _db_engine
+        except Exception as e:
+            logging.error(f"SQLAlchemy 엔진 생성 오류: {e}")
+            return None
+
 # MySQL 연결 설정 함수
 def get_db_connection():
+    """
+    풀에서 MySQL 커넥션을 체크아웃합니다. close()를 호출하면 풀로 반환됩니다.
+    """
+    engine = get_sqlalchemy_engine()
+    if engine is None:
+        return None
+    pool = engine.pool
+    exhausted = pool.checkedout() >= pool.size() + DB_POOL_MAX_OVERFLOW
+    started = time.monotonic()
     try:
-        db = mysql.connector.connect(
-            host=os.getenv('DB_HOST', '175.196.7.45'),
-            user=os.getenv('DB_USER', 'nolboo'),
-            password=os.getenv('DB_PASSWORD', '2024!puser'),
-            database=os.getenv('DB_NAME', 'nolboo'),
-            charset='utf8mb4'
-        )
-        logging.info("MySQL 데이터베이스에 성공적으로 연결되었습니다.")
-        return db
-    except mysql.connector.Error as err:
+        db = engine.raw_connection()
+    except SATimeoutError as err:
+        with _db_pool_stats_lock:
+            _db_pool_stats['timeouts'] += 1
+        logging.error(f"MySQL 커넥션 풀 대기 시간 초과: {err}")
+        return None
+    except (SQLAlchemyError, mysql.connector.Error) as err:
+        with _db_pool_stats_lock:
+            _db_pool_stats['errors'] += 1
         logging.error(f"MySQL 연결 오류: {err}")
         return None
+    waited = time.monotonic() - started
+    with _db_pool_stats_lock:
+        _db_pool_stats['checkouts'] += 1
+        if exhausted:
+            _db_pool_stats['waits'] += 1
+            _db_pool_stats['wait_seconds'] += waited
+    logging.debug(f"커넥션 풀에서 MySQL 커넥션을 가져왔습니다. (대기 {waited:.3f}초)")
+    return db
+
+def db_pool_metrics():
+    """
+    커넥션 풀 상태를 Prometheus 메트릭 이름 -> 값 딕셔너리로 반환합니다.
+    """
+    metrics = {}
+    engine = _db_engine if _db_engine_pid == os.getpid() else None
+    if engine is not None:
+        pool = engine.pool
+        metrics['ar_db_pool_size'] = pool.size()
+        metrics['ar_db_pool_checked_in'] = pool.checkedin()
+        metrics['ar_db_pool_checked_out'] = pool.checkedout()
+        metrics['ar_db_pool_overflow'] = max(pool.overflow(), 0)
+    with _db_pool_stats_lock:
+        metrics['ar_db_pool_checkouts_total'] = _db_pool_stats['checkouts']
+        metrics['ar_db_pool_waits_total'] = _db_pool_stats['waits']
+        metrics['ar_db_pool_wait_seconds_total'] = round(_db_pool_stats['wait_seconds'], 3)
+        metrics['ar_db_pool_timeouts_total'] = _db_pool_stats['timeouts']
+        metrics['ar_db_pool_errors_total'] = _db_pool_stats['errors']
+    return metrics
 
 # 프로그램 설정
 TEMPLATE_FILE = 'detail_form.xlsx'  # 엑셀 템플릿 파일명
 OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')  # 출력 엑셀 파일 저장 디렉토리
 
+# 거래명세표 출력 엔진: 'xlsx' (엑셀 템플릿 → LibreOffice PDF 변환) 또는 'pdf' (reportlab 직접 렌더링)
+EXPORT_ENGINES = [('xlsx', 'Excel 템플릿 → PDF 변환'), ('pdf', 'PDF 직접 생성 (빠름)')]
+EXPORT_ENGINE = os.getenv('EXPORT_ENGINE', 'xlsx')
+
 # 테이블 이름
 AR_ORDER_DETAILS_ITEM_TABLE = 'AROrderDetailsItem'
 CM_CHAIN_TABLE = 'cm_chain'
@@ -150,6 +270,7 @@ class DailyTransactionsForm(FlaskForm):
 # 새로운 폼 클래스 정의
 class DownloadOrdersForm(FlaskForm):
     order_date = DateField('처리할 배송일자', format='%Y-%m-%d', validators=[DataRequired()])
+    engine = SelectField('출력 방식', choices=EXPORT_ENGINES, default=EXPORT_ENGINE)
     submit = SubmitField('엑셀 다운로드')
 # 신규 폼 클래스: DownloadClientOrdersForm
 
@@ -158,6 +279,7 @@ class DownloadClientOrdersForm(FlaskForm):
     client_code = SelectField('매출처', choices=[('', '전체매출처')])
     from_date = DateField('시작일', format='%Y-%m-%d', validators=[DataRequired()])
     to_date = DateField('종료일', format='%Y-%m-%d', validators=[DataRequired()])
+    engine = SelectField('출력 방식', choices=EXPORT_ENGINES, default=EXPORT_ENGINE)
     submit = SubmitField('거래명세표 생성')
 
 # ------------------------
@@ -202,8 +324,8 @@ def check_special_characters(df, columns):
         else:
             logging.warning(f"'{col}' 컬럼이 데이터프레임에 존재하지 않습니다.")
 
-def extract_data(cursor, query):
-    cursor.execute(query)
+def extract_data(cursor, query, params=None):
+    cursor.execute(query, params)
     data = cursor.fetchall()
     columns = [desc[0] for desc in cursor.description]
     return pd.DataFrame(data, columns=columns)
@@ -223,6 +345,16 @@ def log_query_string(query):
 # ------------------------
 # 6. ETL 프로세스 함수 정의
 # ------------------------
+def canonical_client_key(value):
+    """
+    매출처 코드를 정규화 키로 변환합니다 (MySQL UPPER(TRIM(x))와 같은 규칙, None은 그대로).
+    cm_chain.chain_key, AROrderDetailsItem/ARClientMaster/ARTransactionsLedger.client_key 생성 컬럼과
+    비교할 값에 사용합니다 (migrations/006_canonical_client_keys.sql).
+    """
+    if value is None:
+        return None
+    return str(value).strip(' ').upper()
+
 def fetch_client_data(engine, from_date, to_date, client_code):
     try:
         query = f"""
@@ -248,12 +380,11 @@ def fetch_client_data(engine, from_date, to_date, client_code):
                 c.president,       -- 매출처 대표자
                 c.address1         -- 매출처 주소
             FROM {AR_ORDER_DETAILS_ITEM_TABLE} a
-            INNER JOIN {CM_CHAIN_TABLE} c 
-              ON a.client_code COLLATE utf8mb4_unicode_ci = c.chain_no COLLATE utf8mb4_unicode_ci
+            INNER JOIN {CM_CHAIN_TABLE} c ON a.client_key = c.chain_key
             WHERE a.order_date BETWEEN '{from_date}' AND '{to_date}'
         """
         if client_code and client_code.strip() != "":
-            query += f" AND a.client_code = '{client_code.strip()}'"
+            query += f" AND a.client_key = '{canonical_client_key(client_code)}'"
         query += " ORDER BY a.order_date, a.client_code"
         logging.debug(f"fetch_client_data 쿼리: {query}")
         df = pd.read_sql(query, engine)
@@ -331,9 +462,20 @@ def fetch_client_data(engine, from_date, to_date, client_code):
 #     except Exception as e:
 #         logging.error(f"엑셀 파일 생성 중 오류 발생 (고객명: {client_name}, 배송일자: {order_date}): {e}")
 #         raise e
-def export_client_orders_to_files(from_date, to_date, client_code):
+def export_client_orders_to_files(from_date, to_date, client_code, output_engine=None, cache_stats=None, progress=None,
+                                  output_dir=None):
+    """
+    거래처별 통합 PDF 경로 목록을 반환합니다.
+    cache_stats(dict)를 넘기면 일자별 PDF 캐시 적중/미스 수를 채워 줍니다.
+    progress(TaskProgress)를 넘기면 단계별 진행 상황을 기록합니다.
+    output_dir를 넘기면 통합 PDF를 OUTPUT_FOLDER 대신 그 폴더에 저장합니다.
+    """
+    output_engine = output_engine or EXPORT_ENGINE
+    if cache_stats is None:
+        cache_stats = {}
+    cache_stats.update({'hits': 0, 'misses': 0})
     logging.debug("export_client_orders_to_files 함수 시작 (거래처별 통합 PDF 병합)")
-    logging.info(f"매개변수: from_date={from_date}, to_date={to_date}, client_code='{client_code}'")
+    logging.info(f"매개변수: from_date={from_date}, to_date={to_date}, client_code='{client_code}', output_engine={output_engine}")
     
     engine = get_sqlalchemy_engine()
     if engine is None:
@@ -353,9 +495,10 @@ def export_client_orders_to_files(from_date, to_date, client_code):
         logging.error(f"데이터 전처리 오류: {e}", exc_info=True)
         raise e
 
-    if not os.path.exists(OUTPUT_FOLDER):
-        os.makedirs(OUTPUT_FOLDER)
-        logging.info(f"출력 폴더 생성: {OUTPUT_FOLDER}")
+    output_dir = output_dir or OUTPUT_FOLDER
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        logging.info(f"출력 폴더 생성: {output_dir}")
     
     merged_file_paths = []  # 각 거래처별 최종 merged pdf 파일 경로 저장
 
@@ -363,55 +506,43 @@ def export_client_orders_to_files(from_date, to_date, client_code):
     grouped_clients = df.groupby(['client_code'])
     logging.info(f"기간 {from_date} ~ {to_date} 데이터: {len(grouped_clients)} 거래처 그룹")
     
+    clients = []  # [(client_code, client_name, [(order_date, group), ...]), ...]
     for client_code, client_group in grouped_clients:
         client_name = client_group['client_name'].iloc[0] if 'client_name' in client_group.columns else "unknown"
-        logging.info(f"Processing client_code: {client_code}, client_name: {client_name}")
-        
-        daily_pdf_files = []  # 해당 거래처의 일자별 PDF 파일 목록 (tuple: (order_date, pdf_path))
-        
         # 거래일자별 그룹화
         grouped_dates = client_group.groupby(['order_date'])
-        for order_date, group in grouped_dates:
-            logging.info(f"처리 일자: {order_date} (client: {client_code})")
-            try:
-                wb, ws = load_excel_template()
-            except Exception as e:
-                logging.error(f"엑셀 템플릿 로드 오류: {e}")
-                continue
-            try:
-                # generate_excel_file() 함수는 개별 일자별 엑셀과 PDF를 생성함
-                excel_path = generate_excel_file(wb, ws, client_name, order_date, group)
-                logging.info(f"{order_date} 엑셀 파일 생성 완료: {excel_path}")
-            except Exception as e:
-                logging.error(f"엑셀 파일 생성 오류 (client_code: {client_code}, order_date: {order_date}): {e}", exc_info=True)
-                continue
-            try:
-                pdf_path = convert_excel_to_pdf(excel_path, OUTPUT_FOLDER)
-                daily_pdf_files.append((order_date, pdf_path))
-                logging.info(f"{order_date} PDF 파일 생성 완료: {pdf_path}")
-            except Exception as e:
-                logging.error(f"PDF 변환 오류 (client_code: {client_code}, order_date: {order_date}): {e}", exc_info=True)
-                continue
-        
+        clients.append((client_code, client_name, list(grouped_dates)))
+    if progress is not None:
+        progress.start(len(clients), sum(len(dates) for _, _, dates in clients))
+
+    # 거래처별로 모든 일자의 PDF가 준비되는 대로 병합
+    for client_code, client_name, daily_pdf_files in render_client_statements(clients, output_engine, cache_stats, progress):
         if daily_pdf_files:
             # 정렬: 날짜 오름차순 정렬 (order_date가 "YYYY-MM-DD" 형식이므로 문자열 정렬 가능)
             daily_pdf_files.sort(key=lambda x: x[0])
             pdf_paths = [pdf for date, pdf in daily_pdf_files]
             final_filename = f"거래명세표_{client_name}_{from_date.replace('-', '')}_{to_date.replace('-', '')}.pdf"
-            final_merged_pdf = os.path.join(OUTPUT_FOLDER, final_filename)
+            final_merged_pdf = os.path.join(output_dir, final_filename)
             try:
-                merger = PdfMerger()
-                for pdf in pdf_paths:
-                    merger.append(pdf)
-                merger.write(final_merged_pdf)
-                merger.close()
+                with StreamingPdfWriter(final_merged_pdf) as writer:
+                    for pdf in pdf_paths:
+                        writer.append(pdf)
                 logging.info(f"최종 PDF 병합 완료 for client {client_code}: {final_merged_pdf}")
                 merged_file_paths.append(final_merged_pdf)
+                if progress is not None:
+                    progress.client_done(writer.page_count)
             except Exception as e:
                 logging.error(f"최종 PDF 병합 오류 for client {client_code}: {e}", exc_info=True)
+                if progress is not None:
+                    progress.client_done()
                 continue
         else:
             logging.error(f"생성된 PDF 파일이 없습니다 for client {client_code}.")
+            if progress is not None:
+                progress.client_done()
+
+    logging.info(f"거래명세표 캐시: 적중 {cache_stats['hits']}건, 미스 {cache_stats['misses']}건")
+    prune_statement_cache()
     
     if merged_file_paths:
         # 만약 한 거래처만 선택되었다면 리스트의 첫 번째 파일을 반환하거나,
@@ -423,6 +554,283 @@ def export_client_orders_to_files(from_date, to_date, client_code):
         raise ValueError("생성된 병합 PDF 파일이 없습니다.")
 
 
+# ------------------------
+# 일자별 거래명세표 PDF 캐시
+# ------------------------
+# (거래처, 거래일자, 조회된 행 내용, 템플릿 버전, 출력 방식)이 같으면 이전에 만든 PDF를 재사용합니다.
+# 캐시 파일은 OUTPUT_FOLDER/cache/<키 앞 2자리>/<키>.pdf 에 저장되며, 사용 시 수정 시각을 갱신하여
+# 오래 쓰지 않은 파일부터 정리합니다.
+STATEMENT_CACHE_FOLDER = os.path.join(OUTPUT_FOLDER, 'cache')
+STATEMENT_CACHE_MAX_MB = int(os.getenv('STATEMENT_CACHE_MAX_MB', '1024'))           # 0이면 캐시 사용 안 함
+STATEMENT_CACHE_MAX_AGE_DAYS = int(os.getenv('STATEMENT_CACHE_MAX_AGE_DAYS', '30'))
+STATEMENT_PDF_LAYOUT_VERSION = '1'  # draw_statement_pdf 레이아웃을 바꾸면 올려서 기존 캐시를 무효화
+
+def statement_template_version(output_engine):
+    """
+    출력 결과에 영향을 주는 템플릿/레이아웃의 버전 문자열을 반환합니다.
+    """
+    supplier = json.dumps(SUPPLIER_INFO, sort_keys=True, ensure_ascii=False)
+    if output_engine == 'pdf':
+        return f"pdf-{STATEMENT_PDF_LAYOUT_VERSION}-{supplier}"
+    stat = os.stat(TEMPLATE_FILE)
+    return f"xlsx-{stat.st_mtime_ns}-{stat.st_size}-{supplier}"
+
+def statement_cache_key(client_code, order_date, group, template_version):
+    digest = hashlib.sha256()
+    for part in (client_code, order_date, template_version, ','.join(map(str, group.columns))):
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(pd.util.hash_pandas_object(group.reset_index(drop=True), index=False).values.tobytes())
+    return digest.hexdigest()
+
+def _statement_cache_path(key):
+    return os.path.join(STATEMENT_CACHE_FOLDER, key[:2], f"{key}.pdf")
+
+def lookup_statement_cache(client_code, order_date, group, template_version, cache_stats, work_dir):
+    """
+    (캐시 키, PDF 경로 또는 None)을 반환합니다. 캐시를 쓰지 않으면 (None, None).
+    적중한 파일은 work_dir에 하드 링크(안 되면 복사)하여 그 경로를 반환합니다.
+    병합 전에 다른 작업의 prune_statement_cache가 캐시 파일을 지워도 이 작업의 파일은 남습니다.
+    """
+    if template_version is None:
+        return None, None
+    key = statement_cache_key(client_code, order_date, group, template_version)
+    path = _statement_cache_path(key)
+    pinned_path = os.path.join(work_dir, f"{key}.pdf")
+    try:
+        if not os.path.exists(pinned_path):
+            try:
+                os.link(path, pinned_path)
+            except FileNotFoundError:
+                raise
+            except OSError:
+                # 하드 링크를 지원하지 않는 파일 시스템 등
+                shutil.copyfile(path, pinned_path)
+        os.utime(path)
+    except FileNotFoundError:
+        cache_stats['misses'] += 1
+        return key, None
+    cache_stats['hits'] += 1
+    logging.info(f"거래명세표 캐시 적중: {client_code} {order_date}")
+    return key, pinned_path
+
+def store_statement_cache(key, pdf_path):
+    if key is None:
+        return
+    path = _statement_cache_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(pdf_path, tmp_path)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"거래명세표 캐시 저장 실패 ({pdf_path}): {e}")
+
+def prune_statement_cache():
+    """
+    STATEMENT_CACHE_MAX_AGE_DAYS보다 오래된 캐시 파일을 지우고,
+    전체 크기가 STATEMENT_CACHE_MAX_MB를 넘으면 가장 오래 사용하지 않은 파일부터 지웁니다.
+    """
+    if not os.path.isdir(STATEMENT_CACHE_FOLDER):
+        return 0
+    now = time.time()
+    max_age = STATEMENT_CACHE_MAX_AGE_DAYS * 86400
+    entries = []
+    removed = 0
+    for dirpath, _, filenames in os.walk(STATEMENT_CACHE_FOLDER):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+                if now - stat.st_mtime > max_age:
+                    os.remove(path)
+                    removed += 1
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                continue
+    total = sum(size for _, size, _ in entries)
+    limit = STATEMENT_CACHE_MAX_MB * 1024 * 1024
+    entries.sort()
+    for _, size, path in entries:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+            total -= size
+        except OSError:
+            continue
+    if removed:
+        logging.info(f"거래명세표 캐시 정리: {removed}개 파일 삭제")
+    return removed
+
+def cache_summary(cache_stats):
+    lookups = cache_stats.get('hits', 0) + cache_stats.get('misses', 0)
+    return {
+        'hits': cache_stats.get('hits', 0),
+        'misses': cache_stats.get('misses', 0),
+        'hit_rate': round(cache_stats.get('hits', 0) / lookups, 3) if lookups else 0.0,
+    }
+
+# 거래명세표 생성 병렬 처리 설정
+# 프로세스 풀은 웹 프로세스마다 하나이고 작업 큐 스레드(EXPORT_QUEUE_WORKERS)가 함께 씁니다.
+# 풀 워커는 LibreOffice 변환 프로세스를 1개까지만 띄우므로, 상주하는 LibreOffice 수는
+# (웹 프로세스 수) x EXPORT_WORKERS 이하입니다. gunicorn 워커 수를 늘리면 그만큼 늘어납니다.
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '1'))  # 1 이하이면 현재 프로세스에서 순차 처리
+
+_export_executor = None
+_export_executor_pid = None
+_export_executor_lock = threading.Lock()
+
+def _init_export_worker():
+    """
+    프로세스 풀 워커 초기화: 워커당 LibreOffice 변환 프로세스를 1개로 제한합니다.
+    """
+    global OFFICE_POOL_SIZE
+    OFFICE_POOL_SIZE = min(OFFICE_POOL_SIZE, 1)
+
+def get_export_executor():
+    """
+    현재 프로세스가 공유하는 거래명세표 생성 프로세스 풀을 반환합니다.
+    """
+    global _export_executor, _export_executor_pid
+    with _export_executor_lock:
+        if _export_executor is None or _export_executor_pid != os.getpid():
+            _export_executor = ProcessPoolExecutor(max_workers=EXPORT_WORKERS,
+                                                   mp_context=multiprocessing.get_context('spawn'),
+                                                   initializer=_init_export_worker)
+            _export_executor_pid = os.getpid()
+            atexit.register(_export_executor.shutdown, wait=False, cancel_futures=True)
+        return _export_executor
+
+def discard_export_executor(executor):
+    """
+    워커가 비정상 종료되어 쓸 수 없게 된(BrokenProcessPool) 풀을 버립니다. 다음 요청에서 새로 만듭니다.
+    """
+    global _export_executor
+    with _export_executor_lock:
+        if _export_executor is executor:
+            _export_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def render_client_day(client_code, client_name, order_date, group, output_engine='xlsx'):
+    """
+    (거래처, 거래일자) 1건의 엑셀 생성 및 PDF 변환을 수행하고 PDF 경로를 반환합니다.
+    output_engine이 'pdf'이면 엑셀을 거치지 않고 PDF를 직접 생성합니다.
+    """
+    logging.info(f"처리 일자: {order_date} (client: {client_code})")
+    if output_engine == 'pdf':
+        try:
+            return generate_statement_pdf(client_name, order_date, group)
+        except Exception as e:
+            logging.error(f"PDF 생성 오류 (client_code: {client_code}, order_date: {order_date}): {e}", exc_info=True)
+            raise
+    try:
+        wb, ws = load_excel_template()
+    except Exception as e:
+        logging.error(f"엑셀 템플릿 로드 오류: {e}")
+        raise
+    try:
+        excel_path = generate_excel_file(wb, ws, client_name, order_date, group)
+        logging.info(f"{order_date} 엑셀 파일 생성 완료: {excel_path}")
+    except Exception as e:
+        logging.error(f"엑셀 파일 생성 오류 (client_code: {client_code}, order_date: {order_date}): {e}", exc_info=True)
+        raise
+    try:
+        pdf_path = convert_excel_to_pdf(excel_path, OUTPUT_FOLDER)
+        logging.info(f"{order_date} PDF 파일 생성 완료: {pdf_path}")
+    except Exception as e:
+        logging.error(f"PDF 변환 오류 (client_code: {client_code}, order_date: {order_date}): {e}", exc_info=True)
+        raise
+    return pdf_path
+
+def render_client_statements(clients, output_engine='xlsx', cache_stats=None, progress=None):
+    """
+    거래처별 일자 PDF를 생성하고, 거래처 단위로 완료되는 대로
+    (client_code, client_name, [(order_date, pdf_path), ...])를 yield 합니다.
+    EXPORT_WORKERS > 1 이면 (거래처, 일자) 작업을 프로세스 풀에 분산합니다.
+    캐시에 있는 일자는 다시 만들지 않고, 실패한 일자는 로그만 남기고 나머지를 계속 처리합니다.
+    progress가 있으면 일자 하나가 끝날 때마다 progress.day_done()을 호출합니다.
+    """
+    day_done = progress.day_done if progress is not None else (lambda: None)
+    if cache_stats is None:
+        cache_stats = {'hits': 0, 'misses': 0}
+    template_version = statement_template_version(output_engine) if STATEMENT_CACHE_MAX_MB > 0 else None
+    # 캐시 적중 파일을 이 작업이 끝날 때까지 붙잡아 두는 폴더 (병합이 모두 끝나면 삭제)
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix='cache_hits_', dir=OUTPUT_FOLDER)
+    try:
+        yield from _render_client_statements(clients, output_engine, cache_stats, day_done, template_version, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def _render_client_statements(clients, output_engine, cache_stats, day_done, template_version, work_dir):
+    if EXPORT_WORKERS <= 1:
+        for client_code, client_name, dates in clients:
+            logging.info(f"Processing client_code: {client_code}, client_name: {client_name}")
+            daily_pdf_files = []
+            for order_date, group in dates:
+                key, pdf_path = lookup_statement_cache(client_code, order_date, group, template_version, cache_stats, work_dir)
+                if pdf_path is None:
+                    try:
+                        pdf_path = render_client_day(client_code, client_name, order_date, group, output_engine)
+                    except Exception:
+                        day_done()
+                        continue
+                    store_statement_cache(key, pdf_path)
+                daily_pdf_files.append((order_date, pdf_path))
+                day_done()
+            yield client_code, client_name, daily_pdf_files
+        return
+
+    logging.info(f"거래명세표 병렬 생성: {EXPORT_WORKERS}개 프로세스 (프로세스 내 작업 공유)")
+    executor = get_export_executor()
+    futures = {}
+    remaining = {}
+    results = {}
+    try:
+        for index, (client_code, client_name, dates) in enumerate(clients):
+            remaining[index] = 0
+            results[index] = []
+            for order_date, group in dates:
+                key, pdf_path = lookup_statement_cache(client_code, order_date, group, template_version, cache_stats, work_dir)
+                if pdf_path is not None:
+                    results[index].append((order_date, pdf_path))
+                    day_done()
+                    continue
+                try:
+                    future = executor.submit(render_client_day, client_code, client_name, order_date, group, output_engine)
+                except RuntimeError:
+                    # 풀이 깨졌거나 다른 작업이 깨진 풀을 이미 버렸습니다.
+                    discard_export_executor(executor)
+                    executor = get_export_executor()
+                    future = executor.submit(render_client_day, client_code, client_name, order_date, group, output_engine)
+                futures[future] = (index, order_date, key)
+                remaining[index] += 1
+            if remaining[index] == 0:
+                yield client_code, client_name, results.pop(index)
+        for future in as_completed(futures):
+            index, order_date, key = futures[future]
+            client_code, client_name, _ = clients[index]
+            try:
+                pdf_path = future.result()
+                store_statement_cache(key, pdf_path)
+                results[index].append((order_date, pdf_path))
+            except BrokenProcessPool as e:
+                logging.error(f"거래명세표 생성 실패 (client_code: {client_code}, order_date: {order_date}): {e}")
+                discard_export_executor(executor)
+            except Exception as e:
+                logging.error(f"거래명세표 생성 실패 (client_code: {client_code}, order_date: {order_date}): {e}")
+            day_done()
+            remaining[index] -= 1
+            if remaining[index] == 0:
+                yield client_code, client_name, results.pop(index)
+    finally:
+        # 작업이 중간에 끝나면 (예외, 제너레이터 종료) 아직 시작하지 않은 일자를 공유 풀에서 뺍니다.
+        for future in futures:
+            future.cancel()
+
 def generate_excel_file(wb, ws, client_name, order_date, group):
     try:
         # order_date가 tuple인 경우 첫 번째 요소를 사용
@@ -452,6 +860,27 @@ def generate_excel_file(wb, ws, client_name, order_date, group):
         logging.error(f"엑셀 파일 생성 중 오류 발생 (고객명: {client_name}, 거래일자: {order_date}): {e}")
         raise e
 
+def statement_line_values(row):
+    """
+    거래명세표 한 줄의 (수량, 단가, 공급가, 세액)을 float으로 반환합니다.
+    """
+    # 각 행의 값을 float으로 변환
+    qty = float(row['qty'])
+    unit_price = float(row['unit_price'])
+    order_amount = float(row['order_amount'])
+    vat = float(row['vat'])
+    total_amount = float(row['total_amount'])
+
+    # 주문금액이 음수이면 양수로 변경 (부가세도 동일하게)
+    if total_amount < 0:
+        order_amount *= -1
+        vat *= -1
+    return qty, unit_price, order_amount, vat
+
+# 매출처 등록번호 10자리를 한 글자씩 기록하는 셀 위치 (row, column)
+REG_NO_CELLS = ['V3', 'W3', 'X3', 'Z3', 'AA3', 'AC3', 'AD3', 'AE3', 'AF3', 'AG3']
+REG_NO_CELL_POSITIONS = [coordinate_to_tuple(cell) for cell in REG_NO_CELLS]
+
 def insert_data_to_excel(wb, ws, supplier_info, client_info, order_date, data_rows):
     ws['G3'] = supplier_info['등록번호']
     ws['G4'] = supplier_info['상호 (법인명)']
@@ -459,12 +888,9 @@ def insert_data_to_excel(wb, ws, supplier_info, client_info, order_date, data_ro
     ws['G6'] = supplier_info['주소']
     reg_no = client_info.get('reg_no', '-').replace('-', '')  # 하이픈 제거
     reg_no = reg_no.ljust(10, '-')[:10]  # 10자리 맞추기
-    reg_no_cells = ['V3', 'W3', 'X3', 'Z3', 'AA3', 'AC3', 'AD3', 'AE3', 'AF3', 'AG3']
-    for cell, char in zip(reg_no_cells, reg_no):
-        column_letters = ''.join(filter(str.isalpha, cell))
-        row_num = int(''.join(filter(str.isdigit, cell)))
-        column_num = column_index_from_string(column_letters)
-        insert_cell_value(ws, row_num, column_num, char)
+    merged_index = get_template_merged_index()
+    for (row_num, column_num), char in zip(REG_NO_CELL_POSITIONS, reg_no):
+        insert_cell_value(ws, row_num, column_num, char, merged_index)
     ws['V4'] = f"{client_info.get('full_name', '-')}"
     ws['V5'] = f"{client_info.get('president', '-')}"
     ws['V6'] = f"{client_info.get('address1', '-')}"
@@ -479,24 +905,14 @@ def insert_data_to_excel(wb, ws, supplier_info, client_info, order_date, data_ro
     total_vat = 0.0
     for row in data_rows:
             try:
-                # 각 행의 값을 float으로 변환
-                qty = float(row['qty'])
-                unit_price = float(row['unit_price'])
-                order_amount = float(row['order_amount'])
-                vat = float(row['vat'])
-                total_amount = float(row['total_amount'])
-
-                # 주문금액이 음수이면 양수로 변경 (부가세도 동일하게)
-                if total_amount < 0:
-                    order_amount *= -1
-                    vat *= -1
-
-                insert_cell_value(ws, current_row, 1, row['item_name'])
-                insert_cell_value(ws, current_row, 14, row['unit'])
-                insert_cell_value(ws, current_row, 17, qty)
-                insert_cell_value(ws, current_row, 21, unit_price)
-                insert_cell_value(ws, current_row, 26, order_amount)
-                insert_cell_value(ws, current_row, 30, vat)
+                qty, unit_price, order_amount, vat = statement_line_values(row)
+
+                insert_cell_value(ws, current_row, 1, row['item_name'], merged_index)
+                insert_cell_value(ws, current_row, 14, row['unit'], merged_index)
+                insert_cell_value(ws, current_row, 17, qty, merged_index)
+                insert_cell_value(ws, current_row, 21, unit_price, merged_index)
+                insert_cell_value(ws, current_row, 26, order_amount, merged_index)
+                insert_cell_value(ws, current_row, 30, vat, merged_index)
 
                 total_order_amount += order_amount
                 total_vat += vat
@@ -517,17 +933,572 @@ def insert_data_to_excel(wb, ws, supplier_info, client_info, order_date, data_ro
         logging.error(f"합계 셀 할당 중 오류 발생: {e}")
     logging.info(f"엑셀에 {len(data_rows)}개의 데이터가 삽입되었습니다.")
 
+# ------------------------
+# 거래명세표 PDF 직접 렌더링 (reportlab)
+# ------------------------
+# 엑셀 템플릿(detail_form.xlsx)의 셀 배치를 그대로 PDF 좌표로 옮겨 그립니다.
+# 템플릿과 같이 A~AG 33개 열은 같은 너비이고, 좌표는 템플릿 셀 주소로 표기합니다.
+PDF_FONT_PATH = os.getenv('PDF_FONT_PATH', '')  # 한글 TTF 폰트 경로 (미지정 시 reportlab 내장 CID 폰트 사용)
+STATEMENT_COLUMNS = 33
+STATEMENT_ITEM_FIRST_ROW = 8
+STATEMENT_ITEM_ROWS = 35  # 8행 ~ 42행
+STATEMENT_ROW_HEIGHTS = [15, 15, 27.95, 27.95, 27.95, 27.95, 15] + [15] * STATEMENT_ITEM_ROWS + [15, 27.95]
+STATEMENT_MARGIN_LEFT = 0.748 * inch
+STATEMENT_MARGIN_TOP = 0.787 * inch
+
+# (셀 범위, 문구, 글자 크기)
+STATEMENT_LABELS = [
+    ('A1:F1', '거래일자', 10), ('G1:O2', '거래명세표', 22), ('P1:T2', '(공급받는자용)', 10), ('U1:AG1', '대표거래처명', 10),
+    ('A3:A6', '공\n급\n자', 10), ('B3:F3', '등록번호', 10), ('B4:F4', '상호\n(법인명)', 10), ('N4:O4', '(인)', 10),
+    ('B5:F5', '성명', 10), ('B6:F6', '주소', 10),
+    ('P3:P6', '공\n급\n받\n는\n자', 10), ('Q3:U3', '등록번호', 10), ('Y3', '-', 10), ('AB3', '-', 10),
+    ('Q4:U4', '상호\n(법인명)', 10), ('AF4:AG4', '(인)', 10), ('Q5:U5', '성명', 10), ('Q6:U6', '주소', 10),
+    ('A7:M7', '품명', 10), ('N7:P7', '단위', 10), ('Q7:T7', '수량', 10), ('U7:Y7', '단가', 10),
+    ('Z7:AC7', '금액', 10), ('AD7:AG7', '세액', 10),
+    ('A43:Y43', '합  계', 9), ('A44:C44', '전일\n미수금', 10), ('D44:I44', '', 10), ('J44:L44', '당일\n총액', 10),
+    ('R44:T44', '현재\n미수금', 10), ('U44:Y44', '', 10), ('Z44:AB44', '인수자', 10), ('AC44:AE44', '', 10),
+    ('AF44:AG44', '(인)', 10),
+]
+# 품목 한 줄의 열 범위 (품명, 단위, 수량, 단가, 금액, 세액)
+STATEMENT_ITEM_COLUMNS = [('A', 'M'), ('N', 'P'), ('Q', 'T'), ('U', 'Y'), ('Z', 'AC'), ('AD', 'AG')]
+
+_statement_font = None
+_statement_font_lock = threading.Lock()
+
+def get_statement_font():
+    """
+    거래명세표용 한글 폰트 이름을 반환합니다. 최초 호출 시 한 번만 등록합니다.
+    """
+    global _statement_font
+    with _statement_font_lock:
+        if _statement_font is None:
+            if PDF_FONT_PATH and os.path.exists(PDF_FONT_PATH):
+                pdfmetrics.registerFont(TTFont('StatementFont', PDF_FONT_PATH))
+                _statement_font = 'StatementFont'
+            else:
+                pdfmetrics.registerFont(UnicodeCIDFont('HYGothic-Medium'))
+                _statement_font = 'HYGothic-Medium'
+        return _statement_font
+
+class StatementPage:
+    """
+    템플릿 셀 주소 기준으로 거래명세표 한 페이지를 그리는 헬퍼.
+    """
+    def __init__(self, pdf, font):
+        self.pdf = pdf
+        self.font = font
+        page_width, page_height = A4
+        self.column_width = (page_width - 2 * STATEMENT_MARGIN_LEFT) / STATEMENT_COLUMNS
+        self.row_tops = []
+        top = page_height - STATEMENT_MARGIN_TOP
+        for height in STATEMENT_ROW_HEIGHTS:
+            self.row_tops.append(top)
+            top -= height
+        self.bottom = top
+
+    def box(self, cell_range):
+        min_col, min_row, max_col, max_row = range_boundaries(cell_range)
+        x = STATEMENT_MARGIN_LEFT + (min_col - 1) * self.column_width
+        width = (max_col - min_col + 1) * self.column_width
+        top = self.row_tops[min_row - 1]
+        bottom = self.row_tops[max_row] if max_row < len(self.row_tops) else self.bottom
+        return x, bottom, width, top - bottom
+
+    def cell(self, cell_range, text='', size=10, align='center', border=True):
+        x, y, width, height = self.box(cell_range)
+        if border:
+            self.pdf.rect(x, y, width, height, stroke=1, fill=0)
+        lines = str(text).split('\n') if text not in (None, '') else []
+        if not lines:
+            return
+        # 칸을 넘는 문자열은 글자 크기를 줄여 맞춤
+        widest = max(pdfmetrics.stringWidth(line, self.font, size) for line in lines)
+        while size > 5 and (widest > width - 4 or len(lines) * size * 1.15 > height):
+            size -= 0.5
+            widest = max(pdfmetrics.stringWidth(line, self.font, size) for line in lines)
+        self.pdf.setFont(self.font, size)
+        leading = size * 1.15
+        baseline = y + height / 2 + (len(lines) - 1) * leading / 2 - size * 0.35
+        for line in lines:
+            if align == 'left':
+                self.pdf.drawString(x + 2, baseline, line)
+            elif align == 'right':
+                self.pdf.drawRightString(x + width - 2, baseline, line)
+            else:
+                self.pdf.drawCentredString(x + width / 2, baseline, line)
+            baseline -= leading
+
+    def frame(self, cell_range, line_width=1.5):
+        x, y, width, height = self.box(cell_range)
+        self.pdf.setLineWidth(line_width)
+        self.pdf.rect(x, y, width, height, stroke=1, fill=0)
+        self.pdf.setLineWidth(0.5)
+
+def _format_statement_amount(value):
+    # 템플릿의 회계 서식(_-* #,##0_-)과 같이 0은 '-'로 표시
+    return f"{value:,.0f}" if round(value) != 0 else '-'
+
+def _format_statement_date(order_date):
+    try:
+        parsed = datetime.strptime(order_date, '%Y-%m-%d')
+        return f"{parsed.year}년 {parsed.month}월 {parsed.day}일"
+    except ValueError:
+        return order_date
+
+def draw_statement_pdf(pdf, supplier_info, client_info, order_date, data_rows):
+    """
+    insert_data_to_excel()과 같은 내용을 reportlab 캔버스에 그립니다.
+    품목이 35줄을 넘으면 다음 페이지로 이어서 그리고, 합계는 마지막 페이지에 표시합니다.
+    """
+    font = get_statement_font()
+    reg_no = client_info.get('reg_no', '-').replace('-', '')  # 하이픈 제거
+    reg_no = reg_no.ljust(10, '-')[:10]  # 10자리 맞추기
+    rep_name = data_rows[0].get('rep_name', '-') if data_rows else '-'
+
+    lines = []
+    total_order_amount = 0.0
+    total_vat = 0.0
+    for row in data_rows:
+        try:
+            qty, unit_price, order_amount, vat = statement_line_values(row)
+        except Exception as e:
+            logging.error(f"데이터 삽입 중 오류 발생 (품목: {row.get('item_name')}): {e}")
+            continue
+        lines.append((row['item_name'], row['unit'], qty, unit_price, order_amount, vat))
+        total_order_amount += order_amount
+        total_vat += vat
+
+    pages = [lines[i:i + STATEMENT_ITEM_ROWS] for i in range(0, len(lines), STATEMENT_ITEM_ROWS)] or [[]]
+    for page_index, page_lines in enumerate(pages):
+        page = StatementPage(pdf, font)
+        pdf.setLineWidth(0.5)
+        for cell_range, text, size in STATEMENT_LABELS:
+            page.cell(cell_range, text, size)
+        page.cell('A2:F2', _format_statement_date(order_date))
+        page.cell('U2:AG2', rep_name)
+        # 공급자
+        page.cell('G3:O3', supplier_info['등록번호'])
+        page.cell('G4:M4', supplier_info['상호 (법인명)'])
+        page.cell('G5:O5', supplier_info['성명'])
+        page.cell('G6:O6', supplier_info['주소'], size=9)
+        # 공급받는자
+        for (row_num, column_num), char in zip(REG_NO_CELL_POSITIONS, reg_no):
+            page.cell(f"{get_column_letter(column_num)}{row_num}", char)
+        page.cell('V4:AE4', client_info.get('full_name', '-'))
+        page.cell('V5:AG5', client_info.get('president', '-'))
+        page.cell('V6:AG6', client_info.get('address1', '-'), size=9)
+        # 품목
+        for offset in range(STATEMENT_ITEM_ROWS):
+            row_num = STATEMENT_ITEM_FIRST_ROW + offset
+            values = page_lines[offset] if offset < len(page_lines) else None
+            for index, (first_col, last_col) in enumerate(STATEMENT_ITEM_COLUMNS):
+                cell_range = f"{first_col}{row_num}:{last_col}{row_num}"
+                if values is None:
+                    page.cell(cell_range)
+                elif index == 0:
+                    page.cell(cell_range, values[0], size=9, align='left')
+                elif index == 1:
+                    page.cell(cell_range, values[1], size=9)
+                else:
+                    page.cell(cell_range, _format_statement_amount(values[index]), size=9, align='right')
+        # 합계 (마지막 페이지)
+        is_last = page_index == len(pages) - 1
+        page.cell('Z43:AC43', f"{total_order_amount:,.0f}" if is_last else '', size=9, align='right')
+        page.cell('AD43:AG43', f"{total_vat:,.0f}" if is_last else '', size=9, align='right')
+        page.cell('M44:Q44', f"{total_order_amount + total_vat:,.0f}" if is_last else '', align='right')
+        page.frame('A1:AG44')
+        pdf.showPage()
+    logging.info(f"PDF에 {len(lines)}개의 데이터가 기록되었습니다. (합계: {total_order_amount + total_vat})")
+
+def generate_statement_pdf(client_name, order_date, group):
+    """
+    generate_excel_file()과 같은 파일명 규칙으로 거래명세표 PDF를 직접 생성하고 경로를 반환합니다.
+    """
+    try:
+        # order_date가 tuple인 경우 첫 번째 요소를 사용
+        order_date_str = order_date[0] if isinstance(order_date, tuple) else order_date
+        client_info = {
+            'full_name': group['full_name'].iloc[0],
+            'reg_no': group['reg_no'].iloc[0],
+            'president': group['president'].iloc[0],
+            'address1': group['address1'].iloc[0]
+        }
+        sanitized_client_name = re.sub(r'[\\/*?:"<>|]', "_", client_name)
+        if sanitized_client_name == "":
+            sanitized_client_name = "unknown"
+        output_filename = f"거래명세표_{sanitized_client_name}_{order_date_str.replace('-', '')}.pdf"
+        output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+        pdf = canvas.Canvas(output_path, pagesize=A4)
+        pdf.setTitle(f"거래명세표 {client_name} {order_date_str}")
+        draw_statement_pdf(pdf, SUPPLIER_INFO, client_info, order_date_str, group.to_dict('records'))
+        pdf.save()
+        logging.info(f"PDF 파일이 성공적으로 생성되었습니다: {output_path}")
+        return output_path
+    except Exception as e:
+        logging.error(f"PDF 파일 생성 중 오류 발생 (고객명: {client_name}, 거래일자: {order_date}): {e}")
+        raise e
+
+# ------------------------
+# PDF 스트리밍 병합
+# ------------------------
+def _pdf_primitive_bytes(obj):
+    buffer = io.BytesIO()
+    write = getattr(obj, 'write_to_stream', None) or getattr(obj, 'writeToStream')
+    write(buffer, None)
+    return buffer.getvalue()
+
+def _pdf_resolve(ref):
+    get_object = getattr(ref, 'get_object', None) or getattr(ref, 'getObject')
+    return get_object()
+
+class StreamingPdfWriter:
+    """
+    PDF 파일을 페이지 단위로 이어 붙이면서 곧바로 디스크에 기록하는 병합기.
+    원본 PDF는 한 번에 하나만 열고, 메모리에는 객체 오프셋과 페이지 번호만 유지합니다.
+    결과는 '<경로>.part'에 기록한 뒤 close() 시 최종 경로로 옮깁니다.
+    """
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, path):
+        self.path = path
+        self.part_path = f"{path}.part"
+        self._file = open(self.part_path, 'wb')
+        self._file.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        # 객체 번호 -> 파일 오프셋 (xref용, 0번은 미사용)
+        self._offsets = array('q', [0] * (self.PAGES_ID + 1))
+        self._next_id = self.PAGES_ID + 1
+        self._kids = array('q')
+        self.page_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _allocate(self):
+        object_id = self._next_id
+        self._next_id += 1
+        self._offsets.append(0)
+        return object_id
+
+    def _write_object(self, object_id, body):
+        self._offsets[object_id] = self._file.tell()
+        self._file.write(f"{object_id} 0 obj\n".encode())
+        self._file.write(body)
+        self._file.write(b"\nendobj\n")
+
+    def _serialize(self, obj, ref_map, pending):
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key not in ref_map:
+                target = _pdf_resolve(obj)
+                # 다른 페이지/페이지 트리를 가리키는 참조는 따라가지 않음 (원본 전체가 딸려오는 것 방지)
+                if isinstance(target, DictionaryObject) and target.get('/Type') in ('/Page', '/Pages'):
+                    return b"null"
+                ref_map[key] = self._allocate()
+                pending.append((ref_map[key], target))
+            return f"{ref_map[key]} 0 R".encode()
+        if isinstance(obj, StreamObject):
+            data = obj._data or b""
+            entries = {key: value for key, value in dict.items(obj) if key != '/Length'}
+            header = self._serialize_dict(entries, ref_map, pending, extra=f"/Length {len(data)}".encode())
+            return header + b"\nstream\n" + data + b"\nendstream"
+        if isinstance(obj, DictionaryObject):
+            return self._serialize_dict(dict(dict.items(obj)), ref_map, pending)
+        if isinstance(obj, ArrayObject):
+            return b"[" + b" ".join(self._serialize(item, ref_map, pending) for item in list.__iter__(obj)) + b"]"
+        return _pdf_primitive_bytes(obj)
+
+    def _serialize_dict(self, entries, ref_map, pending, extra=None):
+        parts = [_pdf_primitive_bytes(NameObject(key)) + b" " + self._serialize(value, ref_map, pending)
+                 for key, value in entries.items()]
+        if extra:
+            parts.append(extra)
+        return b"<< " + b" ".join(parts) + b" >>"
+
+    def append(self, pdf_path):
+        """
+        pdf_path의 모든 페이지를 이어 붙이고 추가된 페이지 수를 반환합니다.
+        도중에 실패하면 이 파일에서 쓴 내용과 할당한 객체 번호를 모두 되돌리고 예외를 다시 발생시키므로,
+        호출한 쪽이 예외를 무시하고 계속 병합해도 xref가 깨지지 않습니다.
+        """
+        start_offset = self._file.tell()
+        start_id = self._next_id
+        start_kids = len(self._kids)
+        try:
+            return self._append(pdf_path)
+        except BaseException:
+            self._file.seek(start_offset)
+            self._file.truncate()
+            del self._offsets[start_id:]
+            self._next_id = start_id
+            del self._kids[start_kids:]
+            raise
+
+    def _append(self, pdf_path):
+        added = 0
+        with open(pdf_path, 'rb') as source:
+            reader = PdfReader(source)
+            ref_map = {}
+            for page in reader.pages:
+                page_id = self._allocate()
+                page_ref = getattr(page, 'indirect_reference', None) or getattr(page, 'indirect_ref', None)
+                if page_ref is not None:
+                    ref_map[(page_ref.idnum, page_ref.generation)] = page_id
+                pending = []
+                entries = {key: value for key, value in dict.items(page) if key != '/Parent'}
+                body = self._serialize_dict(entries, ref_map, pending, extra=f"/Parent {self.PAGES_ID} 0 R".encode())
+                self._write_object(page_id, body)
+                while pending:
+                    object_id, target = pending.pop()
+                    self._write_object(object_id, self._serialize(target, ref_map, pending))
+                self._kids.append(page_id)
+                added += 1
+        self.page_count += added
+        return added
+
+    def close(self):
+        kids = " ".join(f"{kid} 0 R" for kid in self._kids)
+        self._write_object(self.PAGES_ID, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._kids)} >>".encode())
+        self._write_object(self.CATALOG_ID, f"<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>".encode())
+        xref_offset = self._file.tell()
+        self._file.write(f"xref\n0 {self._next_id}\n".encode())
+        self._file.write(b"0000000000 65535 f \n")
+        for object_id in range(1, self._next_id):
+            self._file.write(f"{self._offsets[object_id]:010d} 00000 n \n".encode())
+        self._file.write(f"trailer\n<< /Size {self._next_id} /Root {self.CATALOG_ID} 0 R >>\n".encode())
+        self._file.write(f"startxref\n{xref_offset}\n%%EOF\n".encode())
+        self._file.close()
+        os.replace(self.part_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+# ------------------------
+# LibreOffice 변환 워커 풀
+# ------------------------
+# 헤드리스 LibreOffice를 로컬 소켓 리스너(UNO)로 상주시켜 두고 변환 작업을 나눠 맡깁니다.
+# UNO 바인딩이 없거나 풀 변환이 실패하면 기존 subprocess 방식으로 변환합니다.
+OFFICE_BINARY = os.getenv('OFFICE_BINARY', 'libreoffice')
+OFFICE_POOL_SIZE = int(os.getenv('OFFICE_POOL_SIZE', '2'))              # 0이면 풀을 사용하지 않음
+OFFICE_JOB_TIMEOUT = int(os.getenv('OFFICE_JOB_TIMEOUT', '120'))        # 변환 1건당 최대 시간(초)
+OFFICE_STARTUP_TIMEOUT = int(os.getenv('OFFICE_STARTUP_TIMEOUT', '30'))  # 워커 기동 대기 시간(초)
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+except ImportError:
+    uno = None
+
+def _find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _uno_property(name, value):
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+class OfficeWorker:
+    """
+    로컬 소켓에서 UNO 연결을 받는 헤드리스 LibreOffice 프로세스 1개.
+    """
+    def __init__(self, index):
+        self.index = index
+        self.port = None
+        self.process = None
+        self.desktop = None
+        self.profile_dir = os.path.join(tempfile.gettempdir(), f'ar_office_{os.getpid()}_{index}')
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None and self.desktop is not None
+
+    def start(self):
+        self.port = _find_free_port()
+        accept = f"socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"
+        command = [
+            OFFICE_BINARY,
+            '--headless', '--invisible', '--nologo', '--nodefault', '--norestore', '--nolockcheck',
+            f"-env:UserInstallation={uno.systemPathToFileUrl(self.profile_dir)}",
+            f"--accept={accept}"
+        ]
+        logging.info(f"LibreOffice 변환 워커 {self.index} 기동 (port={self.port})")
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        local_ctx = uno.getComponentContext()
+        resolver = local_ctx.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local_ctx)
+        deadline = time.monotonic() + OFFICE_STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"LibreOffice 변환 워커 {self.index}가 기동 중 종료되었습니다. (code={self.process.returncode})")
+            try:
+                ctx = resolver.resolve(f"uno:{accept}")
+                self.desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+                return
+            except NoConnectException:
+                time.sleep(0.5)
+        self.stop()
+        raise TimeoutError(f"LibreOffice 변환 워커 {self.index} 기동 시간 초과")
+
+    def stop(self):
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+    def convert(self, excel_path, pdf_path):
+        doc = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(excel_path)), "_blank", 0, (_uno_property("Hidden", True),)
+        )
+        try:
+            doc.storeToURL(uno.systemPathToFileUrl(os.path.abspath(pdf_path)), (_uno_property("FilterName", "calc_pdf_Export"),))
+        finally:
+            doc.close(True)
+
+class OfficeConverterPool:
+    """
+    OfficeWorker를 size개 상주시켜 변환 작업을 분배합니다.
+    작업 시간 초과나 워커 비정상 종료 시 해당 워커를 재기동합니다.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._idle = queue.Queue()
+        self._workers = [OfficeWorker(i) for i in range(size)]
+        for worker in self._workers:
+            self._idle.put(worker)
+        self.stats = {'jobs': 0, 'failures': 0, 'timeouts': 0, 'restarts': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _restart(self, worker):
+        worker.stop()
+        self._count('restarts')
+        worker.start()
+
+    def convert(self, excel_path, output_folder):
+        base_filename = os.path.splitext(os.path.basename(excel_path))[0]
+        pdf_path = os.path.join(output_folder, f"{base_filename}.pdf")
+        try:
+            worker = self._idle.get(timeout=OFFICE_JOB_TIMEOUT)
+        except queue.Empty:
+            self._count('timeouts')
+            raise TimeoutError("사용 가능한 LibreOffice 변환 워커가 없습니다.")
+        try:
+            if worker.process is None:
+                worker.start()
+            elif not worker.alive():
+                logging.warning(f"LibreOffice 변환 워커 {worker.index}가 종료되어 재기동합니다.")
+                self._restart(worker)
+            outcome = {}
+
+            def run():
+                try:
+                    worker.convert(excel_path, pdf_path)
+                except Exception as e:
+                    outcome['error'] = e
+
+            job = threading.Thread(target=run, daemon=True)
+            job.start()
+            job.join(OFFICE_JOB_TIMEOUT)
+            if job.is_alive():
+                self._count('timeouts')
+                logging.error(f"LibreOffice 변환 시간 초과 ({OFFICE_JOB_TIMEOUT}초): {excel_path}")
+                worker.stop()
+                raise TimeoutError(f"PDF 변환 시간 초과: {excel_path}")
+            if 'error' in outcome:
+                self._count('failures')
+                if worker.process is None or worker.process.poll() is not None:
+                    worker.stop()
+                raise outcome['error']
+            if not os.path.exists(pdf_path):
+                self._count('failures')
+                raise FileNotFoundError(f"PDF 변환이 실패했습니다: {pdf_path}")
+            self._count('jobs')
+            return pdf_path
+        finally:
+            self._idle.put(worker)
+
+    def shutdown(self):
+        for worker in self._workers:
+            worker.stop()
+
+_office_pool = None
+_office_pool_pid = None
+_office_pool_lock = threading.Lock()
+_office_fallbacks = 0
+
+def get_office_pool():
+    """
+    현재 프로세스의 LibreOffice 변환 워커 풀을 반환합니다. 사용할 수 없으면 None.
+    """
+    global _office_pool, _office_pool_pid
+    if uno is None or OFFICE_POOL_SIZE <= 0:
+        return None
+    with _office_pool_lock:
+        if _office_pool is None or _office_pool_pid != os.getpid():
+            _office_pool = OfficeConverterPool(OFFICE_POOL_SIZE)
+            _office_pool_pid = os.getpid()
+            atexit.register(_office_pool.shutdown)
+        return _office_pool
+
+def office_pool_metrics():
+    metrics = {'ar_office_fallbacks_total': _office_fallbacks}
+    pool = _office_pool if _office_pool_pid == os.getpid() else None
+    if pool is not None:
+        with pool._stats_lock:
+            metrics['ar_office_workers'] = pool.size
+            metrics['ar_office_jobs_total'] = pool.stats['jobs']
+            metrics['ar_office_job_failures_total'] = pool.stats['failures']
+            metrics['ar_office_job_timeouts_total'] = pool.stats['timeouts']
+            metrics['ar_office_worker_restarts_total'] = pool.stats['restarts']
+    return metrics
+
 def convert_excel_to_pdf(excel_path, output_folder):
+    global _office_fallbacks
+    pool = get_office_pool()
+    if pool is not None:
+        try:
+            logging.info(f"LibreOffice 변환 워커 풀로 PDF 변환 중: {excel_path}")
+            pdf_path = pool.convert(excel_path, output_folder)
+            logging.info(f"PDF 파일이 성공적으로 생성되었습니다: {pdf_path}")
+            return pdf_path
+        except Exception as e:
+            _office_fallbacks += 1
+            logging.warning(f"변환 워커 풀 오류로 subprocess 방식으로 재시도합니다: {e}")
+    return convert_excel_to_pdf_subprocess(excel_path, output_folder)
+
+def convert_excel_to_pdf_subprocess(excel_path, output_folder):
     try:
         command = [
-            'libreoffice',
+            OFFICE_BINARY,
             '--headless',
             '--convert-to', 'pdf',
             '--outdir', output_folder,
             excel_path
         ]
         logging.info(f"LibreOffice를 사용하여 PDF로 변환 중: {excel_path}")
-        subprocess.run(command, check=True)
+        subprocess.run(command, check=True, timeout=OFFICE_JOB_TIMEOUT)
         base_filename = os.path.splitext(os.path.basename(excel_path))[0]
         pdf_filename = f"{base_filename}.pdf"
         pdf_path = os.path.join(output_folder, pdf_filename)
@@ -570,7 +1541,7 @@ def fetch_data(engine, target_date):
                 c.president,       -- 매출처 성명
                 c.address1         -- 매출처 주소
             FROM {AR_ORDER_DETAILS_ITEM_TABLE} a
-            LEFT JOIN {CM_CHAIN_TABLE} c ON a.client_code COLLATE utf8mb4_unicode_ci = c.chain_no COLLATE utf8mb4_unicode_ci
+            LEFT JOIN {CM_CHAIN_TABLE} c ON a.client_key = c.chain_key
             WHERE a.order_date = '{target_date}'
             ORDER BY a.client_code, a.order_date
         """
@@ -581,7 +1552,8 @@ def fetch_data(engine, target_date):
         logging.error(f"데이터 조회 중 오류 발생: {e}")
         return None
 
-def export_orders_to_files(order_date):
+def export_orders_to_files(order_date, output_engine=None):
+    output_engine = output_engine or EXPORT_ENGINE
     setup_export_logging()
     engine = get_sqlalchemy_engine()
     if engine is None:
@@ -597,6 +1569,16 @@ def export_orders_to_files(order_date):
         os.makedirs(OUTPUT_FOLDER)
         logging.info(f"출력 폴더 생성: {OUTPUT_FOLDER}")
     file_paths = []
+    # 거래처별 PDF가 생성되는 즉시 merged_orders PDF에 이어 붙임
+    merged_pdf_path = os.path.join(OUTPUT_FOLDER, f"merged_orders_{order_date}.pdf")
+    merged_writer = StreamingPdfWriter(merged_pdf_path)
+
+    def append_to_merged(pdf_path):
+        try:
+            merged_writer.append(pdf_path)
+        except Exception as e:
+            logging.error(f"PDF 병합 오류 ({pdf_path}): {e}", exc_info=True)
+
     for client_code, group in grouped:
         client_name = group['client_name'].iloc[0]
         logging.info(f"Processing client_code: {client_code}, client_name: {client_name}")
@@ -609,6 +1591,15 @@ def export_orders_to_files(order_date):
         if pd.isna(client_name) or client_name.strip() == "":
             logging.error(f"클라이언트 이름 누락 (client_code: {client_code}). 건너뜀.")
             continue
+        if output_engine == 'pdf':
+            try:
+                pdf_path = generate_statement_pdf(client_name, order_date, df_processed)
+                file_paths.append(pdf_path)
+                append_to_merged(pdf_path)
+                logging.info(f"{order_date} PDF 파일 생성 완료: {pdf_path}")
+            except Exception as e:
+                logging.error(f"PDF 생성 오류 (client_code: {client_code}, order_date: {order_date}): {e}")
+            continue
         try:
             wb, ws = load_excel_template()
         except Exception as e:
@@ -621,28 +1612,24 @@ def export_orders_to_files(order_date):
             try:
                 pdf_path = convert_excel_to_pdf(excel_path, OUTPUT_FOLDER)
                 file_paths.append(pdf_path)
+                append_to_merged(pdf_path)
                 logging.info(f"{order_date} PDF 파일 생성 완료: {pdf_path}")
             except Exception as e:
                 logging.error(f"PDF 변환 오류 (client_code: {client_code}, order_date: {order_date}): {e}")
         except Exception as e:
             logging.error(f"엑셀 파일 생성 오류 (client_code: {client_code}, order_date: {order_date}): {e}")
-    logging.info("모든 개별 PDF 파일 생성 완료. 병합 시작.")
-    if file_paths:
-        merged_pdf_path = os.path.join(OUTPUT_FOLDER, f"merged_orders_{order_date}.pdf")
+    logging.info("모든 개별 PDF 파일 생성 및 병합 완료.")
+    if merged_writer.page_count > 0:
         try:
-            merger = PdfMerger()
-            # file_paths 리스트에서 PDF 파일만 선택 (확장자가 .pdf)
-            pdf_files = [fp for fp in file_paths if fp.lower().endswith('.pdf')]
-            for pdf in pdf_files:
-                merger.append(pdf)
-            merger.write(merged_pdf_path)
-            merger.close()
+            merged_writer.close()
             logging.info(f"PDF 병합 완료: {merged_pdf_path}")
             return merged_pdf_path
         except Exception as e:
             logging.error(f"PDF 병합 오류: {e}", exc_info=True)
+            merged_writer.abort()
             raise e
     else:
+        merged_writer.abort()
         logging.error("생성된 PDF 파일이 없습니다.")
         raise ValueError("생성된 PDF 파일이 없습니다.")
     
@@ -657,18 +1644,6 @@ def setup_export_logging():
     )
     logging.info("내보내기 프로세스 시작.")
 
-def get_sqlalchemy_engine():
-    try:
-        engine = create_engine(
-            f"mysql+pymysql://{os.getenv('DB_USER', 'nolboo')}:{os.getenv('DB_PASSWORD', '2024!puser')}@"
-            f"{os.getenv('DB_HOST', '175.196.7.45')}/{os.getenv('DB_NAME', 'nolboo')}?charset=utf8mb4"
-        )
-        logging.info("SQLAlchemy 엔진이 성공적으로 생성되었습니다.")
-        return engine
-    except Exception as e:
-        logging.error(f"SQLAlchemy 엔진 생성 오류: {e}")
-        return None
-
 def preprocess_data(df):
     required_columns = list(COLUMN_MAPPING.values()) + ['full_name', 'reg_no', 'president', 'address1']  # 추가 컬럼
     missing_columns = [col for col in required_columns if col not in df.columns]
@@ -715,10 +1690,11 @@ def download_client_orders_form():
     if db:
         try:
             with db.cursor(dictionary=True) as cursor:
+                # 발주 내역이 있는 매출처만 (client_key 인덱스로 존재 여부만 확인)
                 cursor.execute("""
-                    SELECT DISTINCT c.chain_no, c.full_name 
+                    SELECT c.chain_no, c.full_name 
                     FROM cm_chain c
-                    INNER JOIN AROrderDetailsItem a ON a.client_code = c.chain_no
+                    WHERE EXISTS (SELECT 1 FROM AROrderDetailsItem a WHERE a.client_key = c.chain_key)
                     ORDER BY c.full_name
                 """)
                 clients = cursor.fetchall()
@@ -833,16 +1809,28 @@ def download_client_orders_form():
 # ------------------------
 # Background task function
 # ------------------------
-def background_export_client_orders(from_date, to_date, client_code, task_id):
+def task_output_folder(task_id):
+    """
+    백그라운드 내보내기 작업의 거래처별 통합 PDF 폴더. 병합 중인 파일은 '.part'로 있다가
+    끝나면 .pdf로 바뀌므로, 이 폴더의 .pdf는 모두 완성된 파일입니다 (부분 다운로드에 사용).
+    """
+    return os.path.join(OUTPUT_FOLDER, 'tasks', task_id)
+
+def background_export_client_orders(from_date, to_date, client_code, task_id, output_engine=None):
+    progress = TaskProgress(task_id)
     try:
         logging.info(f"백그라운드 작업 시작: task_id={task_id}")
         # This function should merge the individual PDF files and return the final merged PDF path.
-        final_pdf = export_client_orders_to_files(from_date, to_date, client_code)
-        # Always store a list of file paths (even if one file)
-        update_task_status(task_id, 'complete', json.dumps([final_pdf]))
+        cache_stats = {}
+        final_pdf = export_client_orders_to_files(from_date, to_date, client_code, output_engine, cache_stats, progress,
+                                                  task_output_folder(task_id))
+        progress.finish('complete')
+        # 결과: 파일 경로 목록 + 일자별 PDF 캐시 적중률
+        update_task_status(task_id, 'complete', json.dumps({'files': final_pdf, 'cache': cache_summary(cache_stats)}))
         logging.info(f"백그라운드 작업 완료: task_id={task_id}")
     except Exception as e:
         logging.error(f"백그라운드 작업 오류 (task_id={task_id}): {e}", exc_info=True)
+        progress.finish('failed')
         update_task_status(task_id, 'failed', str(e))
 
 # ------------------------
@@ -875,16 +1863,23 @@ def download_client_orders():
         client_code = form.client_code.data.strip() if form.client_code.data else ""
         from_date = form.from_date.data.strftime('%Y-%m-%d')
         to_date = form.to_date.data.strftime('%Y-%m-%d')
-        logging.info(f"매출처 거래명세표 생성 요청 - client_code: '{client_code}', 기간: {from_date} ~ {to_date}")
+        output_engine = form.engine.data
+        logging.info(f"매출처 거래명세표 생성 요청 - client_code: '{client_code}', 기간: {from_date} ~ {to_date}, 출력 방식: {output_engine}")
         try:
-            task_id = str(uuid.uuid4())
-            insert_task(task_id, 'pending')
-            thread = threading.Thread(target=background_export_client_orders,
-                                      args=(from_date, to_date, client_code, task_id))
-            thread.start()
-            flash("파일 생성 작업이 백그라운드에서 시작되었습니다. 잠시 후 '다운로드 상태' 페이지를 새로고침해 주세요.", "info")
+            params = {'from_date': from_date, 'to_date': to_date,
+                      'client_code': client_code, 'output_engine': output_engine}
+            priority = JOB_PRIORITY_HIGH if client_code else JOB_PRIORITY_NORMAL
+            task_id, created = get_job_queue().submit('client_statements', params, priority)
+            if created:
+                flash("파일 생성 작업이 백그라운드에서 시작되었습니다. 잠시 후 '다운로드 상태' 페이지를 새로고침해 주세요.", "info")
+            else:
+                flash("같은 조건의 작업이 이미 진행 중입니다. 해당 작업의 상태를 표시합니다.", "info")
             # Instead of redirecting immediately, render a status page
             return render_template('download_client_orders_status.html', task_id=task_id)
+        except JobQueueFullError as e:
+            logging.warning(f"작업 큐 대기 한도 초과: {e}")
+            flash("현재 대기 중인 작업이 많습니다. 잠시 후 다시 시도해 주세요.", 'warning')
+            return redirect(url_for('download_client_orders_form'))
         except Exception as e:
             logging.error(f"매출처 거래명세표 생성 오류: {e}", exc_info=True)
             flash(f"매출처 거래명세표 생성 중 오류가 발생했습니다: {e}", 'danger')
@@ -906,11 +1901,95 @@ def api_task_status():
     if not task:
         return jsonify({'error': 'Invalid task_id'}), 404
     # Return only the relevant fields.
-    return jsonify({
-        'task_id': task_id,
-        'status': task.get('status', ''),
-        'result': task.get('result', '')
-    })
+    return jsonify(task_status_payload(task_id, task.get('status'), task.get('result'), task.get('progress')))
+
+@app.route('/api/task_events', methods=['GET'])
+def api_task_events():
+    """
+    작업 상태를 Server-Sent Events로 전달합니다. 상태가 바뀔 때만 이벤트를 보내고,
+    complete/failed가 되면 스트림을 닫습니다.
+    연결 하나가 최대 TASK_EVENT_MAX_SECONDS 동안 요청 처리 스레드를 점유하므로
+    gunicorn은 동기(sync) 워커가 아니라 gthread/gevent 워커로 실행해야 합니다.
+    """
+    task_id = request.args.get('task_id')
+    if not task_id:
+        return jsonify({'error': 'No task_id provided'}), 400
+    if task_events.snapshot(task_id) is None:
+        task = get_task(task_id)
+        if not task:
+            return jsonify({'error': 'Invalid task_id'}), 404
+        task_events.load(task)
+
+    def stream():
+        version = None
+        deadline = time.time() + TASK_EVENT_MAX_SECONDS
+        last_db_read = time.time()
+        yield "retry: 3000\n\n"
+        while time.time() < deadline:
+            entry = task_events.wait(task_id, version, TASK_EVENT_HEARTBEAT)
+            if entry is None:
+                # 메모리에서 정리된 경우 DB에서 다시 읽습니다.
+                task = get_task(task_id)
+                if not task:
+                    return
+                task_events.load(task)
+                continue
+            if entry['version'] == version:
+                # 작업은 다른 프로세스(gunicorn 워커, 중단 작업 복구)가 실행할 수도 있어 이 프로세스의
+                # 알림만으로는 알 수 없습니다. 변경이 없는 동안에는 주기적으로 DB를 확인합니다.
+                if time.time() - last_db_read >= TASK_EVENT_DB_REFRESH:
+                    last_db_read = time.time()
+                    task = get_task(task_id)
+                    if task:
+                        task_events.load(task)
+                yield ": keepalive\n\n"
+                continue
+            version = entry['version']
+            payload = task_status_payload(task_id, **entry['fields'])
+            yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+            if payload['status'] in ('complete', 'failed'):
+                return
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/download_client_orders_partial', methods=['GET'])
+def download_client_orders_partial():
+    """
+    작업이 진행 중이어도 지금까지 병합이 끝난 거래처 PDF를 ZIP으로 내려받습니다.
+    """
+    task_id = request.args.get('task_id', None)
+    task = get_task(task_id) if task_id else None
+    if not task:
+        flash("유효하지 않은 작업 ID입니다.", "danger")
+        return redirect(url_for('download_client_orders_form'))
+    output_dir = task_output_folder(task['task_id'])
+    try:
+        pdf_files = sorted(os.path.join(output_dir, name) for name in os.listdir(output_dir) if name.lower().endswith('.pdf'))
+    except FileNotFoundError:
+        pdf_files = []
+    if not pdf_files:
+        flash("아직 완료된 거래처 파일이 없습니다.", "warning")
+        return redirect(url_for('download_client_orders_status', task_id=task_id))
+    return zip_download_response(pdf_files, f"거래명세표_{task_id}_부분_{len(pdf_files)}.zip")
+
+# ------------------------
+# Route: Prometheus 메트릭
+# ------------------------
+def collect_metrics():
+    """
+    스크랩용 메트릭을 모두 모아 반환합니다.
+    """
+    metrics = {}
+    metrics.update(db_pool_metrics())
+    metrics.update(office_pool_metrics())
+    metrics.update(job_queue_metrics())
+    return metrics
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    lines = [f"{name} {value}" for name, value in collect_metrics().items()]
+    return Response("\n".join(lines) + "\n", mimetype='text/plain; version=0.0.4')
 
 # ------------------------
 # Route: Status page (polled or auto-refreshed) and final download
@@ -958,11 +2037,9 @@ def merge_client_pdfs(from_date, to_date):
         final_filename = f"거래명세표_{client_name}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.pdf"
         final_path = os.path.join(OUTPUT_FOLDER, final_filename)
         try:
-            merger = PdfMerger()
-            for pdf in files:
-                merger.append(pdf)
-            merger.write(final_path)
-            merger.close()
+            with StreamingPdfWriter(final_path) as writer:
+                for pdf in files:
+                    writer.append(pdf)
             logging.info(f"클라이언트 {client_name} 최종 병합 PDF 생성 완료: {final_path}")
             merged_dict[client_name] = final_path
         except Exception as e:
@@ -1034,41 +2111,24 @@ def download_client_orders_file():
         return redirect(url_for('download_client_orders_status', task_id=task_id))
     
     try:
-        result = json.loads(task['result'])
+        result = task_result_files(task['result'])
     except Exception as e:
         logging.error(f"작업 결과 파싱 오류: {e}", exc_info=True)
         flash("작업 결과를 처리하는 중 오류가 발생했습니다.", "danger")
         return redirect(url_for('download_client_orders_form'))
     
-    # result가 리스트가 아닌 경우 리스트로 변환
-    if not isinstance(result, list):
-        result = [result]
-    
-    # 중첩 리스트 평탄화 (이미 정의한 flatten_list 함수 사용)
-    pdf_files = [fp for fp in flatten_list(result)
+    pdf_files = [fp for fp in result
                  if isinstance(fp, str) and os.path.isfile(fp) and fp.lower().endswith('.pdf')]
     
     if not pdf_files:
         flash("생성된 PDF 파일이 없습니다.", "danger")
         return redirect(url_for('download_client_orders_form'))
     
-    # 모든 PDF 파일을 ZIP 파일로 압축
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        zip_filename = f"거래명세표_{task_id}.zip"
-        zip_path = os.path.join(tmpdirname, zip_filename)
-        try:
-            with ZipFile(zip_path, 'w') as zipf:
-                for pdf in pdf_files:
-                    zipf.write(pdf, os.path.basename(pdf))
-            logging.info(f"ZIP 파일 생성 완료: {zip_path}")
-            response = send_file(zip_path, as_attachment=True, download_name=zip_filename)
-            # 다운로드 후 5초 뒤 download_client_orders_form 화면으로 이동
-            response.headers["Refresh"] = "5; url=" + url_for("download_client_orders_form")
-            return response
-        except Exception as e:
-            logging.error(f"ZIP 파일 생성 오류: {e}", exc_info=True)
-            flash("파일 압축 중 오류가 발생했습니다.", "danger")
-            return redirect(url_for('download_client_orders_form'))
+    # 모든 PDF 파일을 ZIP으로 묶어 스트리밍
+    response = zip_download_response(pdf_files, f"거래명세표_{task_id}.zip")
+    # 다운로드 후 5초 뒤 download_client_orders_form 화면으로 이동
+    response.headers["Refresh"] = "5; url=" + url_for("download_client_orders_form")
+    return response
 
 def flatten_list(lst):
     """중첩 리스트를 평탄화하는 함수"""
@@ -1079,49 +2139,117 @@ def flatten_list(lst):
         else:
             flat.append(item)
     return flat
-@app.route('/download_client_orders_status', methods=['GET'])
-def download_client_orders_status():
-    task_id = request.args.get('task_id', None)
-    if not task_id:
-        flash("작업 ID가 제공되지 않았습니다.", "danger")
-        return redirect(url_for('download_client_orders_form'))
-    task = get_task(task_id)
-    if not task:
-        flash("유효하지 않은 작업 ID입니다.", "danger")
-        return redirect(url_for('download_client_orders_form'))
-    
-    if task['status'] == 'pending':
-        return render_template('download_client_orders_status.html', status="진행중", task_id=task_id)
-    elif task['status'] == 'failed':
-        flash(f"작업 실패: {task['result']}", "danger")
-        return redirect(url_for('download_client_orders_form'))
-    elif task['status'] == 'complete':
-        try:
-            file_paths = json.loads(task['result'])
+
+# ------------------------
+# ZIP 스트리밍 응답
+# ------------------------
+# 임시 ZIP 파일을 만들지 않고, 파일을 읽는 대로 ZIP 조각을 응답으로 흘려보냅니다.
+ZIP_STREAM_CHUNK_SIZE = 256 * 1024
+ZIP_STORED_EXTENSIONS = ('.pdf', '.xlsx', '.zip')  # 이미 압축된 형식은 다시 압축하지 않음
+
+class _ZipStreamBuffer:
+    """
+    ZipFile이 쓰는 바이트를 모아 두었다가 drain()으로 꺼내는 쓰기 전용 버퍼.
+    tell/seek가 없으므로 ZipFile은 데이터 디스크립터 방식으로 기록합니다.
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+def stream_zip(file_paths):
+    """
+    파일 목록을 ZIP으로 묶으면서 만들어지는 바이트 조각을 차례로 yield 합니다.
+    메모리 사용량은 파일 크기와 관계없이 ZIP_STREAM_CHUNK_SIZE 수준입니다.
+    """
+    buffer = _ZipStreamBuffer()
+    with ZipFile(buffer, 'w') as zipf:
+        for file_path in file_paths:
+            zinfo = ZipInfo.from_file(file_path, os.path.basename(file_path))
+            zinfo.compress_type = ZIP_STORED if file_path.lower().endswith(ZIP_STORED_EXTENSIONS) else ZIP_DEFLATED
+            with open(file_path, 'rb') as src, zipf.open(zinfo, 'w') as dst:
+                while True:
+                    chunk = src.read(ZIP_STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    yield from buffer.drain()
+            yield from buffer.drain()
+    yield from buffer.drain()
+
+def zip_download_response(file_paths, download_name):
+    """
+    file_paths를 스트리밍 ZIP 첨부파일 응답으로 반환합니다.
+    """
+    def generate():
+        try:
+            yield from stream_zip(file_paths)
+            logging.info(f"ZIP 스트리밍 완료: {download_name} ({len(file_paths)}개 파일)")
+        except Exception as e:
+            logging.error(f"ZIP 스트리밍 오류 ({download_name}): {e}", exc_info=True)
+            raise
+
+    response = Response(generate(), mimetype='application/zip', direct_passthrough=True)
+    try:
+        download_name.encode('ascii')
+        names = {'filename': download_name}
+    except UnicodeEncodeError:
+        # 한글 파일명은 RFC 5987 filename*로 전달하고, filename에는 ASCII 대체 이름을 둡니다.
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        names = {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='!#$&+-.^_`|~')}"}
+    response.headers.set('Content-Disposition', 'attachment', **names)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def task_result_files(result):
+    """
+    background_tasks.result(JSON)에서 파일 경로 목록을 꺼냅니다.
+    {'files': [...], 'cache': {...}} 형식과 이전의 (중첩) 리스트 형식을 모두 지원합니다.
+    """
+    parsed = json.loads(result)
+    if isinstance(parsed, dict):
+        parsed = parsed.get('files', [])
+    if not isinstance(parsed, list):
+        parsed = [parsed]
+    return flatten_list(parsed)
+@app.route('/download_client_orders_status', methods=['GET'])
+def download_client_orders_status():
+    task_id = request.args.get('task_id', None)
+    if not task_id:
+        flash("작업 ID가 제공되지 않았습니다.", "danger")
+        return redirect(url_for('download_client_orders_form'))
+    task = get_task(task_id)
+    if not task:
+        flash("유효하지 않은 작업 ID입니다.", "danger")
+        return redirect(url_for('download_client_orders_form'))
+    
+    if task['status'] in ('pending', 'running'):
+        return render_template('download_client_orders_status.html', status="진행중", task_id=task_id)
+    elif task['status'] == 'failed':
+        flash(f"작업 실패: {task['result']}", "danger")
+        return redirect(url_for('download_client_orders_form'))
+    elif task['status'] == 'complete':
+        try:
+            flat_file_paths = task_result_files(task['result'])
         except Exception as e:
             logging.error(f"작업 결과 파싱 오류: {e}", exc_info=True)
             flash("작업 결과를 처리하는 중 오류가 발생했습니다.", "danger")
             return redirect(url_for('download_client_orders_form'))
         
-        # 중첩된 file_paths를 평탄화
-        flat_file_paths = flatten_list(file_paths)
         # PDF 파일 경로만 선택 (문자열이며 실제 파일이 존재하고 확장자가 .pdf인 경우)
         pdf_files = [fp for fp in flat_file_paths if isinstance(fp, str) and os.path.isfile(fp) and fp.lower().endswith('.pdf')]
         
         if pdf_files:
-            zip_filename = f"거래명세표_{task_id}.zip"
-            with tempfile.TemporaryDirectory() as tmpdirname:
-                zip_path = os.path.join(tmpdirname, zip_filename)
-                try:
-                    with ZipFile(zip_path, 'w') as zipf:
-                        for fp in pdf_files:
-                            zipf.write(fp, os.path.basename(fp))
-                    logging.info(f"ZIP 파일 생성 완료: {zip_path}")
-                    return send_file(zip_path, as_attachment=True, download_name=zip_filename)
-                except Exception as e:
-                    logging.error(f"ZIP 파일 생성 오류: {e}", exc_info=True)
-                    flash("파일 압축 중 오류가 발생했습니다.", "danger")
-                    return redirect(url_for('download_client_orders_form'))
+            return zip_download_response(pdf_files, f"거래명세표_{task_id}.zip")
         else:
             flash("생성된 PDF 파일이 없습니다.", "danger")
             return redirect(url_for('download_client_orders_form'))
@@ -1129,7 +2257,220 @@ def download_client_orders_status():
         flash("알 수 없는 작업 상태입니다.", "danger")
         return redirect(url_for('download_client_orders_form'))
 
+# ------------------------
+# 웹발주 ETL 증분 추출 / 결과 캐시
+# ------------------------
+# 같은 날 다시 실행하면 지난 실행의 워터마크(t_po_order_master.time 최댓값) 이후 주문 행만 추출하여
+# 저장해 둔 추출 결과에 이어 붙입니다.
+# 추출 쿼리는 행마다 출력 컬럼(매출처/품목 이름, 적용 단가/세액, 수량 등)의 IFX_CHECKSUM(row_checksum)을 함께 돌려주고,
+# 상태 파일에는 지금까지 추출한 행의 지문(건수 + 체크섬 합계)을 누적해 둡니다.
+# 다음 실행은 워터마크 이전 행의 지문만 한 번 조회해 저장된 값과 비교하고, 같으면 워터마크 이후 행만 추출합니다.
+# 주문 행 수정/삭제나 매출처/품목 마스터 변경으로 출력 값이 바뀌면 지문이 달라지고, 그날 데이터를 모두 다시 추출합니다.
+# 확인하지 못하는 경우:
+#   - 행별 체크섬 합계가 우연히 같은 변경 (충돌)
+#   - ETL_RESULT_CACHE_SECONDS 안의 재요청 (Informix를 조회하지 않으므로 그 사이의 변경은 다음 실행에 반영)
+# IFX_CHECKSUM을 쓸 수 없으면 증분 없이 매번 전체를 추출합니다.
+# 오늘자 t_po_order_master DELETE + pr_order_data_load 재적재는 증분 모드에서도 매번 실행합니다. 이 프로시저는
+# 그날 데이터가 이미 있으면 적재하지 않고 '2'(이미 처리 완료)를 반환하므로, 그 사이 들어온 주문을
+# t_po_order_master로 가져오는 방법이 이 재적재뿐입니다.
+ETL_OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'excel_output')
+ETL_STATE_FILE = os.path.join(ETL_OUTPUT_FOLDER, 'web_order_etl_state.json')
+ETL_INCREMENTAL = os.getenv('ETL_INCREMENTAL', 'true').lower() == 'true'
+ETL_RESULT_CACHE_SECONDS = int(os.getenv('ETL_RESULT_CACHE_SECONDS', '300'))
+_etl_lock = threading.Lock()
+
+# 추출 대상 주문 행 (추출 쿼리와 지문 쿼리가 같이 씁니다)
+WEB_ORDER_ROWS_QUERY = """
+            SELECT a.date AS date, 
+                   b.full_name AS full_name, 
+                   b.rechain_no AS rechain_no, 
+                   c.full_name AS rep_full_name, 
+                   a.item_no AS item_no, 
+                   d.full_name AS item_full_name, 
+                   a.qty AS qty, 
+                   a.time AS time, 
+                   a.remark AS remark, 
+                   a.out_date AS out_date, 
+                   CASE 
+                       WHEN b.contract_no = '2' THEN 
+                           CASE 
+                               WHEN d.PACKAGE_MODEL_PRICE = 0 THEN d.MODEL_PRICE 
+                               ELSE d.PACKAGE_MODEL_PRICE 
+                           END 
+                       ELSE 
+                           CASE 
+                               WHEN d.PACKAGE_CHAIN_PRICE = 0 THEN d.CHAIN_PRICE 
+                               ELSE d.PACKAGE_CHAIN_PRICE 
+                           END 
+                   END AS item_price,
+                   CASE 
+                       WHEN b.contract_no = '2' THEN 
+                           CASE 
+                               WHEN d.PACKAGE_MODEL_TAX = 0 THEN d.MODEL_TAX 
+                               ELSE d.PACKAGE_MODEL_TAX 
+                           END 
+                       ELSE 
+                           CASE 
+                               WHEN d.PACKAGE_CHAIN_TAX = 0 THEN d.CHAIN_TAX 
+                               ELSE d.PACKAGE_CHAIN_TAX 
+                           END 
+                   END AS item_tax,
+                   CASE 
+                        WHEN tax_type = '1' THEN 'Tax' 
+                        ELSE 'No Tax' 
+                   END AS tax
+            FROM t_po_order_master AS a
+            INNER JOIN cm_chain AS b ON a.chain_no = b.chain_no  
+            INNER JOIN cm_chain AS c ON b.rechain_no = c.chain_no 
+            INNER JOIN v_item_master AS d ON a.item_no = d.item_no 
+            WHERE a.date = ?{time_filter}
+"""
+
+# 행 체크섬에 넣는 컬럼: 엑셀에 나가는 값 (date는 그날 모두 같으므로 제외, total은 qty/단가/세액에서 계산)
+WEB_ORDER_CHECKSUM_COLUMNS = [
+    'full_name', 'rechain_no', 'rep_full_name', 'item_no', 'item_full_name', 'qty', 'time',
+    'remark', 'out_date', 'item_price', 'item_tax', 'tax',
+]
+
+def web_order_checksum_expression():
+    """
+    행 하나의 체크섬 SQL 식. 컬럼마다 앞 컬럼의 체크섬을 시드로 이어서 계산합니다 (NULL은 '~').
+    """
+    expression = '0'
+    for column in WEB_ORDER_CHECKSUM_COLUMNS:
+        expression = f"IFX_CHECKSUM(NVL({column}::LVARCHAR, '~'), {expression})"
+    return expression
+
+WEB_ORDER_EXTRACT_QUERY = f"""
+        SELECT date, 
+               full_name, 
+               rechain_no, 
+               rep_full_name, 
+               item_no, 
+               item_full_name, 
+               qty, 
+               time, 
+               remark, 
+               out_date, 
+               item_price, 
+               item_tax, 
+               tax,
+               (qty * (item_price + item_tax)) AS total{{checksum_column}}
+        FROM ({WEB_ORDER_ROWS_QUERY}) subquery;
+"""
+
+WEB_ORDER_FINGERPRINT_QUERY = f"""
+        SELECT COUNT(*), SUM({web_order_checksum_expression()})
+        FROM ({WEB_ORDER_ROWS_QUERY}) subquery
+"""
+
+def extract_web_orders(cursor, today_str, time_filter='', params=(), checksum=False):
+    """
+    오늘자 웹발주 주문 행을 추출하고 이름 컬럼의 인코딩을 변환하여 (DataFrame, 지문)을 반환합니다.
+    time_filter는 WHERE 절에 덧붙일 a.time 조건 (params는 그 조건의 값).
+    checksum이 참이면 행 체크섬을 함께 읽어 지문 [건수, 체크섬 합계]를 만들고, 아니면 지문은 None입니다.
+    """
+    checksum_column = f",\n               {web_order_checksum_expression()} AS row_checksum" if checksum else ''
+    query = WEB_ORDER_EXTRACT_QUERY.format(time_filter=time_filter, checksum_column=checksum_column)
+
+    # Log the query string
+    log_query_string(query)
+
+    try:
+        df = extract_data(cursor, query, [today_str] + list(params))
+    except jaydebeapi.DatabaseError as db_err:
+        logging.error(f"3단계 데이터 추출 중 오류 발생: {db_err}")
+        logging.error(traceback.format_exc())
+        raise db_err
+
+    stats = None
+    if checksum:
+        stats = [len(df), sum(int(value) for value in df['row_checksum'])]
+        df = df.drop(columns=['row_checksum'])
+
+    if not df.empty:
+        # 데이터 검증: 특수 문자 확인
+        columns_to_convert = ['full_name', 'rep_full_name', 'item_full_name']
+        check_special_characters(df, columns_to_convert)
+
+        # 'full_name', 'rep_full_name', 'item_full_name' 컬럼에 인코딩 변환 적용
+        for col in columns_to_convert:
+            if col in df.columns:
+                df[col] = df[col].apply(convert_to_utf8)
+                logging.info(f"'{col}' 컬럼의 인코딩 변환 완료.")
+            else:
+                logging.warning(f"'{col}' 컬럼이 데이터프레임에 존재하지 않습니다.")
+    return df, stats
+
+def web_order_fingerprint(cursor, today_str, watermark):
+    """
+    워터마크 시각 이하(및 time이 없는) 오늘자 추출 대상 행의 지문 [건수, 체크섬 합계].
+    extract_web_orders(checksum=True)가 만든 지문과 같은 값입니다.
+    """
+    cursor.execute(WEB_ORDER_FINGERPRINT_QUERY.format(time_filter=" AND (a.time <= ? OR a.time IS NULL)"),
+                   (today_str, watermark))
+    row_count, checksum = cursor.fetchall()[0]
+    return [int(row_count or 0), int(Decimal(str(checksum))) if checksum is not None else 0]
+
+def load_web_order_etl_state(today_str):
+    """
+    오늘자 ETL 상태 (없거나 날짜가 다르면 None).
+    """
+    try:
+        with open(ETL_STATE_FILE, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get('date') == today_str else None
+
+def save_web_order_etl_state(today_str, watermark, stats, df, excel_path):
+    """
+    추출 결과(DataFrame pickle)와 워터마크/건수/엑셀 경로를 저장합니다. 다른 날짜의 추출 결과는 지웁니다.
+    """
+    os.makedirs(ETL_OUTPUT_FOLDER, exist_ok=True)
+    data_file = os.path.join(ETL_OUTPUT_FOLDER, f't_po_order_master_{today_str}.pkl')
+    df.to_pickle(data_file + '.tmp')
+    os.replace(data_file + '.tmp', data_file)
+
+    state = {
+        'date': today_str,
+        'watermark': watermark,
+        'stats': stats,
+        'data_file': data_file,
+        'excel_file': excel_path,
+        'built_at': time.time(),
+    }
+    with open(ETL_STATE_FILE + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(ETL_STATE_FILE + '.tmp', ETL_STATE_FILE)
+
+    for name in os.listdir(ETL_OUTPUT_FOLDER):
+        if name.startswith('t_po_order_master_') and name.endswith('.pkl') and name != os.path.basename(data_file):
+            os.remove(os.path.join(ETL_OUTPUT_FOLDER, name))
+
+def cached_web_order_excel(today_str):
+    """
+    ETL_RESULT_CACHE_SECONDS 안에 만든 오늘자 엑셀 경로 (없으면 None).
+    """
+    state = load_web_order_etl_state(today_str)
+    if (state and state.get('excel_file') and os.path.exists(state['excel_file'])
+            and time.time() - state.get('built_at', 0) < ETL_RESULT_CACHE_SECONDS):
+        return state['excel_file']
+    return None
+
 def etl_process():
+    """
+    웹발주 엑셀 파일 경로를 반환합니다 (데이터가 없으면 None).
+    ETL_RESULT_CACHE_SECONDS 안에 다시 요청하면 Informix에 연결하지 않고 지난 파일을 반환합니다.
+    """
+    with _etl_lock:
+        cached = cached_web_order_excel(datetime.now().strftime("%Y%m%d"))
+        if cached:
+            logging.info(f"웹발주 엑셀 캐시 사용: {cached}")
+            return cached
+        return run_web_order_etl()
+
+def run_web_order_etl():
     # excel_path_step3 = None  # 초기화
     try:
         logging.info("ETL 프로세스 시작.")
@@ -1225,104 +2566,66 @@ def etl_process():
             elif r_rtn_code == '0':
                 logging.info("정상 처리 완료.")
 
-        # 3단계: 최종 데이터 추출
+        # 3단계: 최종 데이터 추출 (같은 날 지난 실행 이후 주문 행만 증분 추출)
         logging.info("3단계: 최종 데이터 추출")
-        query_step3 = f"""
-        SELECT date, 
-               full_name, 
-               rechain_no, 
-               rep_full_name, 
-               item_no, 
-               item_full_name, 
-               qty, 
-               time, 
-               remark, 
-               out_date, 
-               item_price, 
-               item_tax, 
-               tax,
-               (qty * (item_price + item_tax)) AS total
-        FROM (
-            SELECT a.date AS date, 
-                   b.full_name AS full_name, 
-                   b.rechain_no AS rechain_no, 
-                   c.full_name AS rep_full_name, 
-                   a.item_no AS item_no, 
-                   d.full_name AS item_full_name, 
-                   a.qty AS qty, 
-                   a.time AS time, 
-                   a.remark AS remark, 
-                   a.out_date AS out_date, 
-                   CASE 
-                       WHEN b.contract_no = '2' THEN 
-                           CASE 
-                               WHEN d.PACKAGE_MODEL_PRICE = 0 THEN d.MODEL_PRICE 
-                               ELSE d.PACKAGE_MODEL_PRICE 
-                           END 
-                       ELSE 
-                           CASE 
-                               WHEN d.PACKAGE_CHAIN_PRICE = 0 THEN d.CHAIN_PRICE 
-                               ELSE d.PACKAGE_CHAIN_PRICE 
-                           END 
-                   END AS item_price,
-                   CASE 
-                       WHEN b.contract_no = '2' THEN 
-                           CASE 
-                               WHEN d.PACKAGE_MODEL_TAX = 0 THEN d.MODEL_TAX 
-                               ELSE d.PACKAGE_MODEL_TAX 
-                           END 
-                       ELSE 
-                           CASE 
-                               WHEN d.PACKAGE_CHAIN_TAX = 0 THEN d.CHAIN_TAX 
-                               ELSE d.PACKAGE_CHAIN_TAX 
-                           END 
-                   END AS item_tax,
-                   CASE 
-                        WHEN tax_type = '1' THEN 'Tax' 
-                        ELSE 'No Tax' 
-                   END AS tax
-            FROM t_po_order_master AS a
-            INNER JOIN cm_chain AS b ON a.chain_no = b.chain_no  
-            INNER JOIN cm_chain AS c ON b.rechain_no = c.chain_no 
-            INNER JOIN v_item_master AS d ON a.item_no = d.item_no 
-            WHERE a.date ='{today_str}'
-        ) subquery;
-        """
-
-        # Log the query string
-        log_query_string(query_step3)
-
-        try:
-            df_step3 = extract_data(informix_cursor, query_step3)
-            logging.info(f"3단계 데이터 추출 완료. 총 {len(df_step3)}개의 레코드.")
-        except jaydebeapi.DatabaseError as db_err:
-            logging.error(f"3단계 데이터 추출 중 오류 발생: {db_err}")
-            logging.error(traceback.format_exc())
-            raise db_err
+        informix_cursor.execute("SELECT MAX(time) FROM t_po_order_master WHERE date = ?", (today_str,))
+        max_time = informix_cursor.fetchall()[0][0]
+        watermark = None if max_time is None else str(max_time)
+
+        state = load_web_order_etl_state(today_str) if ETL_INCREMENTAL else None
+        previous = None
+        if (state and state.get('stats') and state.get('watermark') is not None
+                and state.get('data_file') and os.path.exists(state['data_file'])):
+            previous = pd.read_pickle(state['data_file'])
+
+        df_step3 = None
+        stats = None
+        excel_path_step3 = None
+        if previous is not None and watermark is not None:
+            try:
+                if web_order_fingerprint(informix_cursor, today_str, state['watermark']) != state['stats']:
+                    logging.info("워터마크 이전 주문 행 또는 매출처/품목 마스터가 바뀌어 오늘 데이터를 모두 다시 추출합니다.")
+                elif state['watermark'] == watermark:
+                    logging.info("지난 실행 이후 바뀐 주문 행이 없어 이전 추출 결과를 그대로 사용합니다.")
+                    df_step3, stats = previous, state['stats']
+                    if state.get('excel_file') and os.path.exists(state['excel_file']):
+                        excel_path_step3 = state['excel_file']
+                else:
+                    new_rows, new_stats = extract_web_orders(informix_cursor, today_str,
+                                                             " AND a.time > ? AND a.time <= ?",
+                                                             [state['watermark'], watermark], checksum=True)
+                    df_step3 = pd.concat([previous, new_rows], ignore_index=True)
+                    stats = [state['stats'][0] + new_stats[0], state['stats'][1] + new_stats[1]]
+                    logging.info(f"워터마크 {state['watermark']} 이후 {len(new_rows)}개 레코드를 추가했습니다.")
+            except jaydebeapi.DatabaseError as db_err:
+                logging.warning(f"증분 추출 실패, 오늘 데이터를 모두 다시 추출합니다: {db_err}")
+
+        if df_step3 is None:
+            if watermark is None:
+                time_filter, params = '', []
+            else:
+                time_filter, params = " AND (a.time <= ? OR a.time IS NULL)", [watermark]
+            if ETL_INCREMENTAL:
+                try:
+                    df_step3, stats = extract_web_orders(informix_cursor, today_str, time_filter, params, checksum=True)
+                except jaydebeapi.DatabaseError as db_err:
+                    logging.warning(f"행 체크섬을 계산할 수 없어 증분 없이 추출합니다: {db_err}")
+            if df_step3 is None:
+                df_step3, stats = extract_web_orders(informix_cursor, today_str, time_filter, params)
+        logging.info(f"3단계 데이터 추출 완료. 총 {len(df_step3)}개의 레코드.")
 
         if df_step3.empty:
             logging.warning("추출된 데이터가 없습니다.")
-        else:
-            # 데이터 검증: 특수 문자 확인
-            columns_to_convert = ['full_name', 'rep_full_name', 'item_full_name']
-            check_special_characters(df_step3, columns_to_convert)
-
-            # 'full_name', 'rep_full_name', 'item_full_name' 컬럼에 인코딩 변환 적용
-            for col in columns_to_convert:
-                if col in df_step3.columns:
-                    df_step3[col] = df_step3[col].apply(convert_to_utf8)
-                    logging.info(f"'{col}' 컬럼의 인코딩 변환 완료.")
-                else:
-                    logging.warning(f"'{col}' 컬럼이 데이터프레임에 존재하지 않습니다.")
-
+        elif excel_path_step3 is None:
             # 웹발주 데이터를 엑셀로 저장
-            excel_output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'excel_output')
-            os.makedirs(excel_output_dir, exist_ok=True)
+            os.makedirs(ETL_OUTPUT_FOLDER, exist_ok=True)
             excel_filename = f't_po_order_master_{today_str}_{timestamp}.xlsx'  # 고유한 파일명
-            excel_path_step3 = os.path.join(excel_output_dir, excel_filename)
+            excel_path_step3 = os.path.join(ETL_OUTPUT_FOLDER, excel_filename)
             save_to_excel(df_step3, excel_path_step3)
             #  여기에 MySQL insert 로직 추가
 
+        save_web_order_etl_state(today_str, watermark, stats, df_step3, excel_path_step3)
+
         # 연결 종료
         informix_cursor.close()
         informix_conn.close()
@@ -1350,6 +2653,63 @@ def etl_process():
 def index():
     return render_template('index.html')
 
+# ------------------------
+# 미수금 요약 테이블 (ARReceivablesSummary)
+# ------------------------
+# 원장(ARTransactionsLedger)에 행을 넣는 곳은 같은 커서(트랜잭션)에서 요약도 증분으로 갱신합니다.
+# view_receivables는 원장 대신 이 테이블을 읽습니다. 스키마/초기 적재: migrations/005_receivables_summary.sql
+RECEIVABLES_SUMMARY_COLUMNS = ('debit', 'credit', 'food_material_sales', 'royalty_sales',
+                               'pos_usage_fee', 'cash_deposit', 'card_deposit')
+
+def receivables_key(value):
+    """
+    원장의 client / outlet_name을 요약 테이블 키로 정규화합니다 (MySQL COALESCE(TRIM(UPPER(x)), '')와 같은 규칙).
+    """
+    return '' if value is None else str(value).upper().strip(' ')
+
+def update_receivables_summary(cursor, ledger_columns, ledger_rows):
+    """
+    원장에 삽입한 행(ledger_columns 순서의 튜플)을 매출처/점포별로 합산하여 ARReceivablesSummary에 더합니다.
+    커밋은 호출한 쪽에서 원장 삽입과 함께 합니다.
+    """
+    if not ledger_rows:
+        return
+    client_index = ledger_columns.index('client')
+    outlet_index = ledger_columns.index('outlet_name')
+    value_indexes = [ledger_columns.index(column) for column in RECEIVABLES_SUMMARY_COLUMNS if column in ledger_columns]
+    summary_indexes = [RECEIVABLES_SUMMARY_COLUMNS.index(ledger_columns[index]) for index in value_indexes]
+
+    totals = {}
+    for row in ledger_rows:
+        key = (receivables_key(row[client_index]), receivables_key(row[outlet_index]))
+        entry = totals.get(key)
+        if entry is None:
+            entry = totals[key] = [Decimal('0')] * len(RECEIVABLES_SUMMARY_COLUMNS) + [0]
+        for index, position in zip(value_indexes, summary_indexes):
+            if row[index] is not None:
+                entry[position] += Decimal(str(row[index]))
+        entry[-1] += 1
+
+    query = """
+        INSERT INTO ARReceivablesSummary (
+            client_key, outlet_key, total_debit, total_credit, total_food_material_sales, total_royalty_sales,
+            total_pos_usage_fee, total_cash_deposit, total_card_deposit, ledger_rows
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            total_debit = total_debit + VALUES(total_debit),
+            total_credit = total_credit + VALUES(total_credit),
+            total_food_material_sales = total_food_material_sales + VALUES(total_food_material_sales),
+            total_royalty_sales = total_royalty_sales + VALUES(total_royalty_sales),
+            total_pos_usage_fee = total_pos_usage_fee + VALUES(total_pos_usage_fee),
+            total_cash_deposit = total_cash_deposit + VALUES(total_cash_deposit),
+            total_card_deposit = total_card_deposit + VALUES(total_card_deposit),
+            ledger_rows = ledger_rows + VALUES(ledger_rows)
+    """
+    # 원장에 쓰는 모든 곳(발주 업로드, 입금 가져오기, add_order)이 같은 키 순서로 행 잠금을 잡도록 정렬합니다 (교착 방지).
+    cursor.executemany(query, [key + tuple(entry) for key, entry in sorted(totals.items())])
+    logging.debug(f"ARReceivablesSummary 갱신: {len(totals)}건 (원장 {len(ledger_rows)}행)")
+
 # 발주 내역 추가
 @app.route('/add_order', methods=['GET', 'POST'])
 def add_order():
@@ -1421,7 +2781,7 @@ def add_order():
                             %s, %s, %s, %s, %s, %s, %s
                         )
                     """
-                    cursor.execute(insert_ledger_query, (
+                    ledger_row = (
                         order_date,
                         client_code,  # client_code 사용
                         client_name,
@@ -1429,7 +2789,10 @@ def add_order():
                         amount,  # debit (식자재 매출)
                         0,       # credit
                         amount   # food_material_sales
-                    ))
+                    )
+                    cursor.execute(insert_ledger_query, ledger_row)
+                    update_receivables_summary(cursor, ('transaction_date', 'representative_code', 'client', 'outlet_name',
+                                                        'debit', 'credit', 'food_material_sales'), [ledger_row])
 
                     db.commit()
 
@@ -1478,6 +2841,97 @@ def get_representative_code():
     finally:
         db.close()
 
+# ------------------------
+# 업로드 엑셀 읽기 (헤더 탐색 + 데이터 읽기를 한 번에)
+# ------------------------
+BANK_PAYMENT_COLUMNS = ['입금일자', '입금시간', '가상계좌번호', '입금금액']
+ORDER_UPLOAD_COLUMNS = ['order_date', 'client_code', 'order_amount', 'collector_key']
+
+class UploadSheetError(ValueError):
+    """업로드 파일에서 헤더나 필수 컬럼을 찾지 못했을 때 발생합니다 (메시지는 사용자에게 그대로 표시)."""
+
+def is_bank_payment_header(values):
+    # 두 번째 열이 "입금일자"인 행 (첫 번째 열은 "No.")
+    return len(values) > 1 and str(values[1]).strip() == '입금일자'
+
+def is_order_upload_header(values):
+    return all(col in values for col in ORDER_UPLOAD_COLUMNS)
+
+def _upload_column_positions(header, required_columns):
+    positions = {}
+    for position, name in enumerate(header):
+        positions.setdefault(name, position)
+    missing_cols = [col for col in required_columns if col not in positions]
+    if missing_cols:
+        raise UploadSheetError(f'엑셀 파일에 누락된 필드가 있습니다: {missing_cols}')
+    return [positions[col] for col in required_columns]
+
+def _upload_records(rows, positions):
+    """
+    데이터 행에서 positions 열만 꺼내 yield 합니다. 행 번호가 기존 pd.read_excel(header=...)과 같도록
+    중간의 빈 행은 유지하고, 파일 끝의 빈 행은 버립니다.
+    """
+    pending_blanks = 0
+    for values in rows:
+        if any(value is not None and not (isinstance(value, float) and pd.isna(value)) for value in values):
+            for _ in range(pending_blanks):
+                yield [None] * len(positions)
+            pending_blanks = 0
+            yield [values[position] if position < len(values) else None for position in positions]
+        else:
+            pending_blanks += 1
+
+@contextmanager
+def open_upload_sheet(file_path, required_columns, is_header_row):
+    """
+    업로드된 엑셀의 첫 시트를 위에서부터 한 번만 읽으면서 is_header_row(행 값)가 참인 첫 행을
+    헤더로 삼고, (헤더 행 번호, required_columns 열 값 목록을 차례로 내주는 이터레이터)를 돌려줍니다.
+    .xlsx는 openpyxl read_only 모드로 스트리밍하고, .xls는 pandas로 한 번 읽어 같은 방식으로 처리합니다.
+
+    Raises:
+        UploadSheetError: 헤더 또는 필수 컬럼이 없을 때
+    """
+    if file_path.lower().endswith('.xls'):
+        raw = pd.read_excel(file_path, header=None)
+        rows = raw.itertuples(index=False, name=None)
+        workbook = None
+    else:
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        worksheet = workbook.active
+        # 일부 프로그램이 만든 파일은 dimension 정보가 틀려 행이 잘리므로 다시 계산하게 합니다.
+        worksheet.reset_dimensions()
+        rows = worksheet.iter_rows(values_only=True)
+    try:
+        for header_row_index, values in enumerate(rows):
+            if is_header_row(values):
+                break
+        else:
+            raise UploadSheetError('엑셀 파일에서 헤더를 찾을 수 없습니다.')
+        positions = _upload_column_positions(values, required_columns)
+        yield header_row_index, _upload_records(rows, positions)
+    finally:
+        if workbook is not None:
+            workbook.close()
+
+def iter_upload_batches(records, required_columns, batch_size, skip_rows=0):
+    """
+    레코드를 batch_size 행씩 DataFrame(object dtype, 셀 값 그대로)으로 묶어 yield 합니다.
+    인덱스는 파일 내 데이터 행 번호(0부터)입니다.
+    skip_rows만큼의 앞 행은 읽기만 하고 건너뜁니다 (체크포인트 이후부터 재개).
+    """
+    batch = []
+    start = skip_rows
+    for row_number, record in enumerate(records):
+        if row_number < skip_rows:
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield pd.DataFrame(batch, columns=required_columns, index=range(start, start + len(batch)), dtype=object)
+            start += len(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=required_columns, index=range(start, start + len(batch)), dtype=object)
+
 def clean_virtual_account_number(van_number):
     """
     가상계좌번호에서 하이픈 제거
@@ -1486,214 +2940,684 @@ def clean_virtual_account_number(van_number):
         return van_number.replace('-', '').strip()
     return van_number
 
-@app.route('/upload_bank_payments', methods=['GET', 'POST'])
-def upload_bank_payments():
-    form = UploadForm()
-    if form.validate_on_submit():
-        file = form.file.data
-        if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            
-            # 업로드 디렉토리 생성
-            os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-            logging.debug(f"업로드 디렉토리 생성 또는 이미 존재: {app.config['UPLOAD_FOLDER']}")
-            
-            try:
-                file.save(file_path)
-                logging.info(f"업로드된 파일이 저장되었습니다: {file_path}")
-            except Exception as e:
-                logging.error(f"파일 저장 실패: {e}")
-                flash('업로드된 파일을 저장하는 중 오류가 발생했습니다.', 'danger')
-                return redirect(request.url)
+BANK_IMPORT_BATCH_SIZE = int(os.getenv('BANK_IMPORT_BATCH_SIZE', '1000'))  # executemany 1회당 행 수
 
-            db = get_db_connection()
-            if not db:
-                flash('Database connection failed.', 'danger')
-                return redirect(request.url)
+def normalize_virtual_account(value):
+    """
+    가상계좌번호를 비교용 문자열로 정규화합니다 (하이픈/공백 제거, 숫자로 읽힌 값은 정수 문자열로 변환).
+    ARBankAccountMaster.virtual_account_key 생성 컬럼과 같은 규칙입니다 (migrations/003_bank_account_key.sql).
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip().replace('-', '').replace(' ', '')
 
-            try:
-                with db.cursor(dictionary=True) as cursor:
-                    # 엑셀 파일을 헤더 없이 읽기
-                    df = pd.read_excel(file_path, header=None)
-                    logging.info(f"엑셀 파일을 성공적으로 읽었습니다: {filename}")
-                    
-                    # 헤더 행 찾기: 두 번째 열이 "입금일자"인 행 (첫 번째 열은 "No.")
-                    header_row_index = None
-                    for i, row in df.iterrows():
-                        second_cell = str(row.iloc[1]).strip()
-                        if second_cell == '입금일자':
-                            header_row_index = i
-                            break
-
-                    if header_row_index is None:
-                        logging.warning("엑셀 파일에서 헤더를 찾을 수 없습니다.")
-                        flash('엑셀 파일에서 헤더를 찾을 수 없습니다.', 'danger')
-                        return redirect(request.url)
-                    
-                    # 헤더가 있는 행부터 데이터 읽기
-                    df = pd.read_excel(file_path, header=header_row_index)
-                    logging.debug(f"헤더가 발견된 행: {header_row_index}")
-                    logging.debug(f"데이터프레임 샘플:\n{df.head()}")
-
-                    # 필요한 열만 선택 (불필요한 열은 무시)
-                    required_columns = ['입금일자', '입금시간', '가상계좌번호', '입금금액']
-                    if not all(col in df.columns for col in required_columns):
-                        missing_cols = [col for col in required_columns if col not in df.columns]
-                        logging.warning(f"엑셀 파일에 누락된 필드: {missing_cols}")
-                        flash(f'엑셀 파일에 누락된 필드가 있습니다: {missing_cols}', 'danger')
-                        return redirect(request.url)
-                    
-                    df = df[required_columns]
-
-                    # 데이터 타입 강제 변환
-                    df['입금일자'] = pd.to_datetime(df['입금일자'], errors='coerce').dt.date
-                    df['입금시간'] = pd.to_datetime(df['입금시간'], format='%H:%M:%S', errors='coerce').dt.time
-                    df['가상계좌번호'] = df['가상계좌번호'].apply(clean_virtual_account_number)
-                    df['입금금액'] = pd.to_numeric(df['입금금액'].astype(str).str.replace(',', '', regex=True), errors='coerce')
-                    
-                    logging.debug(f"형변환 후 데이터프레임 샘플:\n{df.head()}")
-
-                    # 데이터 삽입 준비
-                    inserted_records = 0
-                    for index, row in df.iterrows():
-                        # 데이터 유효성 검사: '입금일자'와 '가상계좌번호'가 유효한지 확인
-                        if pd.isna(row['입금일자']) or pd.isna(row['가상계좌번호']):
-                            logging.debug(f"Row {index}은 '입금일자' 또는 '가상계좌번호'가 NaN이므로 무시됩니다.")
-                            continue
-
-                        payment_date = row['입금일자']
-                        payment_time = row['입금시간']
-                        virtual_account_number = row['가상계좌번호']
-                        payment_amount = row['입금금액']
-
-                        # 입금금액이 NaN인지 확인하고 기본값 설정
-                        if pd.isna(payment_amount):
-                            logging.warning(f"Row {index}의 '입금금액'이 NaN입니다. 기본값 0.00으로 설정합니다.")
-                            payment_amount = Decimal('0.00')
-                        else:
-                            payment_amount = Decimal(payment_amount)
-
-                        logging.debug(f"데이터 삽입 준비 - Row {index}: virtual_account_number={virtual_account_number}, payment_date={payment_date}, payment_amount={payment_amount}")
-
-                        # ARBankAccountMaster 테이블에서 client_code, client_name, manager, collector_key, representative_code 조회
-                        try:
-                            cursor.execute("""
-                                SELECT client_code, client_name, manager, collector_key, representative_code 
-                                FROM ARBankAccountMaster 
-                                WHERE REPLACE(hana_bank_virtual_account, '-', '') = %s 
-                                LIMIT 1
-                            """, (virtual_account_number,))
-                            account_data = cursor.fetchone()
-                            if account_data:
-                                client_code = account_data['client_code']
-                                client_name = account_data['client_name']
-                                manager = account_data['manager']
-                                collector_key = account_data['collector_key']
-                                representative_code = account_data['representative_code']
-                            else:
-                                logging.warning(f"가상계좌번호 '{virtual_account_number}'에 해당하는 계좌를 ARBankAccountMaster에서 찾을 수 없습니다.")
-                                flash(f"Row {index + 1}: 가상계좌번호 '{virtual_account_number}'에 해당하는 계좌를 찾을 수 없습니다.", 'warning')
-                                continue
-                        except mysql.connector.Error as db_err:
-                            logging.error(f"ARBankAccountMaster에서 데이터 조회 실패 - Row {index}: {db_err}")
-                            flash(f"Row {index + 1}: ARBankAccountMaster 조회 실패.", 'danger')
-                            continue
-
-                        
-                        # ARBankPaymentDetails 테이블에 삽입하는 부분(반복문 내부)
-                        # 중복 체크 쿼리 추가 start 0205
-                        duplicate_query = """
-                            SELECT COUNT(*) AS cnt
-                            FROM ARBankPaymentDetails
-                            WHERE payment_date = %s
-                            AND payment_time = %s
-                            AND client_code = %s
-                            AND collector_key = %s
-                            AND virtual_account_number = %s
-                            AND payment_amount = %s
-                        """
-                        try:
-                            cursor.execute(duplicate_query, (
-                                payment_date,
-                                payment_time,
-                                client_code,
-                                collector_key,
-                                virtual_account_number,
-                                payment_amount
-                            ))
-                            dup_result = cursor.fetchone()
-                        except mysql.connector.Error as db_err:
-                            logging.error(f"중복 체크 실패 - Row {index}: {db_err}")
-                            flash(f"Row {index + 1}: 중복 체크 실패.", 'danger')
-                            continue
-
-                        if dup_result and dup_result['cnt'] > 0:
-                            logging.info(f"Row {index}: 중복 데이터가 존재하여 삽입을 건너뜁니다.")
-                            continue  # 중복 데이터면 다음 row로 넘어감
-                        # 중복 체크 쿼리 추가 end
-                        
-                        
-                        # ARBankPaymentDetails 테이블에 삽입
-                        insert_bank_payment_query = """
-                            INSERT INTO ARBankPaymentDetails (
-                                payment_date, payment_time, client_code, collector_key, virtual_account_number, payment_amount
-                            )
-                            VALUES (%s, %s, %s, %s, %s, %s)
-                        """
-                        try:
-                            cursor.execute(insert_bank_payment_query, (
-                                payment_date,
-                                payment_time,
-                                client_code,
-                                collector_key,
-                                virtual_account_number,
-                                payment_amount
-                            ))
-                            logging.debug(f"ARBankPaymentDetails 삽입 성공 - Row {index}")
-                        except mysql.connector.Error as db_err:
-                            logging.error(f"ARBankPaymentDetails 삽입 실패 - Row {index}: {db_err}")
-                            flash(f"Row {index + 1}: ARBankPaymentDetails 삽입 실패.", 'danger')
-                            continue
-
-                        # ARTransactionsLedger 테이블에 삽입
-                        insert_ledger_query = """
-                            INSERT INTO ARTransactionsLedger (
-                                transaction_date, representative_code, client, outlet_name, debit, credit, cash_deposit
-                            )
-                            VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        """
-                        try:
-                            cursor.execute(insert_ledger_query, (
-                                payment_date,
-                                representative_code if representative_code else '',  # representative_code이 없을 경우 빈 값
-                                client_code,
-                                client_name,     # outlet_name에 client_name 사용 (필요 시 수정)
-                                0,  # debit (식자재 매출)
-                                payment_amount,       # credit
-                                payment_amount   # cash_deposit
-                            ))
-                            logging.debug(f"ARTransactionsLedger 삽입 성공 - Row {index}")
-                        except mysql.connector.Error as db_err:
-                            logging.error(f"ARTransactionsLedger 삽입 실패 - Row {index}: {db_err}")
-                            flash(f"Row {index + 1}: ARTransactionsLedger 삽입 실패.", 'danger')
-                            continue
-
-                        inserted_records += 1
-                    db.commit()
-                    logging.info(f"{inserted_records}개의 은행 입금 내역이 성공적으로 업로드되었습니다.")
-                    flash(f'{inserted_records}개의 은행 입금 내역이 성공적으로 업로드되었습니다.', 'success')
-                    return redirect(url_for('index'))
-            except Exception as e:
-                logging.error(f"업로드된 파일 처리 중 오류 발생: {e}")
-                db.rollback()
-                flash('파일을 처리하는 중 오류가 발생했습니다.', 'danger')
+# 계좌 매핑 캐시: ARMasterVersion의 버전이 바뀔 때만 (트리거로 증가) 다시 읽습니다.
+_bank_account_cache = {'version': None, 'map': None}
+_bank_account_cache_lock = threading.Lock()
+
+def get_master_version(cursor, table_name):
+    """
+    ARMasterVersion에서 마스터 테이블의 변경 버전을 읽습니다. 테이블이 없으면 None.
+    """
+    try:
+        cursor.execute("SELECT version FROM ARMasterVersion WHERE table_name = %s", (table_name,))
+        row = cursor.fetchone()
+    except mysql.connector.Error as e:
+        logging.warning(f"ARMasterVersion 조회 실패 ({table_name}), 캐시 없이 조회합니다: {e}")
+        return None
+    if not row:
+        return None
+    return row['version'] if isinstance(row, dict) else row[0]
+
+def load_bank_account_map(cursor):
+    """
+    {가상계좌 키: 계좌 정보} 딕셔너리를 반환합니다. ARBankAccountMaster가 바뀌지 않았으면
+    프로세스에 캐시된 매핑을 그대로 사용합니다.
+    같은 계좌번호가 여러 건이면 처음 조회된 행을 사용합니다 (기존 LIMIT 1과 동일).
+    """
+    version = get_master_version(cursor, 'ARBankAccountMaster')
+    with _bank_account_cache_lock:
+        if version is not None and _bank_account_cache['version'] == version:
+            return _bank_account_cache['map']
+
+    cursor.execute("""
+        SELECT virtual_account_key, client_code, client_name, manager, collector_key, representative_code
+        FROM ARBankAccountMaster
+        WHERE virtual_account_key IS NOT NULL AND virtual_account_key <> ''
+    """)
+    account_map = {}
+    for account in cursor.fetchall():
+        account_map.setdefault(account['virtual_account_key'], account)
+    logging.info(f"ARBankAccountMaster 계좌 매핑을 불러왔습니다: {len(account_map)}건 (version={version})")
+
+    with _bank_account_cache_lock:
+        _bank_account_cache['version'] = version
+        _bank_account_cache['map'] = account_map if version is not None else None
+    return account_map
+
+def payment_dedup_key(payment_date, payment_time, client_code, collector_key, virtual_account_number, payment_amount):
+    """
+    ARBankPaymentDetails 중복 판정 키. DB(TIME → timedelta, DECIMAL)와 엑셀(time, float) 값을 같은 형태로 맞춥니다.
+    """
+    if isinstance(payment_time, timedelta):
+        seconds = int(payment_time.total_seconds())
+        payment_time = f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    elif payment_time is not None:
+        payment_time = payment_time.strftime('%H:%M:%S')
+    return (
+        payment_date,
+        payment_time,
+        str(client_code),
+        str(collector_key),
+        normalize_virtual_account(virtual_account_number),
+        Decimal(payment_amount).quantize(Decimal('0.01')),
+    )
+
+def load_existing_payment_keys(cursor, date_from, date_to):
+    """
+    파일의 입금일자 범위에 있는 기존 입금 내역을 한 번의 쿼리로 읽어 중복 판정 키 집합으로 반환합니다.
+    """
+    cursor.execute("""
+        SELECT payment_date, payment_time, client_code, collector_key, virtual_account_number, payment_amount
+        FROM ARBankPaymentDetails
+        WHERE payment_date BETWEEN %s AND %s
+    """, (date_from, date_to))
+    return {
+        payment_dedup_key(row['payment_date'], row['payment_time'], row['client_code'],
+                          row['collector_key'], row['virtual_account_number'], row['payment_amount'])
+        for row in cursor.fetchall()
+    }
+
+def import_bank_payments(cursor, df):
+    """
+    형변환이 끝난 은행 입금 DataFrame(입금일자, 입금시간, 가상계좌번호, 입금금액)을
+    ARBankPaymentDetails와 ARTransactionsLedger에 일괄 삽입합니다. 커밋은 호출한 쪽에서 합니다.
+
+    Returns:
+        (삽입 건수, 중복으로 건너뛴 건수, 계좌를 찾지 못한 [(행 번호, 가상계좌번호), ...])
+    """
+    valid = df.dropna(subset=['입금일자', '가상계좌번호'])
+    if len(valid) < len(df):
+        logging.debug(f"'입금일자' 또는 '가상계좌번호'가 비어 있는 {len(df) - len(valid)}개 행은 무시됩니다.")
+    if valid.empty:
+        return 0, 0, []
+
+    account_map = load_bank_account_map(cursor)
+    existing_keys = load_existing_payment_keys(cursor, valid['입금일자'].min(), valid['입금일자'].max())
+    logging.info(f"계좌 {len(account_map)}건, 기존 입금 내역 {len(existing_keys)}건을 불러왔습니다.")
+
+    payment_rows = []
+    ledger_rows = []
+    missing_accounts = []
+    duplicates = 0
+    for index, payment_date, payment_time, virtual_account_number, payment_amount in valid[
+            ['입금일자', '입금시간', '가상계좌번호', '입금금액']].itertuples(name=None):
+        if pd.isna(payment_time):
+            payment_time = None
+        # 입금금액이 NaN인지 확인하고 기본값 설정
+        if pd.isna(payment_amount):
+            logging.warning(f"Row {index}의 '입금금액'이 NaN입니다. 기본값 0.00으로 설정합니다.")
+            payment_amount = Decimal('0.00')
+        else:
+            payment_amount = Decimal(payment_amount)
+
+        account = account_map.get(normalize_virtual_account(virtual_account_number))
+        if account is None:
+            logging.warning(f"가상계좌번호 '{virtual_account_number}'에 해당하는 계좌를 ARBankAccountMaster에서 찾을 수 없습니다.")
+            missing_accounts.append((index + 1, virtual_account_number))
+            continue
+
+        key = payment_dedup_key(payment_date, payment_time, account['client_code'], account['collector_key'],
+                                virtual_account_number, payment_amount)
+        if key in existing_keys:
+            logging.info(f"Row {index}: 중복 데이터가 존재하여 삽입을 건너뜁니다.")
+            duplicates += 1
+            continue
+        # 같은 파일 안의 동일 행도 한 번만 삽입
+        existing_keys.add(key)
+
+        payment_rows.append((
+            payment_date,
+            payment_time,
+            account['client_code'],
+            account['collector_key'],
+            virtual_account_number,
+            payment_amount
+        ))
+        ledger_rows.append((
+            payment_date,
+            account['representative_code'] if account['representative_code'] else '',  # representative_code이 없을 경우 빈 값
+            account['client_code'],
+            account['client_name'],  # outlet_name에 client_name 사용
+            0,               # debit (식자재 매출)
+            payment_amount,  # credit
+            payment_amount   # cash_deposit
+        ))
+
+    insert_bank_payment_query = """
+        INSERT INTO ARBankPaymentDetails (
+            payment_date, payment_time, client_code, collector_key, virtual_account_number, payment_amount
+        )
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """
+    insert_ledger_query = """
+        INSERT INTO ARTransactionsLedger (
+            transaction_date, representative_code, client, outlet_name, debit, credit, cash_deposit
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """
+    # mysql-connector는 INSERT ... VALUES의 executemany를 다중 행 INSERT 한 문장으로 보냅니다.
+    for start in range(0, len(payment_rows), BANK_IMPORT_BATCH_SIZE):
+        cursor.executemany(insert_bank_payment_query, payment_rows[start:start + BANK_IMPORT_BATCH_SIZE])
+        cursor.executemany(insert_ledger_query, ledger_rows[start:start + BANK_IMPORT_BATCH_SIZE])
+    update_receivables_summary(cursor, ('transaction_date', 'representative_code', 'client', 'outlet_name',
+                                        'debit', 'credit', 'cash_deposit'), ledger_rows)
+    return len(payment_rows), duplicates, missing_accounts
+
+@app.route('/upload_bank_payments', methods=['GET', 'POST'])
+def upload_bank_payments():
+    form = UploadForm()
+    if form.validate_on_submit():
+        file = form.file.data
+        if file and allowed_file(file.filename):
+            # 화면/보고서에 쓰는 원래 파일명입니다. 저장 경로는 save_upload_file이 내용 해시로 정합니다.
+            filename = os.path.basename(file.filename)
+            try:
+                file_path, file_hash = save_upload_file(file, filename, 'bank_payments')
+                logging.info(f"업로드된 파일이 저장되었습니다: {file_path}")
+            except Exception as e:
+                logging.error(f"파일 저장 실패: {e}")
+                flash('업로드된 파일을 저장하는 중 오류가 발생했습니다.', 'danger')
                 return redirect(request.url)
-            finally:
-                db.close()
+
+            return submit_upload_import('bank_payments', file_path, file_hash, filename)
 
     return render_template('upload_bank_payments.html', form=form)
 
+def dataframe_records(frame):
+    """
+    DataFrame 행을 executemany에 넘길 튜플 목록으로 변환합니다 (값은 파이썬 기본 타입, 결측값은 None).
+    """
+    values = frame.to_numpy(dtype=object)
+    values[pd.isna(values)] = None
+    return list(map(tuple, values.tolist()))
+
+# ARTransactionsLedger 발주 행에서 0으로 채우는 컬럼 (INSERT 컬럼 순서)
+ORDER_LEDGER_ZERO_COLUMNS = ['royalty_sales', 'advertising_fees', 'other_sales', 'cash_deposit',
+                             'meal_voucher_deposit', 'delivery_fee', 'card_deposit', 'pos_usage_fee', 'receivables']
+# build_order_upload_payloads가 만드는 ledger_data 튜플의 컬럼 순서
+ORDER_LEDGER_COLUMNS = ('transaction_date', 'representative_code', 'client', 'outlet_name', 'debit', 'credit',
+                        'food_material_sales', *ORDER_LEDGER_ZERO_COLUMNS)
+
+def build_order_upload_payloads(df, clients):
+    """
+    발주 DataFrame(order_date, client_code, order_amount, collector_key)을 ARClientMaster 조회 결과와
+    병합하여 AROrderDetails / ARTransactionsLedger INSERT용 튜플 목록을 만듭니다.
+
+    Returns:
+        (order_details_data, ledger_data, ARClientMaster에 없는 [(행 번호, client_code), ...])
+    """
+    client_df = pd.DataFrame(clients, columns=['client_code', 'representative_code', 'client_name', 'manager'])
+    client_df = client_df.drop_duplicates('client_code')
+    merged = df.reset_index().merge(client_df, on='client_code', how='left', indicator=True)
+
+    unknown_mask = merged['_merge'] == 'left_only'
+    unknown = merged.loc[unknown_mask, ['index', 'client_code']]
+    unknown_clients = list(zip((unknown['index'] + 1).tolist(), unknown['client_code'].tolist()))
+    matched = merged.loc[~unknown_mask]
+
+    order_details_data = dataframe_records(matched[['representative_code', 'client_code', 'client_name', 'collector_key',
+                                                    'manager', 'order_date', 'order_amount']])
+
+    ledger = pd.DataFrame({
+        'transaction_date': matched['order_date'],
+        'representative_code': matched['representative_code'],
+        'client': matched['client_code'],
+        'outlet_name': matched['client_name'],
+        'debit': matched['order_amount'],
+        'credit': 0,
+        'food_material_sales': matched['order_amount'],
+    })
+    for column in ORDER_LEDGER_ZERO_COLUMNS:
+        ledger[column] = 0
+    ledger_data = dataframe_records(ledger)
+    return order_details_data, ledger_data, unknown_clients
+
+def insert_order_upload_rows(cursor, order_details_data, ledger_data):
+    # AROrderDetails 테이블에 데이터 삽입
+    if order_details_data:
+        insert_order_query = """
+            INSERT INTO AROrderDetails (
+                representative_code, client_code, client_name, collector_key, manager, order_date, order_amount
+            )
+            VALUES (
+                %s, %s, %s, %s, %s, %s, %s
+            )
+        """
+        cursor.executemany(insert_order_query, order_details_data)
+        logging.debug(f"AROrderDetails 삽입 성공: {len(order_details_data)}건")
+
+    # ARTransactionsLedger 테이블에 데이터 삽입
+    if ledger_data:
+        insert_ledger_query = """
+            INSERT INTO ARTransactionsLedger (
+                transaction_date,
+                representative_code,
+                client,
+                outlet_name,
+                debit,
+                credit,
+                food_material_sales,
+                royalty_sales,
+                advertising_fees,
+                other_sales,
+                cash_deposit,
+                meal_voucher_deposit,
+                delivery_fee,
+                card_deposit,
+                pos_usage_fee,
+                receivables
+            )
+            VALUES (
+                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+            )
+        """
+        cursor.executemany(insert_ledger_query, ledger_data)
+        logging.debug(f"ARTransactionsLedger 삽입 성공: {len(ledger_data)}건")
+        update_receivables_summary(cursor, ORDER_LEDGER_COLUMNS, ledger_data)
+
+def import_order_batch(cursor, df):
+    """
+    발주 업로드 한 묶음을 형변환하여 AROrderDetails / ARTransactionsLedger에 삽입합니다.
+    Returns: (건수 dict, [(행 번호, 값, 사유), ...])
+    """
+    total = len(df)
+    # 데이터 타입 변환
+    df = df.copy()
+    df['order_date'] = pd.to_datetime(df['order_date'], errors='coerce').dt.date
+    df['client_code'] = df['client_code'].astype(str).str.strip()
+    df['order_amount'] = pd.to_numeric(df['order_amount'], errors='coerce').fillna(0)
+    df['collector_key'] = df['collector_key'].astype(str).str.strip()
+    logging.debug(f"형변환 후 데이터프레임 샘플:\n{df.head()}")
+
+    # 데이터 정제: 필수 컬럼 결측값 제거
+    df = df.dropna(subset=['order_date', 'client_code', 'collector_key'])
+
+    # ARClientMaster에서 필요한 데이터 가져오기
+    client_codes = df['client_code'].unique().tolist()
+    clients = []
+    if client_codes:
+        format_strings = ','.join(['%s'] * len(client_codes))
+        cursor.execute(f"SELECT client_code, representative_code, client_name, manager FROM ARClientMaster WHERE client_code IN ({format_strings})", tuple(client_codes))
+        clients = cursor.fetchall()
+
+    # AROrderDetails 및 ARTransactionsLedger 데이터 준비 (DataFrame 병합)
+    order_details_data, ledger_data, unknown_clients = build_order_upload_payloads(df, clients)
+    insert_order_upload_rows(cursor, order_details_data, ledger_data)
+    counts = {
+        'inserted': len(order_details_data),
+        'skipped': total - len(df),
+        'duplicates': 0,
+        'unknown': len(unknown_clients),
+    }
+    return counts, [(row_no, code, '미등록 매출처') for row_no, code in unknown_clients]
+
+def import_bank_payment_batch(cursor, df):
+    """
+    은행 입금 업로드 한 묶음을 형변환하여 ARBankPaymentDetails / ARTransactionsLedger에 삽입합니다.
+    Returns: (건수 dict, [(행 번호, 값, 사유), ...])
+    """
+    # 데이터 타입 강제 변환
+    df = df.copy()
+    df['입금일자'] = pd.to_datetime(df['입금일자'], errors='coerce').dt.date
+    df['입금시간'] = pd.to_datetime(df['입금시간'], format='%H:%M:%S', errors='coerce').dt.time
+    # apply는 숫자+빈칸 열을 float로 추론하므로 (123456009 -> 123456009.0) object 그대로 유지합니다
+    df['가상계좌번호'] = pd.Series([clean_virtual_account_number(v) for v in df['가상계좌번호']],
+                                  index=df.index, dtype=object)
+    df['입금금액'] = pd.to_numeric(df['입금금액'].astype(str).str.replace(',', '', regex=True), errors='coerce')
+    logging.debug(f"형변환 후 데이터프레임 샘플:\n{df.head()}")
+
+    # 계좌 매핑/중복 확인/삽입을 일괄 처리
+    inserted, duplicates, missing_accounts = import_bank_payments(cursor, df)
+    counts = {
+        'inserted': inserted,
+        'skipped': len(df) - inserted - duplicates - len(missing_accounts),
+        'duplicates': duplicates,
+        'unknown': len(missing_accounts),
+    }
+    return counts, [(row_no, account, '미등록 가상계좌') for row_no, account in missing_accounts]
+
+# ------------------------
+# 청크 단위 업로드 가져오기 (파일별 체크포인트)
+# ------------------------
+# 업로드 파일을 UPLOAD_CHUNK_ROWS 행씩 읽어 묶음마다 삽입 + 커밋하고, ARUploadCheckpoint에
+# 처리한 행 수를 같은 트랜잭션으로 기록합니다. 중간에 실패한 파일을 다시 올리면 이어서 처리합니다.
+# 스키마: migrations/004_upload_checkpoint.sql
+UPLOAD_CHUNK_ROWS = int(os.getenv('UPLOAD_CHUNK_ROWS', '5000'))
+UPLOAD_PROBLEM_LIMIT = int(os.getenv('UPLOAD_PROBLEM_LIMIT', '1000'))  # 보관할 문제 행 최대 개수
+
+UPLOAD_IMPORTS = {
+    'bank_payments': {
+        'columns': BANK_PAYMENT_COLUMNS,
+        'is_header_row': is_bank_payment_header,
+        'import_batch': import_bank_payment_batch,
+        'unknown_message': '가상계좌번호에 해당하는 계좌를 찾을 수 없습니다',
+        'label': '은행 입금 내역',
+        'task_type': 'bank_payments_import',
+        'form_endpoint': 'upload_bank_payments',
+    },
+    'orders': {
+        'columns': ORDER_UPLOAD_COLUMNS,
+        'is_header_row': is_order_upload_header,
+        'import_batch': import_order_batch,
+        'unknown_message': 'client_code가 ARClientMaster 테이블에 존재하지 않습니다',
+        'label': '발주 내역',
+        'task_type': 'orders_import',
+        'form_endpoint': 'upload_orders',
+    },
+}
+UPLOAD_COUNT_KEYS = ('inserted', 'skipped', 'duplicates', 'unknown')
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_upload_checkpoint(cursor, file_hash, import_type):
+    cursor.execute("""
+        SELECT rows_done, inserted, skipped, duplicates, unknown, status
+        FROM ARUploadCheckpoint
+        WHERE file_hash = %s AND import_type = %s
+    """, (file_hash, import_type))
+    return cursor.fetchone()
+
+def save_upload_checkpoint(cursor, file_hash, import_type, filename, summary, status):
+    cursor.execute("""
+        INSERT INTO ARUploadCheckpoint
+            (file_hash, import_type, filename, rows_done, inserted, skipped, duplicates, unknown, status)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            filename = VALUES(filename), rows_done = VALUES(rows_done), inserted = VALUES(inserted),
+            skipped = VALUES(skipped), duplicates = VALUES(duplicates), unknown = VALUES(unknown),
+            status = VALUES(status)
+    """, (file_hash, import_type, filename, summary['rows'], summary['inserted'], summary['skipped'],
+          summary['duplicates'], summary['unknown'], status))
+
+def run_chunked_import(db, file_path, filename, import_type, on_batch=None):
+    """
+    업로드 파일을 UPLOAD_CHUNK_ROWS 행씩 가져오고 묶음마다 커밋합니다.
+    같은 파일의 미완료 체크포인트가 있으면 그 다음 행부터 이어서 처리합니다.
+    on_batch(summary)를 넘기면 묶음 커밋마다 호출합니다.
+
+    Returns:
+        dict: import_type, filename, rows, inserted, skipped, duplicates, unknown, resumed_from,
+              problems [(행 번호, 값, 사유), ...]
+    Raises:
+        UploadSheetError: 헤더 또는 필수 컬럼이 없을 때
+    """
+    spec = UPLOAD_IMPORTS[import_type]
+    file_hash = file_sha256(file_path)
+    summary = {'import_type': import_type, 'filename': filename,
+               'rows': 0, 'inserted': 0, 'skipped': 0, 'duplicates': 0, 'unknown': 0,
+               'resumed_from': 0, 'problems': [], 'unknown_message': spec['unknown_message']}
+
+    with db.cursor(dictionary=True) as cursor:
+        checkpoint = get_upload_checkpoint(cursor, file_hash, import_type)
+    if checkpoint and checkpoint['status'] != 'complete':
+        summary['rows'] = summary['resumed_from'] = checkpoint['rows_done']
+        for key in UPLOAD_COUNT_KEYS:
+            summary[key] = checkpoint[key]
+        logging.info(f"업로드 이어서 처리: {filename} ({import_type}), {checkpoint['rows_done']}행 이후부터")
+
+    try:
+        with open_upload_sheet(file_path, spec['columns'], spec['is_header_row']) as (header_row_index, records):
+            logging.info(f"엑셀 파일을 성공적으로 읽었습니다: {filename} (헤더 행: {header_row_index})")
+            for batch in iter_upload_batches(records, spec['columns'], UPLOAD_CHUNK_ROWS, summary['resumed_from']):
+                # 커밋이 끝나기 전에는 summary를 바꾸지 않습니다. 실패하면 롤백된 묶음이 체크포인트에 들어가지 않아야
+                # 이어서 처리할 때 그 행들을 다시 가져옵니다.
+                with db.cursor(dictionary=True) as cursor:
+                    counts, problems = spec['import_batch'](cursor, batch)
+                    progress = {key: summary[key] + counts[key] for key in UPLOAD_COUNT_KEYS}
+                    progress['rows'] = batch.index[-1] + 1
+                    save_upload_checkpoint(cursor, file_hash, import_type, filename, progress, 'running')
+                db.commit()
+                summary.update(progress)
+                room = UPLOAD_PROBLEM_LIMIT - len(summary['problems'])
+                summary['problems'].extend(problems[:max(room, 0)])
+                logging.info(f"업로드 {summary['rows']}행까지 커밋 ({filename}): 삽입 {summary['inserted']}건")
+                if on_batch is not None:
+                    on_batch(summary)
+    except Exception:
+        db.rollback()
+        if summary['rows'] > summary['resumed_from'] or checkpoint:
+            try:
+                with db.cursor() as cursor:
+                    save_upload_checkpoint(cursor, file_hash, import_type, filename, summary, 'failed')
+                db.commit()
+            except mysql.connector.Error as checkpoint_err:
+                # 연결이 끊긴 경우 등. 마지막으로 커밋된 'running' 체크포인트에서 이어서 처리할 수 있습니다.
+                logging.error(f"업로드 체크포인트 저장 실패 ({filename}): {checkpoint_err}")
+        raise
+
+    with db.cursor() as cursor:
+        save_upload_checkpoint(cursor, file_hash, import_type, filename, summary, 'complete')
+    db.commit()
+    return summary
+
+def upload_summary_messages(summary):
+    """
+    가져오기 결과를 (category, message) 목록으로 만듭니다. 미등록 계좌/매출처 행은 앞의 10건만 표시합니다.
+    """
+    spec = UPLOAD_IMPORTS[summary['import_type']]
+    messages = []
+    if summary['resumed_from']:
+        messages.append(('info', f"이전에 중단된 업로드를 {summary['resumed_from']}행 다음부터 이어서 처리했습니다."))
+    if summary['duplicates']:
+        messages.append(('info', f"중복 입금 내역 {summary['duplicates']}건은 건너뛰었습니다."))
+    problems = summary['problems'][:10]
+    if summary['unknown']:
+        sample = ", ".join(f"Row {row_no}: '{value}'" for row_no, value, _ in problems)
+        more = f" 외 {summary['unknown'] - len(problems)}건" if summary['unknown'] > len(problems) else ""
+        detail = f" - {sample}{more}" if sample else ""
+        messages.append(('warning', f"{summary['unknown_message']} ({summary['unknown']}건){detail}"))
+    if summary['import_type'] == 'orders' and summary['inserted'] == 0 and summary['unknown'] == 0:
+        messages.append(('danger', '발주 내역에 client_code가 없습니다.'))
+    else:
+        messages.append(('success', f"{summary['inserted']}개의 {spec['label']}이 성공적으로 업로드되었습니다."))
+    return messages
+
+# ------------------------
+# 업로드 비동기 처리 (작업 큐)
+# ------------------------
+# 업로드 요청은 파일을 저장하고 작업 큐에 등록한 뒤 바로 상태 페이지로 이동합니다.
+# 실제 가져오기는 작업 큐 워커가 run_chunked_import로 처리하며, 묶음마다 진행 상황을 기록합니다.
+UPLOAD_IMPORT_FOLDER = os.path.join(UPLOAD_FOLDER, 'imports')          # 처리 대기 업로드 파일 (작업이 끝나면 삭제)
+UPLOAD_IMPORT_RETENTION_DAYS = int(os.getenv('UPLOAD_IMPORT_RETENTION_DAYS', '7'))  # 남아 있는 업로드 파일 보관 기간
+UPLOAD_REPORT_FOLDER = os.path.join(OUTPUT_FOLDER, 'upload_reports')   # 문제 행 CSV 보고서
+
+def save_upload_file(file, filename, import_type):
+    """
+    업로드 파일을 UPLOAD_IMPORT_FOLDER/<import_type>_<sha256>_<업로드 ID>.<확장자>로 저장하고 (경로, 해시)를 반환합니다.
+    업로드마다 파일이 따로 있으므로 한 작업이 끝나 자기 파일을 지워도 다른 업로드의 파일은 남습니다.
+    (이어서 처리하기 위한 체크포인트는 경로가 아니라 내용 해시 기준입니다.)
+    """
+    os.makedirs(UPLOAD_IMPORT_FOLDER, exist_ok=True)
+    prune_upload_files()
+    tmp_path = os.path.join(UPLOAD_IMPORT_FOLDER, f".{uuid.uuid4().hex}.tmp")
+    file.save(tmp_path)
+    file_hash = file_sha256(tmp_path)
+    extension = filename.rsplit('.', 1)[1].lower()
+    file_path = os.path.join(UPLOAD_IMPORT_FOLDER, f"{import_type}_{file_hash}_{uuid.uuid4().hex}.{extension}")
+    os.replace(tmp_path, file_path)
+    return file_path, file_hash
+
+def remove_upload_file(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.warning(f"업로드 파일 삭제 실패 ({file_path}): {e}")
+
+def prune_upload_files():
+    """
+    UPLOAD_IMPORT_RETENTION_DAYS보다 오래 남아 있는 업로드 파일(작업이 끝나지 못한 경우 등)을 지웁니다.
+    """
+    cutoff = time.time() - UPLOAD_IMPORT_RETENTION_DAYS * 86400
+    for name in os.listdir(UPLOAD_IMPORT_FOLDER):
+        path = os.path.join(UPLOAD_IMPORT_FOLDER, name)
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                logging.info(f"오래된 업로드 파일 삭제: {path}")
+        except OSError:
+            continue
+
+def submit_upload_import(import_type, file_path, file_hash, filename):
+    """
+    저장된 업로드 파일의 가져오기 작업을 큐에 등록하고 상태 페이지로 이동하는 응답을 반환합니다.
+    같은 내용의 파일이 이미 대기/처리 중이면 그 작업을 보여 줍니다.
+    """
+    spec = UPLOAD_IMPORTS[import_type]
+    params = {'import_type': import_type, 'file_path': file_path, 'filename': filename}
+    try:
+        task_id, created = get_job_queue().submit(spec['task_type'], params, JOB_PRIORITY_HIGH,
+                                                  job_key=make_job_key(spec['task_type'], {'file_hash': file_hash}))
+    except JobQueueFullError as e:
+        logging.warning(f"작업 큐 대기 한도 초과: {e}")
+        remove_upload_file(file_path)
+        flash("현재 대기 중인 작업이 많습니다. 잠시 후 다시 시도해 주세요.", 'warning')
+        return redirect(url_for(spec['form_endpoint']))
+    except Exception as e:
+        logging.error(f"업로드 가져오기 작업 등록 실패: {e}", exc_info=True)
+        remove_upload_file(file_path)
+        flash('파일을 처리하는 중 오류가 발생했습니다.', 'danger')
+        return redirect(url_for(spec['form_endpoint']))
+    if created:
+        flash(f"{filename} 파일을 접수했습니다. 백그라운드에서 처리합니다.", 'info')
+    else:
+        # 기존 작업은 자기 파일로 처리하므로 이번에 저장한 파일은 필요 없습니다.
+        remove_upload_file(file_path)
+        flash("같은 파일이 이미 처리 중입니다. 해당 작업의 상태를 표시합니다.", 'info')
+    return redirect(url_for('upload_import_status', task_id=task_id))
+
+def write_upload_report(task_id, problems):
+    """
+    문제 행 목록을 CSV(UTF-8 BOM, 엑셀에서 바로 열림)로 저장하고 경로를 반환합니다. 문제 행이 없으면 None.
+    """
+    if not problems:
+        return None
+    os.makedirs(UPLOAD_REPORT_FOLDER, exist_ok=True)
+    report_path = os.path.join(UPLOAD_REPORT_FOLDER, f"{task_id}.csv")
+    with open(report_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['행 번호', '값', '사유'])
+        writer.writerows(problems)
+    return report_path
+
+def background_import_upload(task_id, import_type, file_path, filename):
+    """
+    작업 큐 워커에서 업로드 파일을 가져옵니다. 묶음 커밋마다 진행 상황을 기록하고,
+    끝나면 건수와 문제 행 보고서 경로를 result(JSON)에 저장합니다.
+    중단된 작업이 다시 실행되면 run_chunked_import가 체크포인트 다음 행부터 이어서 처리합니다.
+    작업이 끝나면 (성공/실패 모두) 업로드 파일을 지웁니다. 프로세스가 죽은 경우에는 남아 있어 재실행에 쓰입니다.
+    """
+    try:
+        _import_upload(task_id, import_type, file_path, filename)
+    finally:
+        remove_upload_file(file_path)
+
+def _import_upload(task_id, import_type, file_path, filename):
+    started = time.time()
+
+    def report_progress(summary):
+        progress = {'stage': 'importing', 'filename': filename, 'rows': summary['rows'],
+                    'resumed_from': summary['resumed_from'], 'elapsed_seconds': round(time.time() - started)}
+        progress.update({key: summary[key] for key in UPLOAD_COUNT_KEYS})
+        update_task_progress(task_id, json.dumps(progress, ensure_ascii=False))
+
+    db = get_db_connection()
+    if db is None:
+        raise RuntimeError("데이터베이스 연결에 실패했습니다.")
+    try:
+        summary = run_chunked_import(db, file_path, filename, import_type, on_batch=report_progress)
+    except UploadSheetError as e:
+        logging.warning(f"업로드 가져오기 실패 ({filename}): {e}")
+        update_task_status(task_id, 'failed', str(e))
+        return
+    finally:
+        db.close()
+
+    report_path = write_upload_report(task_id, summary['problems'])
+    result = dict(summary, problems=summary['problems'][:10], problems_total=len(summary['problems']),
+                  report=report_path)
+    logging.info(f"업로드 가져오기 완료 ({filename}): {summary['rows']}행, 삽입 {summary['inserted']}건, "
+                 f"중복 {summary['duplicates']}건, 미등록 {summary['unknown']}건, 건너뜀 {summary['skipped']}건")
+    update_task_status(task_id, 'complete', json.dumps(result, ensure_ascii=False, default=str))
+
+def get_upload_task(task_id):
+    """
+    업로드 가져오기 작업이면 (task, params)를, 아니면 (None, None)을 반환합니다.
+    """
+    task = get_task(task_id) if task_id else None
+    try:
+        params = json.loads(task['params']) if task and task.get('params') else {}
+    except ValueError:
+        params = {}
+    if params.get('import_type') not in UPLOAD_IMPORTS:
+        return None, None
+    return task, params
+
+@app.route('/upload_import_status', methods=['GET'])
+def upload_import_status():
+    task_id = request.args.get('task_id', None)
+    task, params = get_upload_task(task_id)
+    if not task:
+        flash("유효하지 않은 작업 ID입니다.", "danger")
+        return redirect(url_for('index'))
+
+    spec = UPLOAD_IMPORTS[params['import_type']]
+    summary = None
+    if task['status'] == 'complete':
+        try:
+            summary = json.loads(task['result'])
+        except (TypeError, ValueError) as e:
+            logging.error(f"작업 결과 파싱 오류: {e}", exc_info=True)
+            flash("작업 결과를 처리하는 중 오류가 발생했습니다.", "danger")
+        else:
+            for category, message in upload_summary_messages(summary):
+                flash(message, category)
+    elif task['status'] == 'failed':
+        flash(f"업로드 처리 실패: {task['result']}", 'danger')
+    return render_template('upload_import_status.html', task_id=task_id, status=task['status'],
+                           filename=params.get('filename', ''), label=spec['label'], summary=summary,
+                           form_url=url_for(spec['form_endpoint']))
+
+@app.route('/upload_import_report', methods=['GET'])
+def upload_import_report():
+    """
+    완료된 업로드 작업의 문제 행(미등록 계좌/매출처) 보고서를 CSV로 내려받습니다.
+    """
+    task_id = request.args.get('task_id', None)
+    task, params = get_upload_task(task_id)
+    if not task:
+        flash("유효하지 않은 작업 ID입니다.", "danger")
+        return redirect(url_for('index'))
+    try:
+        report_path = json.loads(task['result']).get('report') if task['status'] == 'complete' else None
+    except (TypeError, ValueError):
+        report_path = None
+    if not report_path or not os.path.isfile(report_path):
+        flash("내려받을 문제 행 보고서가 없습니다.", 'warning')
+        return redirect(url_for('upload_import_status', task_id=task_id))
+    stem = os.path.splitext(params.get('filename') or task_id)[0]
+    return send_file(report_path, mimetype='text/csv', as_attachment=True,
+                     download_name=f"{stem}_문제행.csv")
+
 # 발주 내역 다량 업로드
 @app.route('/upload_orders', methods=['GET', 'POST'])
 def upload_orders():
@@ -1701,189 +3625,130 @@ def upload_orders():
     if form.validate_on_submit():
         file = form.file.data
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            
-            # 업로드 디렉토리 생성 (존재하지 않을 경우)
-            os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-            logging.debug(f"업로드 디렉토리 생성 또는 이미 존재: {app.config['UPLOAD_FOLDER']}")
-            
+            # 화면/보고서에 쓰는 원래 파일명입니다. 저장 경로는 save_upload_file이 내용 해시로 정합니다.
+            filename = os.path.basename(file.filename)
             try:
-                file.save(file_path)
+                file_path, file_hash = save_upload_file(file, filename, 'orders')
                 logging.info(f"업로드된 파일이 저장되었습니다: {file_path}")
             except Exception as e:
                 logging.error(f"파일 저장 실패: {e}")
                 flash('업로드된 파일을 저장하는 중 오류가 발생했습니다.', 'danger')
                 return redirect(request.url)
 
-            db = get_db_connection()
-            if not db:
-                flash('Database connection failed.', 'danger')
-                return redirect(request.url)
-
-            try:
-                with db.cursor(dictionary=True) as cursor:
-                    # 엑셀 파일 읽기 (헤더 없는 경우)
-                    df = pd.read_excel(file_path, header=None)
-                    logging.info(f"엑셀 파일을 성공적으로 읽었습니다: {filename}")
-                    
-                    # 헤더 행 찾기
-                    header_row_index = None
-                    for i, row in df.iterrows():
-                        if all(col in row.values for col in ['order_date', 'client_code', 'order_amount', 'collector_key']):
-                            header_row_index = i
-                            break
-
-                    if header_row_index is None:
-                        logging.warning("엑셀 파일에서 헤더를 찾을 수 없습니다.")
-                        flash('엑셀 파일에서 헤더를 찾을 수 없습니다.', 'danger')
-                        return redirect(request.url)
-                    
-                    # 헤더가 있는 행부터 데이터 추출
-                    df = pd.read_excel(file_path, header=header_row_index)
-                    logging.debug(f"헤더가 발견된 행: {header_row_index}")
-                    logging.debug(f"데이터프레임 샘플:\n{df.head()}")
-
-                    # 필요한 컬럼 선택
-                    required_columns = ['order_date', 'client_code', 'order_amount', 'collector_key']
-                    if not all(col in df.columns for col in required_columns):
-                        missing_cols = [col for col in required_columns if col not in df.columns]
-                        logging.warning(f"엑셀 파일에 누락된 필드: {missing_cols}")
-                        flash(f'엑셀 파일에 누락된 필드가 있습니다: {missing_cols}', 'danger')
-                        return redirect(request.url)
-
-                    df = df[required_columns]
-
-                    # 데이터 타입 변환
-                    df['order_date'] = pd.to_datetime(df['order_date'], errors='coerce').dt.date
-                    df['client_code'] = df['client_code'].astype(str).str.strip()
-                    df['order_amount'] = pd.to_numeric(df['order_amount'], errors='coerce').fillna(0)
-                    df['collector_key'] = df['collector_key'].astype(str).str.strip()
-
-                    logging.debug(f"형변환 후 데이터프레임 샘플:\n{df.head()}")
-
-                    # 데이터 정제: 필수 컬럼 결측값 제거
-                    df = df.dropna(subset=['order_date', 'client_code', 'collector_key'])
-
-                    # ARClientMaster에서 필요한 데이터 가져오기
-                    client_codes = df['client_code'].unique().tolist()
-                    if not client_codes:
-                        logging.warning("발주 내역에 client_code가 없습니다.")
-                        flash('발주 내역에 client_code가 없습니다.', 'danger')
-                        return redirect(request.url)
-
-                    format_strings = ','.join(['%s'] * len(client_codes))
-                    cursor.execute(f"SELECT client_code, representative_code, client_name, manager FROM ARClientMaster WHERE client_code IN ({format_strings})", tuple(client_codes))
-                    clients = cursor.fetchall()
-                    client_dict = {client['client_code']: client for client in clients}
-
-                    # AROrderDetails 및 ARTransactionsLedger 데이터 준비
-                    order_details_data = []
-                    ledger_data = []
-                    for index, row in df.iterrows():
-                        client_code = row['client_code']
-                        order_date = row['order_date']
-                        order_amount = row['order_amount']
-                        collector_key = row['collector_key']
-                        
-                        client = client_dict.get(client_code)
-                        if not client:
-                            logging.warning(f"client_code '{client_code}'가 ARClientMaster 테이블에 존재하지 않습니다.")
-                            flash(f"Row {index + 1}: client_code '{client_code}'가 ARClientMaster 테이블에 존재하지 않습니다.", 'warning')
-                            continue
-                        representative_code = client['representative_code']
-                        client_name = client['client_name']
-                        manager = client['manager']
-
-                        # AROrderDetails용 데이터 준비
-                        order_details_data.append((
-                            representative_code,
-                            client_code,    # client_code 사용
-                            client_name,
-                            collector_key,
-                            manager,
-                            order_date,
-                            order_amount
-                        ))
-
-                        # ARTransactionsLedger용 데이터 준비
-                        ledger_data.append((
-                            order_date,                # transaction_date
-                            representative_code,       # representative_code
-                            client_code,               # client
-                            client_name,               # outlet_name
-                            order_amount,              # debit
-                            0,                          # credit
-                            order_amount,              # food_material_sales
-                            0,                         # royalty_sales
-                            0,                         # advertising_fees
-                            0,                         # other_sales
-                            0,                         # cash_deposit
-                            0,                         # meal_voucher_deposit
-                            0,                         # delivery_fee
-                            0,                         # card_deposit
-                            0,                         # pos_usage_fee
-                            0                          # receivables
-                        ))
-
-                    # AROrderDetails 테이블에 데이터 삽입
-                    if order_details_data:
-                        insert_order_query = """
-                            INSERT INTO AROrderDetails (
-                                representative_code, client_code, client_name, collector_key, manager, order_date, order_amount
-                            )
-                            VALUES (
-                                %s, %s, %s, %s, %s, %s, %s
-                            )
-                        """
-                        cursor.executemany(insert_order_query, order_details_data)
-                        logging.debug(f"AROrderDetails 삽입 성공: {len(order_details_data)}건")
-                    
-                    # ARTransactionsLedger 테이블에 데이터 삽입
-                    if ledger_data:
-                        insert_ledger_query = """
-                            INSERT INTO ARTransactionsLedger (
-                                transaction_date,
-                                representative_code,
-                                client,
-                                outlet_name,
-                                debit,
-                                credit,
-                                food_material_sales,
-                                royalty_sales,
-                                advertising_fees,
-                                other_sales,
-                                cash_deposit,
-                                meal_voucher_deposit,
-                                delivery_fee,
-                                card_deposit,
-                                pos_usage_fee,
-                                receivables
-                            )
-                            VALUES (
-                                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                            )
-                        """
-                        cursor.executemany(insert_ledger_query, ledger_data)
-                        logging.debug(f"ARTransactionsLedger 삽입 성공: {len(ledger_data)}건")
-
-                    # 트랜잭션 커밋
-                    db.commit()
-                    inserted_records = len(order_details_data)
-                    logging.info(f"{inserted_records}개의 발주 내역이 성공적으로 업로드되었습니다.")
-                    flash(f'{inserted_records}개의 발주 내역이 성공적으로 업로드되었습니다.', 'success')
-                    return redirect(url_for('index'))
-            except Exception as e:
-                logging.error(f"업로드된 파일 처리 중 오류 발생: {e}")
-                db.rollback()
-                flash('파일을 처리하는 중 오류가 발생했습니다.', 'danger')
-                return redirect(request.url)
-            finally:
-                db.close()
+            return submit_upload_import('orders', file_path, file_hash, filename)
     return render_template('upload_orders.html', form=form)
 
 
 # 미수금액 조회
+# 목록은 (client_key, outlet_key) 기본키 순서로 한 페이지씩 읽습니다 (keyset 페이지: 다음/이전 페이지의 기준 키를 넘김).
+RECEIVABLES_PAGE_SIZE = int(os.getenv('RECEIVABLES_PAGE_SIZE', '200'))
+# 출고처명 검색에 ngram 전문 검색 인덱스 사용 (migrations/008_receivables_search_index.sql)
+RECEIVABLES_FULLTEXT_SEARCH = os.getenv('RECEIVABLES_FULLTEXT_SEARCH', 'true').lower() == 'true'
+RECEIVABLES_NGRAM_TOKEN_SIZE = int(os.getenv('RECEIVABLES_NGRAM_TOKEN_SIZE', '2'))  # MySQL ngram_token_size
+
+# 요약 테이블 + 보증금 (ARClientMaster를 정규화 키로 묶어 붙입니다)
+RECEIVABLES_FROM = """
+    FROM
+        ARReceivablesSummary AS s
+    LEFT JOIN (
+        SELECT client_key, MAX(deposit) AS deposit
+        FROM ARClientMaster
+        GROUP BY client_key
+    ) AS m ON m.client_key = s.client_key
+"""
+
+def receivables_search_condition(search_outlet, use_fulltext):
+    """
+    출고처명 검색 조건 (SQL, 파라미터 목록). 전문 검색 인덱스로 후보를 찾고 LIKE로 부분 일치를 확인합니다.
+    단어가 ngram 토큰보다 짧으면 인덱스로 찾을 수 없으므로 LIKE만 사용합니다.
+    """
+    if not search_outlet:
+        return None, []
+    term = search_outlet.upper().strip()
+    pattern = f"%{term}%"
+    words = term.replace('"', ' ').split()
+    if use_fulltext and words and all(len(word) >= RECEIVABLES_NGRAM_TOKEN_SIZE for word in words):
+        return "MATCH(s.outlet_key) AGAINST (%s IN BOOLEAN MODE) AND s.outlet_key LIKE %s", [f'"{" ".join(words)}"', pattern]
+    return "s.outlet_key LIKE %s", [pattern]
+
+def fetch_receivables(cursor, search_outlet, after_key=None, before_key=None, use_fulltext=True,
+                      page_size=RECEIVABLES_PAGE_SIZE):
+    """
+    검색 조건 전체의 합계(한 번의 집계 쿼리)와 기준 키 다음(또는 이전) 한 페이지를 조회합니다.
+
+    Returns:
+        (rows, totals, has_previous, has_next)
+    """
+    condition, params = receivables_search_condition(search_outlet, use_fulltext)
+    where = [condition] if condition else []
+
+    cursor.execute(f"""
+        SELECT
+            COUNT(*) AS row_count,
+            COALESCE(SUM(s.total_debit), 0) AS sum_total_debit,
+            COALESCE(SUM(s.total_credit), 0) AS sum_total_credit,
+            COALESCE(SUM(s.total_food_material_sales), 0) AS sum_food_material_sales,
+            COALESCE(SUM(s.total_royalty_sales), 0) AS sum_royalty_sales,
+            COALESCE(SUM(s.total_pos_usage_fee), 0) AS sum_pos_usage_fee,
+            COALESCE(SUM(s.total_cash_deposit), 0) AS sum_cash_deposit,
+            COALESCE(SUM(s.total_card_deposit), 0) AS sum_card_deposit,
+            COALESCE(SUM(s.total_debit - s.total_credit), 0) AS sum_receivables,
+            COALESCE(SUM(m.deposit), 0) AS sum_deposit
+        {RECEIVABLES_FROM}
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+    """, tuple(params))
+    totals = cursor.fetchone()
+
+    # 이전 페이지는 역순으로 읽어 뒤집습니다.
+    page_params = list(params)
+    if before_key:
+        where.append("(s.client_key < %s OR (s.client_key = %s AND s.outlet_key < %s))")
+        page_params += [before_key[0], before_key[0], before_key[1]]
+        direction = 'DESC'
+    elif after_key:
+        where.append("(s.client_key > %s OR (s.client_key = %s AND s.outlet_key > %s))")
+        page_params += [after_key[0], after_key[0], after_key[1]]
+        direction = 'ASC'
+    else:
+        direction = 'ASC'
+
+    cursor.execute(f"""
+        SELECT
+            s.client_key AS client,
+            s.outlet_key AS outlet_name,
+            s.total_debit,
+            s.total_credit,
+            s.total_food_material_sales,
+            s.total_royalty_sales,
+            s.total_pos_usage_fee,
+            s.total_cash_deposit,
+            s.total_card_deposit,
+            s.total_debit - s.total_credit AS receivables,
+            IFNULL(m.deposit, 0) AS deposit
+        {RECEIVABLES_FROM}
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY
+            s.client_key {direction}, s.outlet_key {direction}
+        LIMIT %s
+    """, tuple(page_params + [page_size + 1]))
+    rows = cursor.fetchall()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if before_key:
+        rows.reverse()
+        return rows, totals, has_more, True
+    return rows, totals, after_key is not None, has_more
+
+def page_key_arg(prefix):
+    """
+    after_client/after_outlet 같은 페이지 기준 키 파라미터. 없으면 None.
+    """
+    client = request.args.get(f'{prefix}_client')
+    if client is None:
+        return None
+    return client, request.args.get(f'{prefix}_outlet', '')
+
 @app.route('/view_receivables', methods=['GET'])
 def view_receivables():
     db = get_db_connection()
@@ -1895,74 +3760,40 @@ def view_receivables():
         with db.cursor(dictionary=True) as cursor:
             # 검색 파라미터 가져오기
             search_outlet = request.args.get('search_outlet', '').strip()
+            after_key = page_key_arg('after')
+            before_key = page_key_arg('before')
 
-            # 수정된 쿼리: LEFT JOIN 및 집계 함수 추가
-            query = """
-                SELECT 
-                    TRIM(UPPER(t.client)) AS client,
-                    TRIM(UPPER(t.outlet_name)) AS outlet_name,
-                    SUM(t.debit) AS total_debit,
-                    SUM(t.credit) AS total_credit,
-                    SUM(t.food_material_sales) AS total_food_material_sales,
-                    SUM(t.royalty_sales) AS total_royalty_sales,
-                    SUM(t.pos_usage_fee) AS total_pos_usage_fee,
-                    SUM(t.cash_deposit) AS total_cash_deposit,
-                    SUM(t.card_deposit) AS total_card_deposit,
-                    SUM(t.debit) - SUM(t.credit) AS receivables,
-                    IFNULL(MAX(m.deposit), 0) AS deposit
-                FROM 
-                    ARTransactionsLedger AS t
-                LEFT JOIN 
-                    ARClientMaster AS m ON TRIM(UPPER(t.client)) = TRIM(UPPER(m.client_code))
-            """
-
-            params = []
-
-            # 검색 조건 추가
-            if search_outlet:
-                query += " WHERE TRIM(UPPER(t.outlet_name)) LIKE %s"
-                params.append(f"%{search_outlet.upper().strip()}%")
-
-            # GROUP BY 및 ORDER BY 추가
-            query += """
-                GROUP BY 
-                    TRIM(UPPER(t.client)), 
-                    TRIM(UPPER(t.outlet_name))
-                ORDER BY 
-                    client, outlet_name
-            """
-
-            cursor.execute(query, tuple(params))
-            results = cursor.fetchall()
-
-            # 합계 계산
-            sum_total_debit = sum(row['total_debit'] for row in results) if results else 0
-            sum_total_credit = sum(row['total_credit'] for row in results) if results else 0
-            sum_food_material_sales = sum(row['total_food_material_sales'] for row in results) if results else 0
-            sum_royalty_sales = sum(row['total_royalty_sales'] for row in results) if results else 0
-            sum_pos_usage_fee = sum(row['total_pos_usage_fee'] for row in results) if results else 0
-            sum_cash_deposit = sum(row['total_cash_deposit'] for row in results) if results else 0
-            sum_card_deposit = sum(row['total_card_deposit'] for row in results) if results else 0
-            sum_receivables = sum(row['receivables'] for row in results) if results else 0
-            sum_deposit = sum(row['deposit'] for row in results) if results else 0  # 보증금 합계
+            try:
+                results, totals, has_previous, has_next = fetch_receivables(
+                    cursor, search_outlet, after_key, before_key, RECEIVABLES_FULLTEXT_SEARCH)
+            except mysql.connector.Error as search_err:
+                # 전문 검색 인덱스가 아직 없으면 LIKE 검색으로 조회합니다.
+                if search_err.errno != mysql.connector.errorcode.ER_FT_MATCHING_KEY_NOT_FOUND:
+                    raise
+                logging.warning(f"출고처명 전문 검색 인덱스가 없어 LIKE로 검색합니다: {search_err}")
+                results, totals, has_previous, has_next = fetch_receivables(
+                    cursor, search_outlet, after_key, before_key, False)
 
             # 쿼리 결과 로그 출력
             logging.debug(f"미수금액 조회 결과: {results}")
-            logging.info("미수금액 조회 성공")
+            logging.info(f"미수금액 조회 성공 ({len(results)}/{totals['row_count']}건)")
 
             return render_template(
                 'view_receivables.html', 
                 results=results, 
                 search_outlet=search_outlet,
-                sum_total_debit=sum_total_debit,
-                sum_total_credit=sum_total_credit,
-                sum_food_material_sales=sum_food_material_sales,
-                sum_royalty_sales=sum_royalty_sales,
-                sum_pos_usage_fee=sum_pos_usage_fee,
-                sum_cash_deposit=sum_cash_deposit,
-                sum_card_deposit=sum_card_deposit,
-                sum_receivables=sum_receivables,
-                sum_deposit=sum_deposit  # 보증금 합계 전달
+                row_count=totals['row_count'],
+                has_previous=has_previous,
+                has_next=has_next,
+                sum_total_debit=totals['sum_total_debit'],
+                sum_total_credit=totals['sum_total_credit'],
+                sum_food_material_sales=totals['sum_food_material_sales'],
+                sum_royalty_sales=totals['sum_royalty_sales'],
+                sum_pos_usage_fee=totals['sum_pos_usage_fee'],
+                sum_cash_deposit=totals['sum_cash_deposit'],
+                sum_card_deposit=totals['sum_card_deposit'],
+                sum_receivables=totals['sum_receivables'],
+                sum_deposit=totals['sum_deposit']  # 보증금 합계 전달
             )
     except mysql.connector.Error as db_err:
         logging.error(f"미수금액 조회 실패: {db_err}")
@@ -1988,181 +3819,372 @@ def clean_decimal(value):
     except:
         return Decimal('0.00')
 
-@app.route('/view_daily_transactions', methods=['GET'])
-def view_daily_transactions():
-    db = get_db_connection()
-    if not db:
-        flash('데이터베이스 연결에 실패했습니다.', 'danger')
-        return redirect(url_for('index'))  # 'index' 라우트는 홈 페이지로 가정
+# 일별 조회 키 컬럼 (집계 쿼리 SELECT 순서)
+DAILY_TRANSACTION_KEYS = ['client', 'outlet_name', 'collector_key', 'manager']
+DAILY_TRANSACTION_DAY_KEYS = [f'day_{day}_{kind}' for day in range(1, 32) for kind in ('debit', 'credit')]
+
+def format_amounts(cents, zero, pattern='{:,.2f}'):
+    """
+    원 단위 * 100 정수 배열을 문자열 목록으로 한 번에 포맷합니다. 0 이하는 zero로 표시합니다.
+    """
+    return [pattern.format(value / 100) if value > 0 else zero for value in cents.tolist()]
+
+def pivot_daily_transactions(rows):
+    """
+    (client, outlet_name, collector_key, manager, day, debit_cents, credit_cents) 집계 행을
+    매출처 x 일자 배열로 펼칩니다. 금액은 원 단위 * 100 정수이므로 합계 오차 없이 정수 배열로 계산합니다.
+    MySQL은 일자별 그룹마다 대표 문자열 하나를 돌려주므로 ('abc'와 'ABC '가 날마다 다르게 나올 수 있음)
+    키는 대소문자와 앞뒤 공백을 무시하고 묶으며, 표시 값은 처음 나온 행의 것을 씁니다.
+
+    Returns:
+        (keys, daily) - keys: 매출처별 [client, outlet_name, collector_key, manager] (object 배열),
+                        daily: (매출처, 31일, [debit, credit]) int64 배열
+    """
+    if not rows:
+        return np.empty((0, len(DAILY_TRANSACTION_KEYS)), dtype=object), np.zeros((0, 31, 2), dtype=np.int64)
+    frame = pd.DataFrame.from_records(rows, columns=DAILY_TRANSACTION_KEYS + ['day', 'debit_cents', 'credit_cents'])
+    normalized = pd.DataFrame({column: [None if pd.isna(value) else str(value).upper().strip(' ')
+                                        for value in frame[column].tolist()]
+                               for column in DAILY_TRANSACTION_KEYS})
+    group_ids = normalized.groupby(DAILY_TRANSACTION_KEYS, sort=False, dropna=False).ngroup().to_numpy()
+    _, first_rows = np.unique(group_ids, return_index=True)
+    keys = frame[DAILY_TRANSACTION_KEYS].to_numpy(dtype=object)[first_rows]
+    keys[pd.isna(keys)] = None
+
+    cents = frame[['debit_cents', 'credit_cents']].to_numpy(dtype=np.int64)
+    days = frame['day'].to_numpy(dtype=np.int64) - 1
+    daily = np.zeros((len(keys), 31, 2), dtype=np.int64)
+    np.add.at(daily, (group_ids, days), cents)
+    return keys, daily
+
+def filter_daily_transactions(keys, text):
+    """
+    코드/매출처명/Collector_Key/담당 중 하나에 text가 들어 있는 매출처의 인덱스 배열 (대소문자 무시).
+    """
+    if not text:
+        return np.arange(len(keys))
+    needle = text.upper()
+    return np.flatnonzero([any(needle in str(value).upper() for value in row if value is not None)
+                           for row in keys.tolist()]).astype(np.int64)
+
+def order_daily_transactions(keys, daily, column, descending):
+    """
+    column(DAILY_TRANSACTION_KEYS 또는 total_debit/total_credit/total_receivables) 기준 정렬 인덱스.
+    같은 값끼리는 원래 순서를 유지합니다.
+    """
+    if column in DAILY_TRANSACTION_KEYS:
+        position = DAILY_TRANSACTION_KEYS.index(column)
+        values = ['' if value is None else str(value) for value in keys[:, position].tolist()]
+        return np.array(sorted(range(len(values)), key=values.__getitem__, reverse=descending), dtype=np.int64)
+    totals = daily.sum(axis=1)
+    values = {'total_debit': totals[:, 0], 'total_credit': totals[:, 1],
+              'total_receivables': totals[:, 0] - totals[:, 1]}[column]
+    return np.argsort(-values if descending else values, kind='stable')
+
+def format_daily_transactions(keys, daily, indexes):
+    """
+    indexes 순서대로 화면용 행(합계 + 일자별 day_data)을 만듭니다. 포맷은 넘겨받은 행에 대해서만 한 번에 합니다.
+    """
+    indexes = np.asarray(indexes, dtype=np.int64)
+    selected = daily[indexes]
+    totals = selected.sum(axis=1)
+    receivables = totals[:, 0] - totals[:, 1]
+    day_cells = format_amounts(selected.reshape(-1), '-')
+    row_totals = format_amounts(np.column_stack([totals, receivables]).reshape(-1), '0.00', '{:.2f}')
+    width = len(DAILY_TRANSACTION_DAY_KEYS)
+    data = []
+    for position, index in enumerate(indexes.tolist()):
+        client, outlet_name, collector_key, manager = keys[index]
+        data.append({
+            'client': client,
+            'outlet_name': outlet_name,
+            'collector_key': collector_key,
+            'manager': manager,
+            'total_debit': row_totals[position * 3],
+            'total_credit': row_totals[position * 3 + 1],
+            'total_receivables': row_totals[position * 3 + 2],
+            'day_data': dict(zip(DAILY_TRANSACTION_DAY_KEYS, day_cells[position * width:(position + 1) * width])),
+        })
+    return data
+
+def format_daily_totals(daily):
+    """
+    전체 합계 (총발주금액, 총입금금액, 총미수금액) 문자열. 0 이하는 '-'.
+    """
+    totals = daily.sum(axis=(0, 1))
+    return tuple(format_amounts(np.array([totals[0], totals[1], totals[0] - totals[1]]), '-'))
+
+# 매출처/점포/일자별 합계만 조회하고, 일자별 열로 펼치는 것은 pivot_daily_transactions에서 합니다.
+DAILY_TRANSACTIONS_LIVE_QUERY = """
+    SELECT 
+        A.client,
+        A.outlet_name,
+        C.collector_key,
+        C.manager,
+        DAY(A.transaction_date) AS day,
+        CAST(ROUND(COALESCE(SUM(A.debit), 0) * 100) AS SIGNED) AS debit_cents,
+        CAST(ROUND(COALESCE(SUM(A.credit), 0) * 100) AS SIGNED) AS credit_cents
+    FROM 
+        ARTransactionsLedger A
+    JOIN 
+        ARClientMaster C ON A.client_key = C.client_key
+    WHERE A.transaction_date >= %s AND A.transaction_date < %s{outlet_filter}
+    GROUP BY 
+        A.client, A.outlet_name, C.collector_key, C.manager, DAY(A.transaction_date)
+"""
+
+def fetch_daily_transactions_live(cursor, first_day, last_day, search_outlet):
+    params = [first_day, last_day]
+    outlet_filter = ""
+    if search_outlet:
+        outlet_filter = " AND A.outlet_name LIKE %s"
+        params.append(f"%{search_outlet}%")
+    query = DAILY_TRANSACTIONS_LIVE_QUERY.format(outlet_filter=outlet_filter)
+    logging.debug(f"실행할 쿼리: {query}")
+    logging.debug(f"쿼리 파라미터: {params}")
+    cursor.execute(query, tuple(params))
+    return cursor.fetchall()
+
+# ------------------------
+# 마감월 일별 집계 (ARDailyRollup)
+# ------------------------
+# 지난 달의 (매출처, 점포, 일자) 합계를 한 번 만들어 두고 다시 읽습니다. 그 달로 날짜가 잡힌 원장 변경은
+# 트리거가 ARDailyRollupMonth.version을 올려 알려 주고, 다음 조회 때 그 달만 다시 집계합니다.
+# 스키마/트리거: migrations/007_daily_rollup.sql
+DAILY_ROLLUP_ENABLED = os.getenv('DAILY_ROLLUP_ENABLED', '1') == '1'
+# 월말 후 이 일수가 지나야 마감월로 봅니다 (트리거는 DB 시계 기준으로 이번 달 변경을 건너뛰므로 시계 차이 대비).
+DAILY_ROLLUP_GRACE_DAYS = int(os.getenv('DAILY_ROLLUP_GRACE_DAYS', '1'))
+# 다른 조회가 같은 달을 다시 집계하는 동안 기다리는 최대 시간 (넘으면 원장에서 바로 집계)
+DAILY_ROLLUP_LOCK_SECONDS = int(os.getenv('DAILY_ROLLUP_LOCK_SECONDS', '30'))
+
+def is_closed_month(month_end, today=None):
+    """
+    month_end(다음 달 1일)가 지나고 DAILY_ROLLUP_GRACE_DAYS가 더 지났으면 마감월로 봅니다.
+    """
+    today = today or datetime.now().date()
+    return month_end + timedelta(days=DAILY_ROLLUP_GRACE_DAYS) <= today
+
+def daily_rollup_version(db, month_start):
+    """
+    (version, built_version). 읽은 뒤 트랜잭션을 끝내 다음 집계가 그 이후의 데이터를 보도록 합니다.
+    """
+    with db.cursor() as cursor:
+        cursor.execute("SELECT version, built_version FROM ARDailyRollupMonth WHERE month_start = %s", (month_start,))
+        row = cursor.fetchone()
+    db.commit()
+    return (row[0], row[1]) if row else (0, None)
+
+def ensure_daily_rollup(db, month_start, month_end):
+    """
+    마감월 집계가 없거나 그 뒤로 원장이 바뀌었으면 (version != built_version) 그 달만 다시 집계합니다.
+    집계 전에 읽은 version을 built_version으로 남기므로, 집계 중에 들어온 변경은 다음 조회 때 다시 반영됩니다.
+    같은 달의 집계는 GET_LOCK('daily_rollup_<월>')으로 한 번에 하나만 만들고, 기다린 조회는 잠금 안에서
+    version을 다시 확인하여 이미 만들어졌으면 그대로 씁니다. ARDailyRollupMonth 행은 잠그지 않으므로
+    집계 중에도 원장 트리거는 막히지 않습니다.
+
+    Returns:
+        bool: 집계를 쓸 수 있으면 True, DAILY_ROLLUP_LOCK_SECONDS 안에 잠금을 얻지 못하면 False
+    """
+    version, built_version = daily_rollup_version(db, month_start)
+    if built_version == version:
+        return True
+
+    lock_name = f"daily_rollup_{month_start:%Y%m}"
+    with db.cursor() as cursor:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (lock_name, DAILY_ROLLUP_LOCK_SECONDS))
+        acquired = cursor.fetchone()[0] == 1
+    if not acquired:
+        logging.warning(f"마감월 일별 집계 잠금 대기 시간 초과: {month_start:%Y-%m}")
+        return False
 
     try:
-        with db.cursor(dictionary=True) as cursor:
-            # 검색 파라미터 가져오기
-            search_outlet = request.args.get('search_outlet', '').strip()
-            selected_year = request.args.get('year', datetime.now().year, type=int)
-            selected_month = request.args.get('month', datetime.now().month, type=int)
+        version, built_version = daily_rollup_version(db, month_start)
+        if built_version == version:
+            return True
 
-            # 첫날과 마지막 날 계산
-            try:
-                first_day = datetime(selected_year, selected_month, 1).date()
-                if selected_month == 12:
-                    last_day = datetime(selected_year + 1, 1, 1).date()
-                else:
-                    last_day = datetime(selected_year, selected_month + 1, 1).date()
-            except ValueError as ve:
-                logging.error(f"날짜 계산 오류: {ve}")
-                flash('유효하지 않은 날짜입니다.', 'danger')
-                return redirect(url_for('index'))
-
-            # SQL 쿼리 작성
-            query = """
-                SELECT 
-                    A.client,
-                    A.outlet_name,
-                    C.collector_key,
-                    C.manager,
-            """
-
-            # 동적 SQL 쿼리 생성: 각 일자별로 debit과 credit 합계를 계산
-            day_sums = []
-            for day in range(1, 32):
-                day_sums.append(f"SUM(CASE WHEN DAY(A.transaction_date) = {day} THEN A.debit ELSE 0 END) AS `day_{day}_debit`")
-                day_sums.append(f"SUM(CASE WHEN DAY(A.transaction_date) = {day} THEN A.credit ELSE 0 END) AS `day_{day}_credit`")
-
-            # 총합계 계산 추가
-            day_sums.append("SUM(A.debit) AS `total_debit`")
-            day_sums.append("SUM(A.credit) AS `total_credit`")
-            day_sums.append("(SUM(A.debit) - SUM(A.credit)) AS `total_receivables`")  # total_receivables 추가
-
-            # SELECT 절에 모든 필드를 추가
-            query += ",\n".join(day_sums)
-
-            # FROM 절과 JOIN 절
-            query += """
-                FROM 
-                    ARTransactionsLedger A
-                JOIN 
-                    ARClientMaster C ON A.client = C.client_code
-            """
-
-            # 검색 조건 추가
-            conditions = []
-            params = []
-            if search_outlet:
-                conditions.append("A.outlet_name LIKE %s")
-                params.append(f"%{search_outlet}%")
-            conditions.append("A.transaction_date >= %s AND A.transaction_date < %s")
-            params.extend([first_day, last_day])
-
-            if conditions:
-                query += " WHERE " + " AND ".join(conditions)
-
-            # GROUP BY 절 및 ORDER BY 절
-            query += """
-                GROUP BY 
-                    A.client, A.outlet_name, C.collector_key, C.manager
-                ORDER BY 
-                    total_receivables DESC
-            """
-
-            logging.debug(f"실행할 쿼리: {query}")
-            logging.debug(f"쿼리 파라미터: {params}")
-
-            cursor.execute(query, tuple(params))
-            results = cursor.fetchall()
-
-            logging.debug(f"쿼리 결과: {results}")
-
-            # 전달할 데이터 구조를 준비
-            data = []
-            sum_total_debit = Decimal('0.00')
-            sum_total_credit = Decimal('0.00')
-            sum_total_receivables = Decimal('0.00')  # 최종 합계에서 계산
-
-            for row in results:
-                # total_debit, total_credit, total_receivables을 Decimal으로 변환
-                try:
-                    total_debit = clean_decimal(row['total_debit'])
-                    total_credit = clean_decimal(row['total_credit'])
-                    total_receivables = clean_decimal(row['total_receivables'])
-                except (ValueError, TypeError) as ve:
-                    logging.error(f"데이터 변환 오류: {ve}")
-                    total_debit = Decimal('0.00')
-                    total_credit = Decimal('0.00')
-                    total_receivables = Decimal('0.00')
-
-                logging.debug(f"Row total_debit: {total_debit}, Row total_credit: {total_credit}, Row total_receivables: {total_receivables}")
-
-                # 일별 데이터 수집
-                day_data = {}
-                for day in range(1, 32):
-                    debit_key = f'day_{day}_debit'
-                    credit_key = f'day_{day}_credit'
-                    try:
-                        debit_value = clean_decimal(row.get(debit_key, 0.0))
-                        credit_value = clean_decimal(row.get(credit_key, 0.0))
-                    except (ValueError, TypeError) as ve:
-                        logging.error(f"일별 데이터 변환 오류: {ve}")
-                        debit_value = Decimal('0.00')
-                        credit_value = Decimal('0.00')
-
-                    logging.debug(f"day_{day}_debit: {debit_value}, day_{day}_credit: {credit_value}")
-
-                    # 데이터가 0보다 크면 포맷팅된 값, 아니면 '-'
-                    day_data[f'day_{day}_debit'] = f"{debit_value:,.2f}" if debit_value > 0 else '-'
-                    day_data[f'day_{day}_credit'] = f"{credit_value:,.2f}" if credit_value > 0 else '-'
-
-                # 데이터 행 구성
-                data_row = {
-                    'client': row['client'],
-                    'outlet_name': row['outlet_name'],
-                    'collector_key': row['collector_key'],
-                    'manager': row['manager'],
-                    'total_debit': "{0:.2f}".format(total_debit) if total_debit > 0 else '0.00',
-                    'total_credit': "{0:.2f}".format(total_credit) if total_credit > 0 else '0.00',
-                    'total_receivables': "{0:.2f}".format(total_receivables) if total_receivables > 0 else '0.00',
-                    'day_data': day_data
-                }
-
-                logging.debug(f"Data Row: {data_row}")
-
-                # 누적 합계
-                sum_total_debit += total_debit
-                sum_total_credit += total_credit
-                sum_total_receivables += total_receivables
-
-                logging.debug(f"After adding row: sum_total_debit = {sum_total_debit}, sum_total_credit = {sum_total_credit}, sum_total_receivables = {sum_total_receivables}")
-
-                data.append(data_row)
-
-            # 최종 합계는 이미 누적됨
-            logging.debug(f"Final Sum - Debit: {sum_total_debit}, Credit: {sum_total_credit}, Receivables: {sum_total_receivables}")
-
-            # 전체 합계 포맷팅
-            formatted_sum_total_debit = f"{sum_total_debit:,.2f}" if sum_total_debit > 0 else '-'
-            formatted_sum_total_credit = f"{sum_total_credit:,.2f}" if sum_total_credit > 0 else '-'
-            formatted_sum_total_receivables = f"{sum_total_receivables:,.2f}" if sum_total_receivables > 0 else '-'  # 전체 합계 포맷팅 추가
+        started = time.time()
+        with db.cursor() as cursor:
+            cursor.execute("DELETE FROM ARDailyRollup WHERE month_start = %s", (month_start,))
+            cursor.execute("""
+                INSERT INTO ARDailyRollup (month_start, client, client_key, outlet_name, day, debit_cents, credit_cents)
+                SELECT %s, client, client_key, outlet_name, DAY(transaction_date),
+                       CAST(ROUND(COALESCE(SUM(debit), 0) * 100) AS SIGNED),
+                       CAST(ROUND(COALESCE(SUM(credit), 0) * 100) AS SIGNED)
+                FROM ARTransactionsLedger
+                WHERE transaction_date >= %s AND transaction_date < %s
+                GROUP BY client, client_key, outlet_name, DAY(transaction_date)
+            """, (month_start, month_start, month_end))
+            rollup_rows = cursor.rowcount
+            cursor.execute("""
+                INSERT INTO ARDailyRollupMonth (month_start, version, built_version, built_at)
+                VALUES (%s, %s, %s, NOW())
+                ON DUPLICATE KEY UPDATE built_version = VALUES(built_version), built_at = VALUES(built_at)
+            """, (month_start, version, version))
+        db.commit()
+        logging.info(f"마감월 일별 집계 생성: {month_start:%Y-%m}, {rollup_rows}행, version={version}, "
+                     f"{time.time() - started:.2f}초")
+        return True
+    except mysql.connector.Error:
+        db.rollback()
+        raise
+    finally:
+        with db.cursor() as cursor:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (lock_name,))
+            cursor.fetchone()
 
-            return render_template(
-                'view_daily_transactions.html',
-                data=data,
-                selected_year=selected_year,
-                selected_month=selected_month,
-                search_outlet=search_outlet,
-                sum_total_debit=formatted_sum_total_debit,
-                sum_total_credit=formatted_sum_total_credit,
-                sum_total_receivables=formatted_sum_total_receivables  # 전체 합계 전달
-            )
-    except mysql.connector.Error as db_err:
-        logging.error(f"데이터 조회 실패: {db_err}")
-        flash('데이터를 조회하는 중 오류가 발생했습니다.', 'danger')
-        return redirect(url_for('index'))
-    except Exception as e:
-        logging.error(f"예기치 않은 오류: {e}")
-        flash('데이터를 처리하는 중 오류가 발생했습니다.', 'danger')
-        return redirect(url_for('index'))
+def fetch_daily_rollup(db, month_start, month_end, search_outlet):
+    """
+    마감월 집계를 (필요하면 다시 만든 뒤) DAILY_TRANSACTIONS_LIVE_QUERY와 같은 형식의 행으로 반환합니다.
+    수금 담당은 읽을 때 ARClientMaster에서 붙입니다. 집계를 쓸 수 없으면 None.
+    """
+    if not ensure_daily_rollup(db, month_start, month_end):
+        return None
+    params = [month_start]
+    outlet_filter = ""
+    if search_outlet:
+        outlet_filter = " AND R.outlet_name LIKE %s"
+        params.append(f"%{search_outlet}%")
+    with db.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT 
+                R.client,
+                R.outlet_name,
+                C.collector_key,
+                C.manager,
+                R.day,
+                CAST(SUM(R.debit_cents) AS SIGNED) AS debit_cents,
+                CAST(SUM(R.credit_cents) AS SIGNED) AS credit_cents
+            FROM 
+                ARDailyRollup R
+            JOIN 
+                ARClientMaster C ON R.client_key = C.client_key
+            WHERE R.month_start = %s{outlet_filter}
+            GROUP BY 
+                R.client, R.outlet_name, C.collector_key, C.manager, R.day
+        """, tuple(params))
+        return cursor.fetchall()
+
+def month_range(year, month):
+    """
+    (그 달 1일, 다음 달 1일). 잘못된 연/월이면 ValueError.
+    """
+    first_day = datetime(year, month, 1).date()
+    if month == 12:
+        return first_day, datetime(year + 1, 1, 1).date()
+    return first_day, datetime(year, month + 1, 1).date()
+
+def fetch_daily_transaction_rows(db, first_day, last_day, search_outlet):
+    """
+    지난 달은 마감월 집계(ARDailyRollup)를, 이번 달은 원장을 바로 집계하여 같은 형식의 행으로 반환합니다.
+    """
+    if DAILY_ROLLUP_ENABLED and is_closed_month(last_day):
+        try:
+            rows = fetch_daily_rollup(db, first_day, last_day, search_outlet)
+            if rows is not None:
+                return rows
+        except mysql.connector.Error as rollup_err:
+            logging.warning(f"마감월 집계를 사용할 수 없어 원장에서 집계합니다 ({first_day:%Y-%m}): {rollup_err}")
+            db.rollback()
+    with db.cursor() as cursor:
+        return fetch_daily_transactions_live(cursor, first_day, last_day, search_outlet)
+
+# 일별 조회 그리드: 스크롤할 때마다 들어오는 페이지 요청이 같은 달을 다시 집계하지 않도록 잠시 보관합니다.
+DAILY_GRID_CACHE_SECONDS = int(os.getenv('DAILY_GRID_CACHE_SECONDS', '30'))
+DAILY_GRID_MAX_PAGE = int(os.getenv('DAILY_GRID_MAX_PAGE', '500'))  # 요청 1회 최대 행 수
+# DataTables 열 번호 -> 정렬 기준 (0번은 일자별 보기 버튼)
+DAILY_GRID_COLUMNS = {1: 'client', 2: 'outlet_name', 3: 'collector_key', 4: 'manager',
+                      5: 'total_debit', 6: 'total_credit', 7: 'total_receivables'}
+_daily_grid_cache = {}  # (first_day, search_outlet) -> (만료 시각, keys, daily)
+_daily_grid_cache_lock = threading.Lock()
+
+def load_daily_grid(first_day, last_day, search_outlet):
+    """
+    그 달의 매출처 x 일자 배열 (keys, daily)을 반환합니다. DAILY_GRID_CACHE_SECONDS 동안 재사용합니다.
+    """
+    cache_key = (first_day, search_outlet)
+    now = time.time()
+    with _daily_grid_cache_lock:
+        entry = _daily_grid_cache.get(cache_key)
+        if entry and entry[0] > now:
+            return entry[1], entry[2]
+
+    db = get_db_connection()
+    if db is None:
+        raise ConnectionError("데이터베이스 연결에 실패했습니다.")
+    try:
+        rows = fetch_daily_transaction_rows(db, first_day, last_day, search_outlet)
     finally:
         db.close()
+    keys, daily = pivot_daily_transactions(rows)
+    logging.debug(f"일별 조회 집계: {first_day:%Y-%m}, {len(rows)}행 -> 매출처 {len(keys)}개")
+
+    with _daily_grid_cache_lock:
+        for expired in [key for key, value in _daily_grid_cache.items() if value[0] <= now]:
+            del _daily_grid_cache[expired]
+        _daily_grid_cache[cache_key] = (now + DAILY_GRID_CACHE_SECONDS, keys, daily)
+    return keys, daily
+
+@app.route('/view_daily_transactions', methods=['GET'])
+def view_daily_transactions():
+    # 검색 조건만 그리고, 표 데이터는 그리드가 /api/daily_transactions에서 보이는 범위만 가져옵니다.
+    search_outlet = request.args.get('search_outlet', '').strip()
+    selected_year = request.args.get('year', datetime.now().year, type=int)
+    selected_month = request.args.get('month', datetime.now().month, type=int)
+    try:
+        month_range(selected_year, selected_month)
+    except ValueError as ve:
+        logging.error(f"날짜 계산 오류: {ve}")
+        flash('유효하지 않은 날짜입니다.', 'danger')
+        return redirect(url_for('index'))
+
+    return render_template(
+        'view_daily_transactions.html',
+        selected_year=selected_year,
+        selected_month=selected_month,
+        search_outlet=search_outlet
+    )
+
+@app.route('/api/daily_transactions', methods=['GET'])
+def api_daily_transactions():
+    """
+    일별 조회 그리드(DataTables 서버 처리 + Scroller)용 JSON.
+    요청: draw, start, length, search[value], order[0][column], order[0][dir], year, month, search_outlet
+    응답: 요청한 범위(start, length)의 행과 필터 결과 전체의 합계
+    """
+    draw = request.args.get('draw', 0, type=int)
+    search_outlet = request.args.get('search_outlet', '').strip()
+    try:
+        first_day, last_day = month_range(request.args.get('year', datetime.now().year, type=int),
+                                          request.args.get('month', datetime.now().month, type=int))
+    except ValueError:
+        return jsonify({'draw': draw, 'error': '유효하지 않은 날짜입니다.'}), 400
+    start = max(request.args.get('start', 0, type=int), 0)
+    length = request.args.get('length', 100, type=int)
+    if length < 0 or length > DAILY_GRID_MAX_PAGE:
+        length = DAILY_GRID_MAX_PAGE
+    column = DAILY_GRID_COLUMNS.get(request.args.get('order[0][column]', 7, type=int), 'total_receivables')
+    descending = request.args.get('order[0][dir]', 'desc') != 'asc'
+
+    try:
+        keys, daily = load_daily_grid(first_day, last_day, search_outlet)
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"데이터 조회 실패: {db_err}")
+        return jsonify({'draw': draw, 'error': '데이터를 조회하는 중 오류가 발생했습니다.'}), 500
+
+    matched = filter_daily_transactions(keys, request.args.get('search[value]', '').strip())
+    ordered = matched[order_daily_transactions(keys[matched], daily[matched], column, descending)]
+    sum_total_debit, sum_total_credit, sum_total_receivables = format_daily_totals(daily[matched])
+    return jsonify({
+        'draw': draw,
+        'recordsTotal': len(keys),
+        'recordsFiltered': len(matched),
+        'data': format_daily_transactions(keys, daily, ordered[start:start + length]),
+        'totals': {
+            'total_debit': sum_total_debit,
+            'total_credit': sum_total_credit,
+            'total_receivables': sum_total_receivables,
+        },
+    })
 
 # ------------------------
 # 새로운 라우트: 웹발주 엑셀다운로드
@@ -2224,24 +4246,18 @@ def download_orders_excel():
         order_date = form.order_date.data.strftime('%Y-%m-%d')
         try:
             # ETL 프로세스 실행하여 엑셀 및 PDF 파일 생성
-            file_paths = export_orders_to_files(order_date)
+            file_paths = export_orders_to_files(order_date, form.engine.data)
+            # export_orders_to_files는 병합된 PDF 경로 하나(str)를 반환합니다.
+            if isinstance(file_paths, str):
+                file_paths = [file_paths]
+            file_paths = [fp for fp in (file_paths or []) if fp and os.path.isfile(fp)]
             
             if not file_paths:
                 flash("파일이 생성되지 않았습니다.", "danger")
                 return redirect(url_for('download_orders_excel_form'))
             
-            # 생성된 모든 파일을 ZIP으로 압축하여 다운로드
-            with tempfile.TemporaryDirectory() as tmpdirname:
-                zip_path = os.path.join(tmpdirname, f"거래명세표_{order_date}.zip")
-                with ZipFile(zip_path, 'w') as zipf:
-                    for file_path in file_paths:
-                        zipf.write(file_path, os.path.basename(file_path))
-                return send_from_directory(
-                    directory=tmpdirname,
-                    path=os.path.basename(zip_path),
-                    as_attachment=True,
-                    download_name=f"거래명세표_{order_date}.zip"
-                )
+            # 생성된 모든 파일을 ZIP으로 묶어 스트리밍 다운로드
+            return zip_download_response(file_paths, f"거래명세표_{order_date}.zip")
             
         except Exception as e:
             logging.error(f"거래명세표 다운로드 중 오류 발생: {e}")
@@ -2265,20 +4281,59 @@ def download_orders_excel():
 # ------------------------
 
 
+# 파싱된 템플릿의 직렬화 이미지 캐시 (프로세스 단위, 템플릿 파일 수정 시각 기준으로 갱신)
+_template_cache = {'mtime': None, 'image': None, 'merged_index': None}
+_template_cache_lock = threading.Lock()
+
+def _get_template_image():
+    """
+    템플릿을 한 번만 파싱하여 pickle 이미지로 보관하고 반환합니다.
+    템플릿 파일의 수정 시각이 바뀌면 다시 파싱합니다.
+    """
+    mtime = os.path.getmtime(TEMPLATE_FILE)
+    with _template_cache_lock:
+        if _template_cache['image'] is None or _template_cache['mtime'] != mtime:
+            wb = load_workbook(TEMPLATE_FILE)
+            _template_cache['image'] = pickle.dumps(wb, protocol=pickle.HIGHEST_PROTOCOL)
+            _template_cache['merged_index'] = build_merged_cell_index(wb.active)
+            _template_cache['mtime'] = mtime
+            logging.info(f"엑셀 템플릿을 파싱하여 캐시했습니다: {TEMPLATE_FILE}")
+        return _template_cache['image']
+
+def build_merged_cell_index(ws):
+    """
+    병합 영역에 속한 모든 셀 (row, column)을 병합 영역 첫 번째 셀 (row, column)로 매핑합니다.
+    """
+    merged_index = {}
+    for merged_range in ws.merged_cells.ranges:
+        anchor = (merged_range.min_row, merged_range.min_col)
+        for row in range(merged_range.min_row, merged_range.max_row + 1):
+            for column in range(merged_range.min_col, merged_range.max_col + 1):
+                merged_index[(row, column)] = anchor
+    return merged_index
+
+def get_template_merged_index():
+    """
+    캐시된 템플릿의 병합 셀 인덱스를 반환합니다.
+    """
+    _get_template_image()
+    with _template_cache_lock:
+        return _template_cache['merged_index']
+
 def load_excel_template():
     """
-    엑셀 템플릿을 로드합니다.
+    엑셀 템플릿을 로드합니다. 캐시된 템플릿 이미지를 복원하여 매번 새 Workbook을 반환합니다.
     """
     if not os.path.exists(TEMPLATE_FILE):
         logging.error(f"엑셀 템플릿 파일이 존재하지 않습니다: {TEMPLATE_FILE}")
         raise FileNotFoundError(f"엑셀 템플릿 파일이 존재하지 않습니다: {TEMPLATE_FILE}")
     
-    wb = load_workbook(TEMPLATE_FILE)
+    wb = pickle.loads(_get_template_image())
     ws = wb.active
-    logging.info(f"엑셀 템플릿을 성공적으로 로드했습니다: {TEMPLATE_FILE}")
+    logging.debug(f"엑셀 템플릿을 캐시에서 복제했습니다: {TEMPLATE_FILE}")
     return wb, ws
 
-def insert_cell_value(ws, row, column, value):
+def insert_cell_value(ws, row, column, value, merged_index=None):
     """
     지정된 셀에 값을 삽입합니다. 병합된 셀일 경우 첫 번째 셀에만 값을 할당합니다.
     
@@ -2286,7 +4341,13 @@ def insert_cell_value(ws, row, column, value):
     :param row: 행 번호
     :param column: 열 번호
     :param value: 할당할 값
+    :param merged_index: build_merged_cell_index() 결과. 주어지면 병합 영역을 순회하지 않고 바로 찾습니다.
     """
+    if merged_index is not None:
+        anchor_row, anchor_column = merged_index.get((row, column), (row, column))
+        ws.cell(row=anchor_row, column=anchor_column).value = value
+        return
+
     cell = ws.cell(row=row, column=column)
     
     if cell.coordinate in ws.merged_cells:
@@ -2323,11 +4384,174 @@ def update_task_status(task_id, status, result):
             query = "UPDATE background_tasks SET status=%s, result=%s, updated_at=NOW() WHERE task_id=%s"
             cursor.execute(query, (status, result, task_id))
             db.commit()
+        task_events.publish(task_id, status=status, result=result)
     except Exception as e:
         logging.error(f"Update task error: {e}", exc_info=True)
     finally:
         db.close()
 
+def update_task_progress(task_id, progress):
+    db = get_db_connection()
+    if db is None:
+        return
+    try:
+        with db.cursor() as cursor:
+            query = "UPDATE background_tasks SET progress=%s, updated_at=NOW() WHERE task_id=%s"
+            cursor.execute(query, (progress, task_id))
+            db.commit()
+        task_events.publish(task_id, progress=progress)
+    except Exception as e:
+        logging.error(f"Update task progress error: {e}", exc_info=True)
+    finally:
+        db.close()
+
+# ------------------------
+# 작업 상태 알림 (SSE)
+# ------------------------
+# 작업 상태/진행 상황이 DB에 기록될 때 같은 프로세스의 구독자에게 바로 전달합니다.
+# 다른 프로세스가 실행하는 작업은 /api/task_events가 TASK_EVENT_DB_REFRESH마다 DB를 읽어 반영합니다.
+# SSE 연결은 탭마다 요청 처리 스레드를 하나씩 점유하므로 gunicorn은 gthread/gevent 워커로 실행합니다
+# (예: gunicorn -k gthread --threads 16 wsgi:app).
+TASK_EVENT_HEARTBEAT = int(os.getenv('TASK_EVENT_HEARTBEAT', '15'))        # 변경이 없을 때 keepalive 간격 (초)
+TASK_EVENT_DB_REFRESH = int(os.getenv('TASK_EVENT_DB_REFRESH', '15'))      # 변경 알림이 없을 때 DB 재조회 간격 (초)
+TASK_EVENT_MAX_SECONDS = int(os.getenv('TASK_EVENT_MAX_SECONDS', '600'))   # 연결 1회 최대 유지 시간 (브라우저가 자동 재연결)
+TASK_EVENT_RETENTION = int(os.getenv('TASK_EVENT_RETENTION', '3600'))      # 끝난 작업 상태를 메모리에 보관하는 시간 (초)
+
+def task_status_payload(task_id, status, result, progress):
+    """
+    /api/task_status, /api/task_events 공통 응답 형식을 만듭니다. progress는 JSON 문자열입니다.
+    """
+    try:
+        progress = json.loads(progress) if progress else None
+    except ValueError:
+        progress = None
+    return {
+        'task_id': task_id,
+        'status': status or '',
+        'result': result or '',
+        'progress': progress,
+        'partial_files': progress.get('files_done', 0) if progress else 0
+    }
+
+class TaskEventBus:
+    """
+    task_id별 최신 상태와 버전을 보관하고, 바뀔 때마다 대기 중인 구독자를 깨웁니다.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._tasks = {}  # task_id -> {'version', 'fields', 'touched'}
+
+    def _prune(self, now):
+        expired = [task_id for task_id, entry in self._tasks.items()
+                   if entry['fields'].get('status') in ('complete', 'failed')
+                   and now - entry['touched'] > TASK_EVENT_RETENTION]
+        for task_id in expired:
+            del self._tasks[task_id]
+
+    def _update(self, task_id, fields):
+        now = time.time()
+        entry = self._tasks.get(task_id)
+        if entry is None:
+            entry = self._tasks[task_id] = {'version': 0, 'fields': {'status': 'running', 'result': '', 'progress': None},
+                                            'touched': now}
+        merged = dict(entry['fields'], **fields)
+        entry['touched'] = now
+        if merged != entry['fields'] or entry['version'] == 0:
+            entry['fields'] = merged
+            entry['version'] += 1
+            self._cond.notify_all()
+        self._prune(now)
+
+    def publish(self, task_id, **fields):
+        """이 프로세스에서 기록한 변경을 알립니다 (status, result, progress 중 일부)."""
+        with self._cond:
+            self._update(task_id, fields)
+
+    def load(self, task):
+        """DB에서 읽은 background_tasks 행으로 상태를 갱신합니다."""
+        with self._cond:
+            self._update(task['task_id'], {'status': task.get('status'), 'result': task.get('result'),
+                                           'progress': task.get('progress')})
+
+    def snapshot(self, task_id):
+        with self._cond:
+            entry = self._tasks.get(task_id)
+            return dict(entry) if entry else None
+
+    def wait(self, task_id, version, timeout):
+        """
+        버전이 version과 달라지거나 timeout이 지나면 현재 항목을 반환합니다.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: task_id not in self._tasks or self._tasks[task_id]['version'] != version, timeout)
+            entry = self._tasks.get(task_id)
+            return dict(entry) if entry else None
+
+task_events = TaskEventBus()
+
+TASK_PROGRESS_INTERVAL = float(os.getenv('TASK_PROGRESS_INTERVAL', '2'))  # 진행 상황 DB 기록 최소 간격 (초)
+
+class TaskProgress:
+    """
+    내보내기 작업의 진행 상황을 background_tasks.progress(JSON)에 기록합니다.
+    DB 쓰기는 TASK_PROGRESS_INTERVAL초에 한 번으로 제한하되, 단계 변경과
+    거래처 파일 완료는 바로 기록합니다. 기록할 때마다 updated_at이 갱신되므로
+    작업 큐의 중단 작업 판정에도 쓰입니다.
+    거래처 수와 관계없이 크기가 일정하도록 건수만 기록하고, 완료된 파일 목록은
+    task_output_folder(task_id)에서 읽습니다.
+    """
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.started = time.time()
+        self.render_started = None
+        self._last_write = 0.0
+        self.state = {
+            'stage': 'fetching',
+            'clients_total': 0,
+            'clients_done': 0,
+            'days_total': 0,
+            'days_done': 0,
+            'pages': 0,
+            'files_done': 0,
+            'elapsed_seconds': 0,
+            'eta_seconds': None,
+        }
+        self._write(force=True)
+
+    def start(self, clients_total, days_total):
+        self.render_started = time.time()
+        self.state.update(stage='rendering', clients_total=clients_total, days_total=days_total)
+        self._write(force=True)
+
+    def day_done(self):
+        self.state['days_done'] += 1
+        self._write()
+
+    def client_done(self, pages=None):
+        """거래처 하나가 끝났을 때 호출합니다. 통합 PDF를 만들었으면 그 페이지 수를 넘깁니다."""
+        self.state['clients_done'] += 1
+        if pages is not None:
+            self.state['pages'] += pages
+            self.state['files_done'] += 1
+        self._write(force=pages is not None)
+
+    def finish(self, stage):
+        self.state['stage'] = stage
+        self.state['eta_seconds'] = 0 if stage == 'complete' else None
+        self._write(force=True)
+
+    def _write(self, force=False):
+        now = time.time()
+        if not force and now - self._last_write < TASK_PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        self.state['elapsed_seconds'] = round(now - self.started)
+        done, total = self.state['days_done'], self.state['days_total']
+        if self.state['stage'] == 'rendering' and done and total:
+            rate = (now - self.render_started) / done
+            self.state['eta_seconds'] = round(rate * (total - done))
+        update_task_progress(self.task_id, json.dumps(self.state, ensure_ascii=False))
+
 def get_task(task_id):
     db = get_db_connection()
     try:
@@ -2342,6 +4566,309 @@ def get_task(task_id):
     finally:
         db.close()
 
+# ------------------------
+# 백그라운드 작업 큐 (background_tasks 테이블 기반)
+# ------------------------
+# 작업 요청은 background_tasks에 'pending'으로 저장되고, 고정 개수의 워커 스레드가
+# priority DESC, created_at 순으로 하나씩 가져가 실행합니다.
+# 업로드 가져오기는 전용 워커(UPLOAD_QUEUE_WORKERS)와 대기 한도를 따로 두어, 오래 걸리는 거래명세표
+# 내보내기가 워커를 모두 차지하거나 대기열을 채워도 막히지 않습니다. 내보내기 워커도 업로드를 가져갈 수 있습니다.
+# 스키마 변경: migrations/001_background_tasks_job_queue.sql, migrations/009_background_tasks_heartbeat.sql
+EXPORT_QUEUE_WORKERS = int(os.getenv('EXPORT_QUEUE_WORKERS', '2'))              # 동시에 실행할 작업 수
+EXPORT_QUEUE_MAX_PENDING = int(os.getenv('EXPORT_QUEUE_MAX_PENDING', '20'))     # 대기 작업이 이 수 이상이면 새 요청 거절
+EXPORT_QUEUE_POLL_INTERVAL = int(os.getenv('EXPORT_QUEUE_POLL_INTERVAL', '5'))  # 대기 작업 확인 주기 (초)
+UPLOAD_QUEUE_WORKERS = int(os.getenv('UPLOAD_QUEUE_WORKERS', '1'))              # 업로드 가져오기만 실행하는 워커 수
+UPLOAD_QUEUE_MAX_PENDING = int(os.getenv('UPLOAD_QUEUE_MAX_PENDING', '20'))     # 대기 중인 업로드 가져오기 한도
+UPLOAD_TASK_TYPES = tuple(spec['task_type'] for spec in UPLOAD_IMPORTS.values())
+JOB_HEARTBEAT_SECONDS = int(os.getenv('JOB_HEARTBEAT_SECONDS', '15'))          # 실행 중인 작업의 heartbeat_at 갱신 주기 (초)
+JOB_HEARTBEAT_TIMEOUT = int(os.getenv('JOB_HEARTBEAT_TIMEOUT', '90'))          # 이 시간 동안 heartbeat가 없는 'running' 작업은 재실행
+
+JOB_PRIORITY_HIGH = 10   # 단일 매출처 요청, 업로드 가져오기
+JOB_PRIORITY_NORMAL = 0  # 전체매출처 요청
+
+class JobQueueFullError(Exception):
+    """대기 중인 작업이 EXPORT_QUEUE_MAX_PENDING(업로드 가져오기는 UPLOAD_QUEUE_MAX_PENDING) 이상일 때 발생합니다."""
+
+def make_job_key(task_type, params):
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{task_type}:{payload}".encode('utf-8')).hexdigest()
+
+class BackgroundJobQueue:
+    def __init__(self, workers, upload_workers=0):
+        self.workers = max(1, workers)
+        self.upload_workers = max(0, upload_workers)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._submit_lock = threading.Lock()
+        self._threads = []
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"  # 이 프로세스가 실행 중인 작업의 소유자 표시
+        self._stats_lock = threading.Lock()
+        self.stats = {'running': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'deduplicated': 0}
+
+    def _count(self, key, delta=1):
+        with self._stats_lock:
+            self.stats[key] += delta
+
+    def start(self):
+        self.recover_stale()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        for i in range(self.upload_workers):
+            thread = threading.Thread(target=self._run, args=(UPLOAD_TASK_TYPES,), name=f"upload-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        logging.info(f"백그라운드 작업 큐 시작: 워커 {self.workers}개, 업로드 전용 워커 {self.upload_workers}개 "
+                     f"({self.worker_id})")
+
+    def shutdown(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(JOB_HEARTBEAT_SECONDS):
+            self.heartbeat()
+            self.recover_stale()
+
+    def heartbeat(self):
+        """
+        이 프로세스가 실행 중인 작업의 heartbeat_at을 갱신합니다.
+        """
+        db = get_db_connection()
+        if db is None:
+            return
+        try:
+            with db.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE background_tasks SET heartbeat_at=NOW() WHERE status='running' AND worker_id=%s",
+                    (self.worker_id,)
+                )
+                db.commit()
+        except Exception as e:
+            logging.error(f"작업 heartbeat 갱신 오류: {e}", exc_info=True)
+        finally:
+            db.close()
+
+    def recover_stale(self):
+        """
+        프로세스가 죽어 JOB_HEARTBEAT_TIMEOUT 동안 heartbeat가 없는 'running' 작업을 다시 'pending'으로 돌립니다.
+        시작할 때와 heartbeat 주기마다 실행하므로 다른 프로세스의 중단 작업도 복구합니다.
+        'pending' 작업은 테이블에 남아 있으므로 워커가 그대로 이어서 처리합니다.
+        """
+        db = get_db_connection()
+        if db is None:
+            return
+        try:
+            with db.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE background_tasks "
+                    "SET status='pending', started_at=NULL, worker_id=NULL, heartbeat_at=NULL, updated_at=NOW() "
+                    "WHERE status='running' AND (heartbeat_at IS NULL OR heartbeat_at < NOW() - INTERVAL %s SECOND)",
+                    (JOB_HEARTBEAT_TIMEOUT,)
+                )
+                recovered = cursor.rowcount
+                db.commit()
+            if recovered:
+                logging.warning(f"중단된 작업 {recovered}건을 대기 상태로 복구했습니다.")
+        except Exception as e:
+            logging.error(f"중단 작업 복구 오류: {e}", exc_info=True)
+        finally:
+            db.close()
+
+    def submit(self, task_type, params, priority=JOB_PRIORITY_NORMAL, job_key=None):
+        """
+        작업을 큐에 등록하고 (task_id, 신규 여부)를 반환합니다.
+        같은 조건(job_key, 기본값은 params로 계산)의 작업이 대기/실행 중이면 그 task_id를 그대로 돌려줍니다.
+        다른 프로세스와 동시에 등록하는 경우는 active_job_key 유일 인덱스가 하나만 남깁니다.
+        """
+        job_key = job_key or make_job_key(task_type, params)
+        with self._submit_lock:
+            db = get_db_connection()
+            if db is None:
+                raise RuntimeError("데이터베이스 연결에 실패했습니다.")
+            try:
+                with db.cursor() as cursor:
+                    existing = self._active_task_id(cursor, job_key)
+                    if existing:
+                        self._count('deduplicated')
+                        return existing, False
+
+                    # 업로드 가져오기와 그 밖의 작업은 대기 한도를 따로 셉니다.
+                    is_upload = task_type in UPLOAD_TASK_TYPES
+                    placeholders = ', '.join(['%s'] * len(UPLOAD_TASK_TYPES))
+                    cursor.execute(
+                        f"SELECT COUNT(*) FROM background_tasks WHERE status='pending' "
+                        f"AND task_type {'IN' if is_upload else 'NOT IN'} ({placeholders})",
+                        UPLOAD_TASK_TYPES
+                    )
+                    (pending,) = cursor.fetchone()
+                    if pending >= (UPLOAD_QUEUE_MAX_PENDING if is_upload else EXPORT_QUEUE_MAX_PENDING):
+                        self._count('rejected')
+                        raise JobQueueFullError(f"대기 중인 작업이 너무 많습니다 ({pending}건).")
+
+                    task_id = str(uuid.uuid4())
+                    try:
+                        cursor.execute(
+                            "INSERT INTO background_tasks "
+                            "(task_id, task_type, params, job_key, priority, status, created_at, updated_at) "
+                            "VALUES (%s, %s, %s, %s, %s, 'pending', NOW(), NOW())",
+                            (task_id, task_type, json.dumps(params, ensure_ascii=False), job_key, priority)
+                        )
+                        db.commit()
+                    except mysql.connector.IntegrityError as dup_err:
+                        # 다른 프로세스가 같은 job_key를 먼저 등록했습니다 (uq_background_tasks_active_job_key).
+                        db.rollback()
+                        existing = self._active_task_id(cursor, job_key)
+                        if dup_err.errno != mysql.connector.errorcode.ER_DUP_ENTRY or existing is None:
+                            raise
+                        self._count('deduplicated')
+                        return existing, False
+            finally:
+                db.close()
+        logging.info(f"작업 등록: task_id={task_id}, type={task_type}, priority={priority}, params={params}")
+        task_events.publish(task_id, status='pending')
+        self._wakeup.set()
+        return task_id, True
+
+    @staticmethod
+    def _active_task_id(cursor, job_key):
+        cursor.execute(
+            "SELECT task_id FROM background_tasks WHERE active_job_key=%s LIMIT 1",
+            (job_key,)
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _claim_next(self, task_types=None):
+        """
+        가장 우선순위가 높은 대기 작업 하나를 'running'으로 바꾸고 반환합니다.
+        task_types를 넘기면 그 종류의 작업만 가져옵니다 (업로드 전용 워커).
+        UPDATE ... WHERE status='pending'의 영향 행 수로 다른 워커/프로세스와의 경합을 판정합니다.
+        """
+        db = get_db_connection()
+        if db is None:
+            return None
+        try:
+            with db.cursor(dictionary=True) as cursor:
+                type_filter = ""
+                params = []
+                if task_types:
+                    type_filter = f" AND task_type IN ({', '.join(['%s'] * len(task_types))})"
+                    params.extend(task_types)
+                cursor.execute(
+                    f"SELECT task_id FROM background_tasks WHERE status='pending'{type_filter} "
+                    "ORDER BY priority DESC, created_at ASC LIMIT %s",
+                    tuple(params) + (self.workers + self.upload_workers,)
+                )
+                candidates = [row['task_id'] for row in cursor.fetchall()]
+                db.commit()
+                for task_id in candidates:
+                    cursor.execute(
+                        "UPDATE background_tasks SET status='running', started_at=NOW(), updated_at=NOW(), "
+                        "worker_id=%s, heartbeat_at=NOW() "
+                        "WHERE task_id=%s AND status='pending'",
+                        (self.worker_id, task_id)
+                    )
+                    claimed = cursor.rowcount == 1
+                    db.commit()
+                    if claimed:
+                        task_events.publish(task_id, status='running')
+                        cursor.execute(
+                            "SELECT task_id, task_type, params FROM background_tasks WHERE task_id=%s",
+                            (task_id,)
+                        )
+                        return cursor.fetchone()
+            return None
+        except Exception as e:
+            logging.error(f"작업 가져오기 오류: {e}", exc_info=True)
+            return None
+        finally:
+            db.close()
+
+    def _execute(self, task):
+        task_id = task['task_id']
+        handler = JOB_HANDLERS.get(task['task_type'])
+        if handler is None or not task.get('params'):
+            logging.error(f"실행할 수 없는 작업입니다: task_id={task_id}, type={task['task_type']}")
+            update_task_status(task_id, 'failed', "작업 정보가 없어 실행할 수 없습니다.")
+            self._count('failed')
+            return
+        self._count('running')
+        try:
+            handler(task_id, json.loads(task['params']))
+            self._count('completed')
+        except Exception as e:
+            logging.error(f"작업 실행 오류 (task_id={task_id}): {e}", exc_info=True)
+            update_task_status(task_id, 'failed', str(e))
+            self._count('failed')
+        finally:
+            self._count('running', -1)
+
+    def _run(self, task_types=None):
+        while not self._stop.is_set():
+            task = self._claim_next(task_types)
+            if task is None:
+                self._wakeup.wait(EXPORT_QUEUE_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            self._execute(task)
+
+def run_client_statements_job(task_id, params):
+    background_export_client_orders(params['from_date'], params['to_date'], params.get('client_code', ''),
+                                    task_id, params.get('output_engine'))
+
+def run_upload_import_job(task_id, params):
+    background_import_upload(task_id, params['import_type'], params['file_path'], params['filename'])
+
+# task_type -> 실행 함수(task_id, params)
+JOB_HANDLERS = {
+    'client_statements': run_client_statements_job,
+    'bank_payments_import': run_upload_import_job,
+    'orders_import': run_upload_import_job,
+}
+
+_job_queue = None
+_job_queue_pid = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """
+    현재 프로세스의 작업 큐를 반환합니다. 처음 호출될 때 워커 스레드를 시작합니다.
+    """
+    global _job_queue, _job_queue_pid
+    with _job_queue_lock:
+        if _job_queue is None or _job_queue_pid != os.getpid():
+            _job_queue = BackgroundJobQueue(EXPORT_QUEUE_WORKERS, UPLOAD_QUEUE_WORKERS)
+            _job_queue_pid = os.getpid()
+            _job_queue.start()
+            atexit.register(_job_queue.shutdown)
+        return _job_queue
+
+def job_queue_metrics():
+    queue_ = _job_queue if _job_queue_pid == os.getpid() else None
+    if queue_ is None:
+        return {}
+    with queue_._stats_lock:
+        return {
+            'ar_job_workers': queue_.workers,
+            'ar_upload_job_workers': queue_.upload_workers,
+            'ar_jobs_running': queue_.stats['running'],
+            'ar_jobs_completed_total': queue_.stats['completed'],
+            'ar_jobs_failed_total': queue_.stats['failed'],
+            'ar_jobs_rejected_total': queue_.stats['rejected'],
+            'ar_jobs_deduplicated_total': queue_.stats['deduplicated'],
+        }
+
+@app.before_request
+def ensure_job_queue():
+    # 요청을 처리하는 프로세스에서만 워커를 띄웁니다 (리로더/작업 프로세스 제외).
+    if _job_queue is None or _job_queue_pid != os.getpid():
+        get_job_queue()
+
 
 
 # ---------------------------
@@ -2352,6 +4879,7 @@ class DownloadClientOrdersForm(FlaskForm):
     client_code = SelectField('매출처', choices=[('', '전체매출처')])
     from_date = DateField('시작일', format='%Y-%m-%d', validators=[DataRequired()])
     to_date = DateField('종료일', format='%Y-%m-%d', validators=[DataRequired()])
+    engine = SelectField('출력 방식', choices=EXPORT_ENGINES, default=EXPORT_ENGINE)
     submit = SubmitField('거래명세표 생성')
 
 # ------------------------
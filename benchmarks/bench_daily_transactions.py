@@ -0,0 +1,116 @@
+# benchmarks/bench_daily_transactions.py
+# 일별 조회(view_daily_transactions) 결과 가공 시간 측정:
+# 62개 SUM(CASE ...) 열 + 행마다 clean_decimal vs (매출처, 일자) 집계 행을 NumPy 배열로 펼치기
+#
+# 실행: python benchmarks/bench_daily_transactions.py [점포 수] [월 거래일 수]
+
+import os
+import sys
+import time
+import logging
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+def make_rows(outlet_count, active_days):
+    # 새 쿼리 결과: (client, outlet_name, collector_key, manager, day, debit_cents, credit_cents)
+    rows = []
+    for i in range(outlet_count):
+        key = (f"C{i:05d}", f"점포 {i}", f"K{i % 20:02d}", f"담당 {i % 15}")
+        for day in range(1, active_days + 1):
+            debit = Decimal(f"{(i * 37 + day * 101) % 900000}.{day % 100:02d}")
+            credit = Decimal(f"{(i * 13 + day * 7) % 500000}.00") if day % 3 == 0 else Decimal('0.00')
+            rows.append(key + (day, int(debit * 100), int(credit * 100)))
+    return rows
+
+def make_wide_rows(rows):
+    # 기존 쿼리 결과: 점포마다 day_N_debit/day_N_credit 62개 열 + 합계
+    wide = {}
+    for client, outlet_name, collector_key, manager, day, debit_cents, credit_cents in rows:
+        debit, credit = Decimal(debit_cents) / 100, Decimal(credit_cents) / 100
+        row = wide.get((client, outlet_name))
+        if row is None:
+            row = wide[(client, outlet_name)] = {'client': client, 'outlet_name': outlet_name,
+                                                 'collector_key': collector_key, 'manager': manager,
+                                                 'total_debit': Decimal('0.00'), 'total_credit': Decimal('0.00')}
+            for n in range(1, 32):
+                row[f'day_{n}_debit'] = Decimal('0.00')
+                row[f'day_{n}_credit'] = Decimal('0.00')
+        row[f'day_{day}_debit'] += debit
+        row[f'day_{day}_credit'] += credit
+        row['total_debit'] += debit
+        row['total_credit'] += credit
+    results = list(wide.values())
+    for row in results:
+        row['total_receivables'] = row['total_debit'] - row['total_credit']
+    results.sort(key=lambda row: row['total_receivables'], reverse=True)
+    return results
+
+def legacy_daily_transactions(results):
+    # 기존 view_daily_transactions의 행 반복 (로그 메시지 문자열 생성 포함)
+    clean_decimal = app.clean_decimal
+    data = []
+    sum_total_debit = Decimal('0.00')
+    sum_total_credit = Decimal('0.00')
+    sum_total_receivables = Decimal('0.00')
+    for row in results:
+        total_debit = clean_decimal(row['total_debit'])
+        total_credit = clean_decimal(row['total_credit'])
+        total_receivables = clean_decimal(row['total_receivables'])
+        logging.debug(f"Row total_debit: {total_debit}, Row total_credit: {total_credit}, Row total_receivables: {total_receivables}")
+        day_data = {}
+        for day in range(1, 32):
+            debit_value = clean_decimal(row.get(f'day_{day}_debit', 0.0))
+            credit_value = clean_decimal(row.get(f'day_{day}_credit', 0.0))
+            logging.debug(f"day_{day}_debit: {debit_value}, day_{day}_credit: {credit_value}")
+            day_data[f'day_{day}_debit'] = f"{debit_value:,.2f}" if debit_value > 0 else '-'
+            day_data[f'day_{day}_credit'] = f"{credit_value:,.2f}" if credit_value > 0 else '-'
+        data_row = {
+            'client': row['client'],
+            'outlet_name': row['outlet_name'],
+            'collector_key': row['collector_key'],
+            'manager': row['manager'],
+            'total_debit': "{0:.2f}".format(total_debit) if total_debit > 0 else '0.00',
+            'total_credit': "{0:.2f}".format(total_credit) if total_credit > 0 else '0.00',
+            'total_receivables': "{0:.2f}".format(total_receivables) if total_receivables > 0 else '0.00',
+            'day_data': day_data
+        }
+        logging.debug(f"Data Row: {data_row}")
+        sum_total_debit += total_debit
+        sum_total_credit += total_credit
+        sum_total_receivables += total_receivables
+        data.append(data_row)
+    return (data,
+            f"{sum_total_debit:,.2f}" if sum_total_debit > 0 else '-',
+            f"{sum_total_credit:,.2f}" if sum_total_credit > 0 else '-',
+            f"{sum_total_receivables:,.2f}" if sum_total_receivables > 0 else '-')
+
+def numpy_daily_transactions(rows, page=None):
+    # /api/daily_transactions와 같은 순서: 펼치기 -> 미수금 내림차순 -> (page 행만) 포맷
+    keys, daily = app.pivot_daily_transactions(rows)
+    ordered = app.order_daily_transactions(keys, daily, 'total_receivables', True)
+    if page is not None:
+        ordered = ordered[:page]
+    return (app.format_daily_transactions(keys, daily, ordered),) + app.format_daily_totals(daily)
+
+def bench(label, func, rows):
+    started = time.perf_counter()
+    result = func(rows)
+    print(f"{label:<22} {time.perf_counter() - started:8.3f} s  ({len(rows)}행 입력, 점포 {len(result[0])}개)")
+    return result
+
+if __name__ == '__main__':
+    outlet_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    active_days = int(sys.argv[2]) if len(sys.argv) > 2 else 26
+    rows = make_rows(outlet_count, active_days)
+    wide_rows = make_wide_rows(rows)
+
+    current = bench('GROUP BY day + NumPy', numpy_daily_transactions, rows)
+    bench('NumPy, 100행만 포맷', lambda rows: numpy_daily_transactions(rows, 100), rows)
+    legacy = bench('SUM(CASE) x 62', legacy_daily_transactions, wide_rows)
+    print("결과 일치:", current == legacy)
@@ -0,0 +1,53 @@
+# benchmarks/bench_statement_fill.py
+# 거래명세표 1건 채우기(insert_data_to_excel) 시간 측정: 병합 영역 선형 탐색 vs 병합 셀 인덱스
+#
+# 실행: python benchmarks/bench_statement_fill.py [라인 수] [반복 횟수]
+
+import os
+import sys
+import time
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+def make_rows(count):
+    return [
+        {
+            'rep_name': '대표거래처',
+            'item_name': f'품목 {i}',
+            'unit': 'EA',
+            'qty': 2,
+            'unit_price': 1500,
+            'order_amount': 3000,
+            'vat': 300,
+            'total_amount': 3300,
+        }
+        for i in range(count)
+    ]
+
+def bench(label, rows, repeat):
+    client_info = {'full_name': '매출처', 'reg_no': '123-45-67890', 'president': '대표자', 'address1': '서울'}
+    elapsed = 0.0
+    for _ in range(repeat):
+        wb, ws = app.load_excel_template()
+        started = time.perf_counter()
+        app.insert_data_to_excel(wb, ws, app.SUPPLIER_INFO, client_info, '2025-03-01', rows)
+        elapsed += time.perf_counter() - started
+    print(f"{label:<14} {elapsed / repeat * 1000:8.2f} ms/statement")
+
+if __name__ == '__main__':
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 35
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rows = make_rows(line_count)
+
+    # 병합 셀 인덱스 (현재 구현)
+    bench('merged index', rows, repeat)
+
+    # 병합 영역 선형 탐색 (기존 구현)
+    app.get_template_merged_index = lambda: None
+    bench('linear scan', rows, repeat)
@@ -0,0 +1,13 @@
+-- background_tasks 테이블을 작업 큐로 사용하기 위한 컬럼 추가
+-- task_type/params: 재시작 후에도 작업을 다시 실행할 수 있도록 요청 내용을 저장
+-- job_key: 동일 조건 요청 중복 방지용 해시
+-- priority: 높은 값이 먼저 실행 (단일 매출처 > 전체매출처)
+ALTER TABLE background_tasks
+    ADD COLUMN task_type VARCHAR(50) NOT NULL DEFAULT 'client_statements' AFTER task_id,
+    ADD COLUMN params TEXT NULL AFTER task_type,
+    ADD COLUMN job_key CHAR(64) NULL AFTER params,
+    ADD COLUMN priority INT NOT NULL DEFAULT 0 AFTER job_key,
+    ADD COLUMN started_at DATETIME NULL AFTER created_at;
+
+CREATE INDEX idx_background_tasks_queue ON background_tasks (status, priority, created_at);
+CREATE INDEX idx_background_tasks_job_key ON background_tasks (job_key, status);
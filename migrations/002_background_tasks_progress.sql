@@ -0,0 +1,3 @@
+-- 내보내기 작업 진행 상황 (단계, 완료 거래처/일자 수, 페이지 수, 완료된 파일 목록, 예상 남은 시간)
+ALTER TABLE background_tasks
+    ADD COLUMN progress TEXT NULL AFTER result;
@@ -0,0 +1,37 @@
+-- ARBankAccountMaster: 하이픈/공백을 제거한 가상계좌번호 키 (생성 컬럼 + 인덱스)
+-- 입금 업로드는 이 컬럼으로 계좌를 찾으므로 REPLACE()로 전체 테이블을 스캔하지 않습니다.
+ALTER TABLE ARBankAccountMaster
+    ADD COLUMN virtual_account_key VARCHAR(32)
+        AS (REPLACE(REPLACE(TRIM(hana_bank_virtual_account), '-', ''), ' ', '')) STORED,
+    ADD INDEX idx_bank_account_virtual_account_key (virtual_account_key);
+
+-- 마스터 테이블 변경 버전: 애플리케이션의 계좌 매핑 캐시 무효화에 사용
+CREATE TABLE IF NOT EXISTS ARMasterVersion (
+    table_name VARCHAR(64) NOT NULL PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO ARMasterVersion (table_name, version) VALUES ('ARBankAccountMaster', 0);
+
+DELIMITER $$
+
+CREATE TRIGGER trg_bank_account_master_ai AFTER INSERT ON ARBankAccountMaster
+FOR EACH ROW
+BEGIN
+    UPDATE ARMasterVersion SET version = version + 1 WHERE table_name = 'ARBankAccountMaster';
+END$$
+
+CREATE TRIGGER trg_bank_account_master_au AFTER UPDATE ON ARBankAccountMaster
+FOR EACH ROW
+BEGIN
+    UPDATE ARMasterVersion SET version = version + 1 WHERE table_name = 'ARBankAccountMaster';
+END$$
+
+CREATE TRIGGER trg_bank_account_master_ad AFTER DELETE ON ARBankAccountMaster
+FOR EACH ROW
+BEGIN
+    UPDATE ARMasterVersion SET version = version + 1 WHERE table_name = 'ARBankAccountMaster';
+END$$
+
+DELIMITER ;
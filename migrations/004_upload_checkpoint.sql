@@ -0,0 +1,16 @@
+-- 업로드 파일별 청크 단위 가져오기 체크포인트
+-- 같은 파일(내용 해시)을 다시 올리면 마지막으로 커밋된 행 다음부터 이어서 처리합니다.
+CREATE TABLE IF NOT EXISTS ARUploadCheckpoint (
+    file_hash CHAR(64) NOT NULL,
+    import_type VARCHAR(30) NOT NULL,
+    filename VARCHAR(255) NULL,
+    rows_done INT NOT NULL DEFAULT 0,
+    inserted INT NOT NULL DEFAULT 0,
+    skipped INT NOT NULL DEFAULT 0,
+    duplicates INT NOT NULL DEFAULT 0,
+    unknown INT NOT NULL DEFAULT 0,
+    status VARCHAR(20) NOT NULL DEFAULT 'running',
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (file_hash, import_type)
+);
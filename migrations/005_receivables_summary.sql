@@ -0,0 +1,39 @@
+-- 매출처/점포별 미수금 요약 (view_receivables가 원장 전체를 집계하지 않고 이 테이블을 읽습니다)
+-- 키는 view_receivables가 쓰던 TRIM(UPPER(...)) 값입니다 (NULL은 빈 문자열).
+-- 원장에 쓰는 곳(add_order, 발주/입금 업로드)이 같은 트랜잭션에서 증분으로 갱신합니다.
+CREATE TABLE IF NOT EXISTS ARReceivablesSummary (
+    client_key VARCHAR(255) NOT NULL,
+    outlet_key VARCHAR(255) NOT NULL,
+    total_debit DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    total_credit DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    total_food_material_sales DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    total_royalty_sales DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    total_pos_usage_fee DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    total_cash_deposit DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    total_card_deposit DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    ledger_rows BIGINT NOT NULL DEFAULT 0,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (client_key, outlet_key),
+    INDEX idx_receivables_summary_outlet (outlet_key)
+);
+
+-- 초기 적재. 애플리케이션 밖에서 원장을 직접 고친 경우에도 이 두 문장을 다시 실행하면 다시 맞춰집니다.
+DELETE FROM ARReceivablesSummary;
+
+INSERT INTO ARReceivablesSummary (
+    client_key, outlet_key, total_debit, total_credit, total_food_material_sales, total_royalty_sales,
+    total_pos_usage_fee, total_cash_deposit, total_card_deposit, ledger_rows
+)
+SELECT
+    COALESCE(TRIM(UPPER(client)), ''),
+    COALESCE(TRIM(UPPER(outlet_name)), ''),
+    COALESCE(SUM(debit), 0),
+    COALESCE(SUM(credit), 0),
+    COALESCE(SUM(food_material_sales), 0),
+    COALESCE(SUM(royalty_sales), 0),
+    COALESCE(SUM(pos_usage_fee), 0),
+    COALESCE(SUM(cash_deposit), 0),
+    COALESCE(SUM(card_deposit), 0),
+    COUNT(*)
+FROM ARTransactionsLedger
+GROUP BY COALESCE(TRIM(UPPER(client)), ''), COALESCE(TRIM(UPPER(outlet_name)), '');
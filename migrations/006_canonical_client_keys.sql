@@ -0,0 +1,31 @@
+-- 매출처 코드 정규화 키 (UPPER(TRIM(코드)), 대소문자/앞뒤 공백 무시)
+-- 원장/마스터/cm_chain 조인을 COLLATE나 TRIM(UPPER()) 식 대신 인덱스가 있는 키 컬럼의 단순 비교로 처리합니다.
+-- 생성 컬럼(STORED)이므로 ALTER 시점에 기존 행이 채워지고, 이후에는 어떤 경로로 삽입하든 MySQL이 같은 규칙으로 채웁니다
+-- (cm_chain, AROrderDetailsItem처럼 이 애플리케이션 밖에서 적재되는 테이블 포함).
+-- 모든 키 컬럼은 utf8mb4_bin으로 맞춰 테이블마다 기본 콜레이션이 달라도 조인에 COLLATE가 필요 없습니다.
+-- 애플리케이션 쪽 같은 규칙: canonical_client_key() (app.py)
+
+ALTER TABLE cm_chain
+    ADD COLUMN chain_key VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin
+        AS (UPPER(TRIM(chain_no))) STORED,
+    ADD INDEX idx_cm_chain_chain_key (chain_key);
+
+ALTER TABLE AROrderDetailsItem
+    ADD COLUMN client_key VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin
+        AS (UPPER(TRIM(client_code))) STORED,
+    ADD INDEX idx_order_details_item_client_key_date (client_key, order_date);
+
+ALTER TABLE ARClientMaster
+    ADD COLUMN client_key VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin
+        AS (UPPER(TRIM(client_code))) STORED,
+    ADD INDEX idx_client_master_client_key (client_key);
+
+ALTER TABLE ARTransactionsLedger
+    ADD COLUMN client_key VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin
+        AS (UPPER(TRIM(client))) STORED,
+    ADD INDEX idx_ledger_client_key_date (client_key, transaction_date);
+
+-- 미수금 요약 테이블의 키도 같은 콜레이션으로 맞춥니다 (값은 이미 정규화되어 있음).
+ALTER TABLE ARReceivablesSummary
+    MODIFY client_key VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+    MODIFY outlet_key VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL;
@@ -0,0 +1,65 @@
+-- 마감된 월의 일별 거래 집계 (view_daily_transactions)
+-- 지난 달은 ARDailyRollup에 한 번 집계해 두고 그 결과를 읽습니다. 이번 달은 항상 원장에서 바로 집계합니다.
+-- ARDailyRollupMonth.version은 그 달로 날짜가 잡힌 원장 변경마다 트리거가 올리고,
+-- 집계를 만들 때 읽은 version을 built_version에 남깁니다. 두 값이 다르면 다시 집계합니다.
+CREATE TABLE IF NOT EXISTS ARDailyRollupMonth (
+    month_start DATE NOT NULL PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    built_version BIGINT NULL,
+    built_at DATETIME NULL,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- 원장만 집계합니다. 수금 담당(collector_key, manager)은 읽을 때 ARClientMaster에서 붙이므로
+-- 마스터가 바뀌어도 다시 집계할 필요가 없습니다.
+CREATE TABLE IF NOT EXISTS ARDailyRollup (
+    month_start DATE NOT NULL,
+    client VARCHAR(255) NULL,
+    client_key VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NULL,
+    outlet_name VARCHAR(255) NULL,
+    day TINYINT NOT NULL,
+    debit_cents BIGINT NOT NULL DEFAULT 0,
+    credit_cents BIGINT NOT NULL DEFAULT 0,
+    INDEX idx_daily_rollup_month (month_start)
+);
+
+-- 이번 달 날짜의 변경은 건너뜁니다 (이번 달은 집계를 만들지 않으므로 잠금 경합 없이 삽입).
+DELIMITER $$
+
+CREATE TRIGGER trg_ledger_rollup_ai AFTER INSERT ON ARTransactionsLedger
+FOR EACH ROW
+BEGIN
+    IF NEW.transaction_date < DATE_FORMAT(CURDATE(), '%Y-%m-01') THEN
+        INSERT INTO ARDailyRollupMonth (month_start, version)
+        VALUES (DATE_FORMAT(NEW.transaction_date, '%Y-%m-01'), 1)
+        ON DUPLICATE KEY UPDATE version = version + 1;
+    END IF;
+END$$
+
+CREATE TRIGGER trg_ledger_rollup_au AFTER UPDATE ON ARTransactionsLedger
+FOR EACH ROW
+BEGIN
+    IF OLD.transaction_date < DATE_FORMAT(CURDATE(), '%Y-%m-01') THEN
+        INSERT INTO ARDailyRollupMonth (month_start, version)
+        VALUES (DATE_FORMAT(OLD.transaction_date, '%Y-%m-01'), 1)
+        ON DUPLICATE KEY UPDATE version = version + 1;
+    END IF;
+    IF NEW.transaction_date < DATE_FORMAT(CURDATE(), '%Y-%m-01')
+       AND DATE_FORMAT(NEW.transaction_date, '%Y-%m') <> DATE_FORMAT(OLD.transaction_date, '%Y-%m') THEN
+        INSERT INTO ARDailyRollupMonth (month_start, version)
+        VALUES (DATE_FORMAT(NEW.transaction_date, '%Y-%m-01'), 1)
+        ON DUPLICATE KEY UPDATE version = version + 1;
+    END IF;
+END$$
+
+CREATE TRIGGER trg_ledger_rollup_ad AFTER DELETE ON ARTransactionsLedger
+FOR EACH ROW
+BEGIN
+    IF OLD.transaction_date < DATE_FORMAT(CURDATE(), '%Y-%m-01') THEN
+        INSERT INTO ARDailyRollupMonth (month_start, version)
+        VALUES (DATE_FORMAT(OLD.transaction_date, '%Y-%m-01'), 1)
+        ON DUPLICATE KEY UPDATE version = version + 1;
+    END IF;
+END$$
+
+DELIMITER ;
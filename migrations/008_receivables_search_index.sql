@@ -0,0 +1,12 @@
+-- view_receivables 출고처명 검색 (LIKE '%검색어%')을 ngram 전문 검색 인덱스로 받칩니다.
+-- 애플리케이션은 MATCH ... AGAINST로 후보를 좁힌 뒤 LIKE로 한 번 더 확인합니다.
+-- 검색어 단어가 ngram_token_size(기본 2, RECEIVABLES_NGRAM_TOKEN_SIZE와 맞출 것)보다 짧으면 LIKE만 사용합니다.
+
+-- 기본 불용어 목록은 영문 단어('a', 'in', ...)라서 ngram 인덱스에서는 이를 포함한 토큰이 빠집니다.
+-- 인덱스를 만들 때의 설정이 적용되므로 이 세션에서만 끄고 만듭니다.
+SET SESSION innodb_ft_enable_stopword = OFF;
+
+ALTER TABLE ARReceivablesSummary
+    ADD FULLTEXT INDEX ft_receivables_summary_outlet (outlet_key) WITH PARSER ngram;
+
+SET SESSION innodb_ft_enable_stopword = ON;
@@ -0,0 +1,24 @@
+-- 작업 큐 중복 방지와 중단 작업 복구
+-- active_job_key: 대기/실행 중인 작업의 job_key (끝난 작업은 NULL). 유일 인덱스로 여러 프로세스가 같은 작업을
+--                 동시에 등록하지 못하게 합니다. 중복 등록 시도는 애플리케이션이 기존 작업으로 돌려줍니다.
+-- worker_id / heartbeat_at: 실행 중인 작업을 가진 프로세스(호스트:pid)와 그 프로세스가 주기적으로 갱신하는 시각.
+--                 heartbeat_at이 JOB_HEARTBEAT_TIMEOUT보다 오래되면 다른 프로세스가 대기 상태로 되돌립니다.
+
+-- 유일 인덱스를 만들기 전에, 이미 중복으로 등록된 대기/실행 작업은 가장 먼저 등록된 것만 job_key를 남깁니다.
+-- created_at은 초 단위라 같은 초에 들어온 중복(이 마이그레이션이 막으려는 경쟁 상황)은 task_id로 순서를 정합니다.
+UPDATE background_tasks AS t
+JOIN (
+    SELECT task_id,
+           ROW_NUMBER() OVER (PARTITION BY job_key ORDER BY created_at, task_id) AS rn
+    FROM background_tasks
+    WHERE status IN ('pending', 'running') AND job_key IS NOT NULL
+) AS d ON d.task_id = t.task_id
+SET t.job_key = NULL
+WHERE d.rn > 1;
+
+ALTER TABLE background_tasks
+    ADD COLUMN active_job_key CHAR(64) AS (IF(status IN ('pending', 'running'), job_key, NULL)) STORED AFTER job_key,
+    ADD COLUMN worker_id VARCHAR(100) NULL AFTER started_at,
+    ADD COLUMN heartbeat_at DATETIME NULL AFTER worker_id,
+    ADD UNIQUE INDEX uq_background_tasks_active_job_key (active_job_key),
+    ADD INDEX idx_background_tasks_heartbeat (status, heartbeat_at);